@@ -0,0 +1,12 @@
+"""
+Offline benchmark and regression harnesses for the pipeline scripts.
+Run from the skill directory, e.g. `python -m benchmarks.run_benchmarks`.
+"""
+
+import sys
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Regression cases for condense_diff: hand-written diffs with the hunks each
+one must keep or drop. Exits non-zero when any case mismatches.
+
+Usage (from the skill directory):
+    python -m benchmarks.condense_cases
+"""
+
+import sys
+
+from . import SCRIPTS_DIR  # noqa: F401  (puts scripts/ on sys.path)
+
+from condense_diff import DiffCondenser
+
+# (name, path, hunk body, whitespace_hunks expected)
+CASES = [
+    ("reindent", "app.js", "@@ -1,2 +1,2 @@\n-function f() {\n-  return 1\n+function f() {\n+    return 1\n", 1),
+    ("reindent_py", "app.py", "@@ -1,2 +1,2 @@\n-def f():\n-  return 1\n+def f():\n+    return 1\n", 0),
+    ("into_block_py", "app.py", "@@ -1,3 +1,3 @@\n if x:\n     a()\n-b()\n+    b()\n", 0),
+    ("reindent_yaml", "ci.yml", "@@ -1,2 +1,2 @@\n-jobs:\n-  - run\n+jobs:\n+    - run\n", 0),
+    ("spacing", "app.py", "@@ -1 +1 @@\n-x=1\n+x = 1\n", 1),
+    ("reorder", "app.py", "@@ -1,2 +1,2 @@\n-a = 1\n-b = a + 1\n+b = a + 1\n+a = 1\n", 0),
+    ("reorder_reindent", "app.js", "@@ -1,2 +1,2 @@\n-x = 1\n-y = 2\n+  y = 2\n+  x = 1\n", 0),
+    ("edit", "app.py", "@@ -1 +1 @@\n-x = 1\n+x = 2\n", 0),
+]
+
+
+def header(path: str) -> str:
+    return f"diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n"
+
+
+def main():
+    failed = False
+    for name, path, body, expected in CASES:
+        condenser = DiffCondenser()
+        out = condenser.condense(header(path) + body)
+        got = condenser.stats.whitespace_hunks
+        kept = "@@" in out
+        ok = got == expected and kept == (expected == 0)
+        print(f"  {name:18s} whitespace_hunks {got}  kept {kept}  {'ok' if ok else 'FAIL'}")
+        failed |= not ok
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Parity check between the in-process Python engine and ast-grep.
+Runs every in-process rule both ways on the same snippets (built-in edge
+cases, a synthetic repository, or a real commits.json) and reports where
+the match lists differ. Needs a real ast-grep on PATH.
+
+Usage (from the skill directory):
+    python -m benchmarks.engine_parity
+    python -m benchmarks.engine_parity --commits-file commits.json --strict
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+from .run_benchmarks import SINCE
+from .synthetic_repo import RepoSpec, add_repo_spec_args, generate_repo
+
+import analyze_code
+import ast_analyzer
+from fetch_commits import fetch_local_commits
+
+FIXTURES = [
+    'password = "hunter2"\nprint("debug")\nresult = eval(expr)\n',
+    "try:\n    run()\nexcept ValueError:\n    pass\n",
+    'self.token = "abc"\nitems[0] = "x"\nx, y = "ab"\na = b = "c"\n',
+    "empty = \"\"\nraw = r\"x\"\nsingle = 'x'\nparen = (\"x\")\nf = f\"{x}\"\njoined = \"a\" \"b\"\n",
+    "logger.print(x)\nobj.eval(y)\nprint (1)\nprint(eval(\"1\"))\n",
+    '        return compute(x)\n    print(x)\n    token = "abc"\n',
+    "        except Exception:\n            pass\n        print(1)\n",
+    'def f(:\n    print(1); z = "tok"\n',
+    'msg = "café"; print(msg)\n',
+    # Keyword argument continuing a call the hunk leaves open: not an assignment
+    '    parser.add_argument(\n        "--x",\n        help="Total time "\n        "skipped",\n',
+    # ... also when the hunk starts by closing a call it does not show
+    '    )\n    parser.add_argument(\n        "--max-tokens",\n        type=int,\n'
+    '        help="Pack the prompt into this many (estimated) tokens, most informative "\n'
+    '        "commits first",\n',
+    # A dict the hunk leaves open swallows the code after it; ast-grep reads
+    # `parser.error(...)` then `print(...)` as one call, so print is no match
+    '    return {\n        "since": since,\n\ndef run(args, parser):\n    try:\n'
+    '        output = fetch(args)\n    except ValueError as e:\n        parser.error(str(e))\n'
+    '    print(f"Fetched {output[\'commit_count\']} commits")\n',
+]
+
+
+def python_snippets(commits: list[dict]) -> list[str]:
+    snippets = []
+    for commit in commits:
+        for f in analyze_code.parse_diff(commit.get("diff", ""))["files"]:
+            if f["path"].endswith(".py") and f["added"]:
+                snippets.append("\n".join(f["added"]))
+    return snippets
+
+
+def _key(rule, match) -> tuple:
+    return rule.name, match["range"]["start"]["line"], match.get("text", "")
+
+
+def compare_snippet(code: str, rules: list, evaluable: set[str]) -> dict[str, dict]:
+    engine = {_key(r, m) for r, m in ast_analyzer.scan_in_process(code, "python")}
+    sg = {
+        _key(rule, m)
+        for rule in rules
+        if rule.name in evaluable
+        for m in ast_analyzer.run_ast_grep(rule.pattern, "python", code)
+    }
+    out = {}
+    for rule in rules:
+        if rule.name not in evaluable:
+            continue
+        mine = {k for k in engine if k[0] == rule.name}
+        theirs = {k for k in sg if k[0] == rule.name}
+        out[rule.name] = {
+            "agree": len(mine & theirs),
+            "engine_only": sorted(mine - theirs),
+            "sg_only": sorted(theirs - mine),
+        }
+    return out
+
+
+def run_parity(snippets: list[str]) -> dict:
+    rules = list(ast_analyzer.in_process_rules("python"))
+    evaluable = {
+        rule.name
+        for rule in rules
+        if ast_analyzer._rules_compile([ast_analyzer._rule_yaml(rule, "python")], "python")
+    }
+    totals = {
+        rule.name: {"agree": 0, "engine_only": 0, "sg_only": 0, "examples": []}
+        for rule in rules
+        if rule.name in evaluable
+    }
+    for code in snippets:
+        for name, diff in compare_snippet(code, rules, evaluable).items():
+            t = totals[name]
+            t["agree"] += diff["agree"]
+            for side in ("engine_only", "sg_only"):
+                t[side] += len(diff[side])
+                for _, line, text in diff[side]:
+                    if len(t["examples"]) < 5:
+                        t["examples"].append({"side": side, "line": line, "text": text})
+    return {
+        "snippets": len(snippets),
+        "not_evaluable_by_ast_grep": sorted(r.name for r in rules if r.name not in evaluable),
+        "rules": totals,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process engine vs ast-grep parity")
+    add_repo_spec_args(parser)
+    parser.set_defaults(commits=100, langs="python=1")
+    parser.add_argument("--commits-file", help="Use snippets from a fetch_commits.py output")
+    parser.add_argument("--strict", action="store_true",
+                        help="Fail on engine-only matches too, not just missed ones")
+    parser.add_argument("--output", "-o", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    if not ast_analyzer.check_ast_grep_installed():
+        print("ast-grep not found on PATH; parity needs the real binary", file=sys.stderr)
+        sys.exit(2)
+    ast_analyzer.configure_ast_cache(None)
+
+    if args.commits_file:
+        with open(args.commits_file, "r", encoding="utf-8") as f:
+            commits = json.load(f)["commits"]
+    else:
+        with tempfile.TemporaryDirectory(prefix="gca-parity-") as tmp:
+            repo = generate_repo(Path(tmp) / "repo", RepoSpec.from_args(args))
+            commits = fetch_local_commits(str(repo), SINCE)
+
+    report = run_parity(FIXTURES + python_snippets(commits))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"Parity over {report['snippets']} snippets")
+    for name in report["not_evaluable_by_ast_grep"]:
+        print(f"  {name:18s} skipped: ast-grep rejects the pattern for python")
+    failed = False
+    for name, t in report["rules"].items():
+        print(f"  {name:18s} agree {t['agree']:>5}  engine-only {t['engine_only']:>4}  sg-only {t['sg_only']:>4}")
+        for ex in t["examples"]:
+            print(f"      {ex['side']:11s} line {ex['line']}: {ex['text'][:70]!r}")
+        if t["sg_only"] or (args.strict and t["engine_only"]):
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Peak-memory regression harness for each pipeline stage.
+Runs every stage under tracemalloc plus RSS sampling on a synthetic
+large-diff repository, and exits non-zero when a stage exceeds its budget.
+
+Usage (from the skill directory):
+    python -m benchmarks.memory_budget --commits 150 --lines-per-file 400
+    python -m benchmarks.memory_budget --budgets budgets.json -o memory.json
+    python -m benchmarks.memory_budget --budget analyze_commits=150
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict
+from pathlib import Path
+
+from .run_benchmarks import SINCE, patched_environ
+from .stub_sg import install_stub_sg, stub_environment
+from .synthetic_repo import RepoSpec, add_repo_spec_args, generate_repo
+
+import analyze_code
+import ast_analyzer
+from fetch_commits import fetch_local_commits
+from generate_prompt import generate_prompt
+
+MB = 1024 * 1024
+
+# Peak Python-heap budgets in MB (tracemalloc), sized for the default spec.
+DEFAULT_BUDGETS_MB = {
+    "fetch_local_commits": 200,
+    "json_load_commits": 200,
+    "parse_diff": 100,
+    "analyze_commits": 200,
+    "json_load_metrics": 100,
+    "generate_prompt": 200,
+}
+
+
+def current_rss() -> int:
+    """Resident set size in bytes (Linux /proc; 0 elsewhere)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class RssSampler(threading.Thread):
+    """Poll RSS in the background and keep the maximum seen."""
+
+    def __init__(self, interval: float = 0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = current_rss()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            self.peak = max(self.peak, current_rss())
+            time.sleep(self.interval)
+
+    def stop(self) -> int:
+        self._done.set()
+        self.join()
+        self.peak = max(self.peak, current_rss())
+        return self.peak
+
+
+def measure(func) -> tuple[object, dict]:
+    """Run func and report its tracemalloc peak and RSS growth."""
+    rss_before = current_rss()
+    sampler = RssSampler()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    sampler.start()
+    t0 = time.perf_counter()
+    try:
+        result = func()
+    finally:
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss_peak = sampler.stop()
+    return result, {
+        "peak_mb": round(peak / MB, 3),
+        "rss_peak_mb": round(rss_peak / MB, 3),
+        "rss_growth_mb": round(max(0, rss_peak - rss_before) / MB, 3),
+        "wall_s": round(elapsed, 4),
+    }
+
+
+def run_stages(spec: RepoSpec, workdir: Path) -> dict[str, dict]:
+    repo = generate_repo(workdir / "repo", spec)
+    install_stub_sg(workdir / "bin")
+    results: dict[str, dict] = {}
+
+    with patched_environ(stub_environment(workdir / "bin", workdir / "sg_calls.log")):
+        ast_analyzer.find_ast_grep.cache_clear()
+        ast_analyzer.configure_ast_cache(None)
+        # The stub cannot serve LSP workers
+        ast_analyzer.configure_sg_workers(False)
+        commits, results["fetch_local_commits"] = measure(
+            lambda: fetch_local_commits(str(repo), SINCE)
+        )
+        n = len(commits)
+        commits_file = workdir / "commits.json"
+        with open(commits_file, "w", encoding="utf-8") as f:
+            json.dump({"source": str(repo), "since": SINCE, "commits": commits}, f)
+        del commits
+
+        def load_commits():
+            with open(commits_file, "r", encoding="utf-8") as f:
+                return json.load(f)["commits"]
+
+        commits, results["json_load_commits"] = measure(load_commits)
+
+        largest = max(commits, key=lambda c: len(c["diff"]))
+        _, results["parse_diff"] = measure(lambda: analyze_code.parse_diff(largest["diff"]))
+        results["parse_diff"]["diff_bytes"] = len(largest["diff"])
+
+        metrics, results["analyze_commits"] = measure(
+            lambda: analyze_code.analyze_commits(commits)
+        )
+        metrics_file = workdir / "commits_metrics.json"
+        with open(metrics_file, "w", encoding="utf-8") as f:
+            json.dump(metrics, f)
+        del metrics
+
+        def load_metrics():
+            with open(metrics_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+
+        _, results["json_load_metrics"] = measure(load_metrics)
+        _, results["generate_prompt"] = measure(
+            lambda: generate_prompt(str(commits_file), "zh", max_commits=n)
+        )
+
+    for name, r in results.items():
+        if name != "parse_diff" and n:
+            r["per_commit_kb"] = round(r["peak_mb"] * 1024 / n, 3)
+    return results
+
+
+def check_budgets(results: dict[str, dict], budgets: dict[str, float]) -> list[str]:
+    failures = []
+    for stage, r in results.items():
+        budget = budgets.get(stage)
+        r["budget_mb"] = budget
+        if budget is not None and r["peak_mb"] > budget:
+            failures.append(f"{stage}: peak {r['peak_mb']:.1f} MB > budget {budget:.1f} MB")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage peak-memory regression harness")
+    add_repo_spec_args(parser)
+    parser.set_defaults(commits=150, lines_per_file=400)
+    parser.add_argument("--budgets", help="JSON file of {stage: peak_mb}")
+    parser.add_argument("--budget", action="append", default=[], metavar="STAGE=MB",
+                        help="Override a single stage budget (repeatable)")
+    parser.add_argument("--output", "-o", default="memory_results.json")
+    args = parser.parse_args()
+
+    budgets = dict(DEFAULT_BUDGETS_MB)
+    if args.budgets:
+        with open(args.budgets, "r", encoding="utf-8") as f:
+            budgets.update(json.load(f))
+    for item in args.budget:
+        stage, _, mb = item.partition("=")
+        budgets[stage] = float(mb)
+
+    spec = RepoSpec.from_args(args)
+    with tempfile.TemporaryDirectory(prefix="gca-mem-") as tmp:
+        results = run_stages(spec, Path(tmp))
+
+    failures = check_budgets(results, budgets)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"spec": asdict(spec), "stages": results, "failures": failures}, f, indent=2)
+
+    print(f"Memory results: {args.output}")
+    for stage, r in results.items():
+        budget = f"{r['budget_mb']:g}" if r["budget_mb"] is not None else "-"
+        print(f"  {stage:22s} peak {r['peak_mb']:>8.1f} MB  rss {r['rss_peak_mb']:>8.1f} MB  budget {budget} MB")
+
+    if failures:
+        print("Budget exceeded:", file=sys.stderr)
+        for line in failures:
+            print(f"  {line}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+--max-tokens packing regression check. Packs a synthetic commit range at a
+series of budgets and exits non-zero when a prompt overshoots its budget,
+or leaves more than --min-fill of it unused while commits are still
+summarized or omitted.
+
+Usage (from the skill directory):
+    python -m benchmarks.prompt_budget
+    python -m benchmarks.prompt_budget --commits 300 --max-tokens 20000 --max-tokens 60000
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+from .run_benchmarks import SINCE, patched_environ
+from .stub_sg import install_stub_sg, stub_environment
+from .synthetic_repo import RepoSpec, add_repo_spec_args, generate_repo
+
+import analyze_code
+import ast_analyzer
+from fetch_commits import fetch_local_commits
+from generate_prompt import build_prompt, estimate_tokens
+
+DEFAULT_BUDGETS = (8000, 12000, 16000, 20000, 30000, 60000)
+# Share of the budget a packed prompt must use when commits were left out
+MIN_FILL = 0.95
+
+
+def build_range(spec: RepoSpec, workdir: Path) -> tuple[dict, dict]:
+    """commits.json and *_metrics.json contents for a synthetic repository."""
+    repo = generate_repo(workdir / "repo", spec)
+    install_stub_sg(workdir / "bin")
+    with patched_environ(stub_environment(workdir / "bin", workdir / "sg_calls.log")):
+        ast_analyzer.find_ast_grep.cache_clear()
+        ast_analyzer.configure_ast_cache(None)
+        ast_analyzer.configure_sg_workers(False)
+        commits = fetch_local_commits(str(repo), SINCE)
+        data = {"source": str(repo), "since": SINCE, "until": None, "commits": commits}
+        return data, analyze_code.analyze_data(data)
+
+
+def check_budget(data: dict, metrics: dict, max_tokens: int, lang: str, min_fill: float) -> dict:
+    result = {"max_tokens": max_tokens}
+    try:
+        prompt = build_prompt(data, metrics, lang, None, max_tokens)
+    except ValueError as e:
+        return {**result, "error": str(e)}
+    marker = prompt.index('"summarized_commits": [')
+    start = prompt.rindex('{\n  "source":', 0, marker)
+    section = json.JSONDecoder().raw_decode(prompt[start:])[0]
+    used = estimate_tokens(prompt)
+    result.update(
+        used=used,
+        inlined=len(section["commits"]),
+        summarized=len(section["summarized_commits"]),
+        omitted=section.get("omitted_commits", 0),
+    )
+    if used > max_tokens:
+        result["error"] = f"~{used} tokens exceed the budget"
+    elif result["inlined"] < len(data["commits"]) and used < max_tokens * min_fill:
+        result["error"] = f"~{used} tokens leave {1 - used / max_tokens:.0%} unused with commits left out"
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="--max-tokens packing regression check")
+    add_repo_spec_args(parser)
+    parser.set_defaults(commits=120)
+    parser.add_argument("--max-tokens", type=int, action="append",
+                        help=f"Budget to check (repeatable; default: {', '.join(map(str, DEFAULT_BUDGETS))})")
+    parser.add_argument("--min-fill", type=float, default=MIN_FILL)
+    parser.add_argument("--lang", choices=["zh", "en"], default="en")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="gca-budget-") as tmp:
+        data, metrics = build_range(RepoSpec.from_args(args), Path(tmp))
+
+    failed = False
+    print(f"Packing {len(data['commits'])} commits")
+    for max_tokens in args.max_tokens or DEFAULT_BUDGETS:
+        r = check_budget(data, metrics, max_tokens, args.lang, args.min_fill)
+        if "used" in r:
+            print(f"  {max_tokens:>7}  used {r['used']:>7}  inlined {r['inlined']:>4}  "
+                  f"summarized {r['summarized']:>4}  omitted {r['omitted']:>4}")
+        if "error" in r:
+            print(f"  {max_tokens:>7}  FAIL: {r['error']}", file=sys.stderr)
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
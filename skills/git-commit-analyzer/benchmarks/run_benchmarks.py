@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+End-to-end pipeline benchmark on a synthetic repository.
+Times fetch -> analyze -> ast-grep -> prompt -> report and writes JSON
+results that can be compared across versions with --compare.
+
+Usage (from the skill directory):
+    python -m benchmarks.run_benchmarks --commits 500 -o bench.json
+    python -m benchmarks.run_benchmarks --compare bench_old.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+
+from . import SCRIPTS_DIR
+from .stub_sg import count_stub_calls, install_stub_sg, stub_environment
+from .synthetic_repo import RepoSpec, add_repo_spec_args, generate_repo
+
+import analyze_code
+import ast_analyzer
+from fetch_commits import fetch_local_commits
+from generate_prompt import generate_prompt
+from generate_report import generate_html_report, generate_markdown_report
+from profiling import PROFILER
+
+SINCE = "2000-01-01"
+
+
+@contextmanager
+def patched_environ(overrides: dict):
+    saved = {k: os.environ.get(k) for k in overrides}
+    os.environ.update(overrides)
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def fake_model_analysis(metrics: dict) -> dict:
+    """Build an analysis.json-shaped document from metrics, standing in for the model."""
+    leaderboard = []
+    ranked = sorted(
+        metrics["by_author"].items(), key=lambda kv: -kv[1]["total_substance"]
+    )
+    for rank, (name, data) in enumerate(ranked, 1):
+        leaderboard.append(
+            {
+                "rank": rank,
+                "name": name,
+                "final_score": round(data["total_substance"], 1),
+                "grade": "🧍 NPC",
+                "title": "打工人",
+                "award": "今天也是普通的一天",
+                "commits": data["commits"],
+                "effective_lines": data["effective_lines"],
+                "badges": [],
+                "summary": "synthetic",
+                "linus_review": "synthetic",
+                "ai_survivor_score": 50,
+            }
+        )
+    commits = [
+        {
+            "sha": c["sha"],
+            "author": c["author"],
+            "rewrite_index": 3,
+            "business_value": "🧱 支撑设施",
+            "final_score": round(c["metrics"]["substance_score"], 1),
+            "roast": c["message"],
+            "linus_says": "synthetic",
+            "code_quality": "acceptable",
+            "badges": [],
+        }
+        for c in metrics["commits"]
+    ]
+    return {
+        "report_date": "2026-01-01",
+        "team_summary": {"total_commits": len(commits), "mvp": ranked[0][0] if ranked else ""},
+        "leaderboard": leaderboard,
+        "commits": commits,
+    }
+
+
+def timed(func, repeat: int) -> tuple[object, dict]:
+    """Run func `repeat` times; return the last result and timing stats."""
+    walls = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        walls.append(time.perf_counter() - t0)
+    return result, {
+        "runs": repeat,
+        "min_s": round(min(walls), 6),
+        "median_s": round(statistics.median(walls), 6),
+        "mean_s": round(statistics.fmean(walls), 6),
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=SCRIPTS_DIR,
+            capture_output=True,
+            text=True,
+        )
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(spec: RepoSpec, workdir: Path, repeat: int, real_sg: bool) -> dict:
+    repo = workdir / "repo"
+    _, gen_timing = timed(lambda: generate_repo(repo, spec), 1)
+
+    sg_log = workdir / "sg_calls.log"
+    env = {} if real_sg else stub_environment(workdir / "bin", sg_log)
+    if not real_sg:
+        install_stub_sg(workdir / "bin")
+
+    results: dict[str, dict] = {}
+    with patched_environ(env), PROFILER.activate():
+        ast_analyzer.find_ast_grep.cache_clear()
+        ast_analyzer.ast_grep_version.cache_clear()
+        ast_analyzer.ruleset_version.cache_clear()
+        # Stages measure scanning, not the persistent match cache
+        ast_analyzer.configure_ast_cache(None)
+        # The stub counts spawned processes and cannot serve LSP workers
+        ast_analyzer.configure_sg_workers(real_sg)
+        commits, results["fetch_local_commits"] = timed(
+            lambda: fetch_local_commits(str(repo), SINCE), repeat
+        )
+        commits_file = workdir / "commits.json"
+        with open(commits_file, "w", encoding="utf-8") as f:
+            json.dump({"source": str(repo), "since": SINCE, "commits": commits}, f)
+
+        calls_before = count_stub_calls(sg_log)
+        metrics, results["analyze_commits"] = timed(
+            lambda: analyze_code.analyze_commits(commits), repeat
+        )
+        results["analyze_commits"]["sg_invocations"] = (
+            count_stub_calls(sg_log) - calls_before
+        ) // repeat if not real_sg else None
+        metrics_file = workdir / "commits_metrics.json"
+        with open(metrics_file, "w", encoding="utf-8") as f:
+            json.dump(metrics, f)
+
+        parsed = [analyze_code.parse_diff(c["diff"])["files"] for c in commits]
+        calls_before = count_stub_calls(sg_log)
+        _, results["analyze_diff_with_ast_grep"] = timed(
+            lambda: [ast_analyzer.analyze_diff_with_ast_grep(files) for files in parsed],
+            repeat,
+        )
+        results["analyze_diff_with_ast_grep"]["sg_invocations"] = (
+            count_stub_calls(sg_log) - calls_before
+        ) // repeat if not real_sg else None
+
+        calls_before = count_stub_calls(sg_log)
+        _, results["analyze_diffs_batch"] = timed(
+            lambda: ast_analyzer.analyze_diffs_batch(dict(enumerate(parsed))), repeat
+        )
+        results["analyze_diffs_batch"]["sg_invocations"] = (
+            count_stub_calls(sg_log) - calls_before
+        ) // repeat if not real_sg else None
+
+        reader = analyze_code.blob_reader(str(repo))
+        post_images = {
+            i: analyze_code.extract_features(c)[1] for i, c in enumerate(commits)
+        }
+        calls_before = count_stub_calls(sg_log)
+        _, results["analyze_post_images"] = timed(
+            lambda: ast_analyzer.analyze_post_images(post_images, reader), repeat
+        )
+        results["analyze_post_images"]["sg_invocations"] = (
+            count_stub_calls(sg_log) - calls_before
+        ) // repeat if not real_sg else None
+
+        ast_analyzer.configure_ast_cache(workdir / "ast_cache.sqlite")
+        ast_analyzer.analyze_diffs_batch(dict(enumerate(parsed)))
+        calls_before = count_stub_calls(sg_log)
+        _, results["analyze_diffs_batch.warm_cache"] = timed(
+            lambda: ast_analyzer.analyze_diffs_batch(dict(enumerate(parsed))), repeat
+        )
+        results["analyze_diffs_batch.warm_cache"]["sg_invocations"] = (
+            count_stub_calls(sg_log) - calls_before
+        ) // repeat if not real_sg else None
+        ast_analyzer.configure_ast_cache(None)
+
+        prompt, results["generate_prompt"] = timed(
+            lambda: generate_prompt(str(commits_file), "zh", max_commits=len(commits)),
+            repeat,
+        )
+        results["generate_prompt"]["output_chars"] = len(prompt)
+
+        analysis = fake_model_analysis(metrics)
+        md, results["generate_report.markdown"] = timed(
+            lambda: generate_markdown_report(analysis, "zh"), repeat
+        )
+        html, results["generate_report.html"] = timed(
+            lambda: generate_html_report(analysis, "zh"), repeat
+        )
+        results["generate_report.markdown"]["output_chars"] = len(md)
+        results["generate_report.html"]["output_chars"] = len(html)
+
+        profile = PROFILER.report()
+
+    return {
+        "generated_at": datetime.now().isoformat(),
+        "revision": git_revision(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sg": "real" if real_sg else "stub",
+        },
+        "spec": asdict(spec),
+        "repo_generation": gen_timing,
+        "commits_fetched": len(commits),
+        "stages": results,
+        "profile": profile,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Return human-readable regressions where median time grew past threshold."""
+    regressions = []
+    for stage, cur in current["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if not base or not base.get("median_s"):
+            continue
+        ratio = cur["median_s"] / base["median_s"]
+        marker = "REGRESSION" if ratio > threshold else "ok"
+        line = f"  {stage:32s} {base['median_s']:>10.4f}s -> {cur['median_s']:>10.4f}s  x{ratio:.2f}  {marker}"
+        print(line)
+        if ratio > threshold:
+            regressions.append(line.strip())
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on a synthetic repo")
+    add_repo_spec_args(parser)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage")
+    parser.add_argument("--real-sg", action="store_true",
+                        help="Use the installed ast-grep instead of the offline stub")
+    parser.add_argument("--workdir", help="Keep generated files here (default: temp dir)")
+    parser.add_argument("--output", "-o", default="bench_results.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="Compare against a previous results file")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="Median slowdown ratio that counts as a regression")
+    args = parser.parse_args()
+
+    spec = RepoSpec.from_args(args)
+    if args.workdir:
+        workdir = Path(args.workdir)
+        workdir.mkdir(parents=True, exist_ok=True)
+        report = run_benchmarks(spec, workdir, args.repeat, args.real_sg)
+    else:
+        with tempfile.TemporaryDirectory(prefix="gca-bench-") as tmp:
+            report = run_benchmarks(spec, Path(tmp), args.repeat, args.real_sg)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"Benchmark complete: {args.output}")
+    for stage, timing in report["stages"].items():
+        print(f"  {stage:32s} median {timing['median_s']:.4f}s")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.compare}:")
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
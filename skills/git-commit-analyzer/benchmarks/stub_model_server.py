@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible chat completions server answering with
+run_model.stub_answer(), for exercising `run_model.py --backend openai`
+(HTTP, concurrency, retries) without a real model.
+
+Usage (from the skill directory):
+    python -m benchmarks.stub_model_server --port 8765 --delay 0.5 --fail-every 3
+    python scripts/run_model.py prompt.txt -b openai -m stub --base-url http://127.0.0.1:8765/v1
+"""
+
+import argparse
+import itertools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import SCRIPTS_DIR  # noqa: F401  (puts scripts/ on sys.path)
+
+from run_model import stub_answer
+
+
+def make_handler(delay: float = 0.0, fail_every: int = 0):
+    """Handler class; every `fail_every`-th request gets a 503."""
+    requests = itertools.count(1)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            with lock:
+                n = next(requests)
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if not self.path.endswith("/chat/completions"):
+                return self._reply(404, {"error": "not found"})
+            if fail_every and n % fail_every == 0:
+                return self._reply(503, {"error": "stub overload"})
+            if delay:
+                time.sleep(delay)
+            prompt = json.loads(body)["messages"][-1]["content"]
+            answer = json.dumps(stub_answer(prompt), ensure_ascii=False)
+            self._reply(
+                200,
+                {
+                    "choices": [{"message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(answer) // 4},
+                },
+            )
+
+        def _reply(self, status: int, payload: dict):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+@contextmanager
+def serve_stub_model(port: int = 0, delay: float = 0.0, fail_every: int = 0):
+    """Run the server in a thread; yields its base URL (…/v1)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(delay, fail_every))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub model server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds per answer")
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every Nth request with 503")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.delay, args.fail_every))
+    print(f"Stub model server on http://127.0.0.1:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
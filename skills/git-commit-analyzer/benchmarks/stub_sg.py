@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the ast-grep `sg` binary used by offline benchmarks.
+Answers every invocation with an empty JSON match list and logs the call,
+so subprocess counts and process-spawn overhead can be measured without ast-grep.
+"""
+
+import os
+import stat
+from pathlib import Path
+
+# POSIX shell keeps the stub's own startup cost close to a native binary.
+STUB_SCRIPT = """#!/bin/sh
+if [ "$1" = "--version" ]; then
+    echo "ast-grep 0.0.0 (benchmark stub)"
+    exit 0
+fi
+if [ -n "$SG_STUB_LOG" ]; then
+    echo "$1" >> "$SG_STUB_LOG"
+fi
+echo "[]"
+"""
+
+
+def install_stub_sg(bin_dir: str | Path) -> Path:
+    """Write executable `ast-grep`/`sg` stubs into bin_dir and return the sg path."""
+    bin_dir = Path(bin_dir)
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    for name in ("ast-grep", "sg"):
+        path = bin_dir / name
+        path.write_text(STUB_SCRIPT, encoding="utf-8")
+        path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
+
+
+def count_stub_calls(log_path: str | Path) -> int:
+    try:
+        with open(log_path, "r", encoding="utf-8") as f:
+            return sum(1 for _ in f)
+    except FileNotFoundError:
+        return 0
+
+
+def stub_environment(bin_dir: str | Path, log_path: str | Path) -> dict:
+    """Environment overrides that put the stub first on PATH."""
+    return {
+        "PATH": f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+        "SG_STUB_LOG": str(log_path),
+    }
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic git repository generator.
+Builds the whole history with a single `git fast-import` stream,
+so thousands of commits take seconds instead of minutes.
+"""
+
+import argparse
+import random
+import subprocess
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+
+# 2026-01-01T00:00:00Z; commits are spread forward from here so results
+# do not depend on the wall clock.
+BASE_TIMESTAMP = 1767225600
+
+LANG_EXT = {
+    "python": ".py",
+    "javascript": ".js",
+    "typescript": ".ts",
+    "go": ".go",
+    "rust": ".rs",
+    "java": ".java",
+}
+
+LOCKFILES = ["package-lock.json", "yarn.lock", "poetry.lock", "Cargo.lock"]
+
+WORDS = [
+    "user", "order", "payment", "cache", "token", "session", "report",
+    "invoice", "queue", "worker", "config", "account", "event", "item",
+]
+
+
+@dataclass
+class RepoSpec:
+    commits: int = 200
+    files_per_commit: int = 3
+    lines_per_file: int = 40
+    language_mix: dict[str, float] = field(
+        default_factory=lambda: {
+            "python": 0.4,
+            "javascript": 0.25,
+            "typescript": 0.2,
+            "go": 0.15,
+        }
+    )
+    lockfile_churn: float = 0.1
+    rename_rate: float = 0.05
+    authors: int = 5
+    seed: int = 42
+
+    @classmethod
+    def from_args(cls, args) -> "RepoSpec":
+        spec = cls(
+            commits=args.commits,
+            files_per_commit=args.files_per_commit,
+            lines_per_file=args.lines_per_file,
+            lockfile_churn=args.lockfile_churn,
+            rename_rate=args.rename_rate,
+            authors=args.authors,
+            seed=args.seed,
+        )
+        if args.langs:
+            spec.language_mix = parse_language_mix(args.langs)
+        return spec
+
+
+def parse_language_mix(text: str) -> dict[str, float]:
+    """Parse 'python=0.5,go=0.5' into a weight dict."""
+    mix = {}
+    for part in text.split(","):
+        lang, _, weight = part.partition("=")
+        lang = lang.strip()
+        if lang not in LANG_EXT:
+            raise ValueError(f"Unsupported language '{lang}' (known: {sorted(LANG_EXT)})")
+        mix[lang] = float(weight) if weight else 1.0
+    return mix
+
+
+def add_repo_spec_args(parser: argparse.ArgumentParser) -> None:
+    defaults = RepoSpec()
+    parser.add_argument("--commits", type=int, default=defaults.commits)
+    parser.add_argument("--files-per-commit", type=int, default=defaults.files_per_commit)
+    parser.add_argument("--lines-per-file", type=int, default=defaults.lines_per_file,
+                        help="Approximate changed lines per file per commit")
+    parser.add_argument("--langs", help="Language mix, e.g. 'python=0.5,typescript=0.5'")
+    parser.add_argument("--lockfile-churn", type=float, default=defaults.lockfile_churn,
+                        help="Probability that a commit rewrites a lockfile")
+    parser.add_argument("--rename-rate", type=float, default=defaults.rename_rate,
+                        help="Probability that a commit renames an existing file")
+    parser.add_argument("--authors", type=int, default=defaults.authors)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def _snippet(lang: str, rng: random.Random, n: int) -> list[str]:
+    """Generate roughly n lines of plausible code with occasional smells."""
+    lines: list[str] = []
+    while len(lines) < n:
+        name = f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{rng.randrange(10_000)}"
+        smell = rng.random()
+        if lang == "python":
+            lines += [f"def {name}(value):", f"    # handle {rng.choice(WORDS)}"]
+            if smell < 0.1:
+                lines += ["    try:", "        return eval(value)", "    except Exception:", "        pass"]
+            elif smell < 0.25:
+                lines += ["    print(value)"]
+            lines += [f"    return value * {rng.randrange(1, 9)}", ""]
+        elif lang in ("javascript", "typescript"):
+            typ = ": any" if lang == "typescript" and smell < 0.2 else ""
+            lines += [f"function {name}(value{typ}) {{"]
+            if smell < 0.15:
+                lines += ["  console.log(value);"]
+            elif smell < 0.25:
+                lines += ["  try { run(value); } catch (e) { }"]
+            lines += [f"  return value * {rng.randrange(1, 9)};", "}", ""]
+        elif lang == "go":
+            lines += [f"func {name}(value int) int {{", f"\treturn value * {rng.randrange(1, 9)}", "}", ""]
+        elif lang == "rust":
+            lines += [f"fn {name}(value: i64) -> i64 {{", f"    value * {rng.randrange(1, 9)}", "}", ""]
+        else:
+            lines += [f"static int {name}(int value) {{", f"    return value * {rng.randrange(1, 9)};", "}", ""]
+    return lines[:n]
+
+
+def _lockfile(rng: random.Random, n: int) -> list[str]:
+    return [
+        f'"{rng.choice(WORDS)}-{i}": {{"version": "{rng.randrange(1, 9)}.{rng.randrange(30)}.{rng.randrange(30)}"}},'
+        for i in range(n)
+    ]
+
+
+def _data(text: str) -> bytes:
+    raw = text.encode("utf-8")
+    return b"data %d\n" % len(raw) + raw + b"\n"
+
+
+def build_fast_import_stream(spec: RepoSpec) -> bytes:
+    """Render the full synthetic history as a git fast-import stream."""
+    rng = random.Random(spec.seed)
+    langs = list(spec.language_mix)
+    weights = [spec.language_mix[lang] for lang in langs]
+    authors = [(f"dev{i}", f"dev{i}@example.com") for i in range(spec.authors)]
+
+    files: dict[str, list[str]] = {}
+    out: list[bytes] = []
+    counter = 0
+
+    for i in range(spec.commits):
+        name, email = rng.choice(authors)
+        ts = BASE_TIMESTAMP + i * 600
+        ops: list[bytes] = []
+
+        if files and rng.random() < spec.rename_rate:
+            old = rng.choice(sorted(files))
+            new = str(Path(old).with_name(f"renamed_{i}_{Path(old).name}"))
+            files[new] = files.pop(old)
+            ops.append(f'R "{old}" "{new}"\n'.encode("utf-8"))
+
+        for _ in range(spec.files_per_commit):
+            lang = rng.choices(langs, weights)[0]
+            candidates = [p for p in files if p.endswith(LANG_EXT[lang])]
+            if candidates and rng.random() < 0.7:
+                path = rng.choice(candidates)
+                body = files[path]
+                start = rng.randrange(max(1, len(body)))
+                body[start:start + spec.lines_per_file // 2] = _snippet(lang, rng, spec.lines_per_file)
+            else:
+                counter += 1
+                path = f"src/{lang}/mod_{counter}{LANG_EXT[lang]}"
+                files[path] = _snippet(lang, rng, spec.lines_per_file)
+            ops.append(f"M 100644 inline {path}\n".encode("utf-8") + _data("\n".join(files[path]) + "\n"))
+
+        if rng.random() < spec.lockfile_churn:
+            lock = rng.choice(LOCKFILES)
+            files[lock] = _lockfile(rng, spec.lines_per_file * 5)
+            ops.append(f"M 100644 inline {lock}\n".encode("utf-8") + _data("\n".join(files[lock]) + "\n"))
+
+        message = f"{rng.choice(['feat', 'fix', 'refactor', 'chore'])}: {rng.choice(WORDS)} {rng.choice(WORDS)} #{i}"
+        out.append(b"commit refs/heads/main\n")
+        out.append(f"author {name} <{email}> {ts} +0000\n".encode("utf-8"))
+        out.append(f"committer {name} <{email}> {ts} +0000\n".encode("utf-8"))
+        out.append(_data(message))
+        out.extend(ops)
+        out.append(b"\n")
+
+    return b"".join(out)
+
+
+def generate_repo(path: str | Path, spec: RepoSpec) -> Path:
+    """Create (or overwrite) a synthetic repository at path."""
+    repo = Path(path)
+    repo.mkdir(parents=True, exist_ok=True)
+    subprocess.run(["git", "init", "-q", "-b", "main", str(repo)], check=True)
+    subprocess.run(
+        ["git", "fast-import", "--quiet", "--force"],
+        cwd=repo,
+        input=build_fast_import_stream(spec),
+        check=True,
+    )
+    subprocess.run(["git", "reset", "-q", "--hard", "main"], cwd=repo, check=True)
+    return repo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic git repository")
+    parser.add_argument("path", help="Where to create the repository")
+    add_repo_spec_args(parser)
+    args = parser.parse_args()
+
+    spec = RepoSpec.from_args(args)
+    generate_repo(args.path, spec)
+    print(f"Generated {spec.commits} commits -> {args.path}")
+    print(f"  Spec: {asdict(spec)}")
+
+
+if __name__ == "__main__":
+    main()
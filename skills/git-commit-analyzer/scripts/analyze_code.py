@@ -8,23 +8,66 @@ Detects bullshit patterns and calculates real contribution metrics.
 """
 
 import argparse
+import io
 import json
+import os
 import re
 from dataclasses import dataclass, asdict, field
 from pathlib import Path
 
+from profiling import (
+    PROFILER,
+    add_profile_args,
+    count,
+    profile_session,
+    profiled,
+    stage,
+)
+from commit_store import (
+    CommitStore,
+    StoreQueryError,
+    add_query_args,
+    check_query_args,
+    load_from_store,
+    store_path,
+)
+from fetch_commits import read_blobs
+from history_store import HistoryStore, commit_days, default_history_path
+from scoring import ScoringConfig, ScoringConfigError, score_features, rescore_metrics
+
 AST_GREP_AVAILABLE = False
 analyze_diff_with_ast_grep = None
+analyze_diffs_batch = None
+analyze_post_images = None
 get_linus_comments_for_issues = None
+ScanBudget = None
+ScanScheduler = None
+configure_ast_cache = None
+configure_rule_packs = None
+configure_sg_workers = None
 
 try:
     from ast_analyzer import (
+        ScanBudget as _ScanBudget,
+        ScanScheduler as _ScanScheduler,
         analyze_diff_with_ast_grep as _analyze_diff,
+        analyze_diffs_batch as _analyze_diffs_batch,
+        analyze_post_images as _analyze_post_images,
+        configure_ast_cache as _configure_ast_cache,
+        configure_rule_packs as _configure_rule_packs,
+        configure_sg_workers as _configure_sg_workers,
         get_linus_comments_for_issues as _get_linus_comments,
     )
 
     analyze_diff_with_ast_grep = _analyze_diff
+    analyze_diffs_batch = _analyze_diffs_batch
+    analyze_post_images = _analyze_post_images
     get_linus_comments_for_issues = _get_linus_comments
+    ScanBudget = _ScanBudget
+    ScanScheduler = _ScanScheduler
+    configure_ast_cache = _configure_ast_cache
+    configure_rule_packs = _configure_rule_packs
+    configure_sg_workers = _configure_sg_workers
     AST_GREP_AVAILABLE = True
 except ImportError:
     pass
@@ -47,11 +90,16 @@ class CodeMetrics:
     is_auto_generated: bool = False
     is_likely_copypaste: bool = False
     is_trivial: bool = False
+    is_approximate: bool = False
+    approximate_files: list[str] = field(default_factory=list)
     warnings: list[str] = field(default_factory=list)
     substance_score: float = 0.0
     bullshit_score: float = 0.0
     ast_grep_issues: int = 0
     ast_grep_bullshit: float = 0.0
+    ast_issues_by_rule: dict[str, int] = field(default_factory=dict)
+    ast_bullshit_by_rule: dict[str, float] = field(default_factory=dict)
+    ast_files_skipped: int = 0
     code_smells: list[str] = field(default_factory=list)
 
 
@@ -113,6 +161,7 @@ TEST_FILE_PATTERNS = [
 ]
 
 
+@profiled("detector.file_patterns")
 def is_auto_generated_file(filepath: str) -> bool:
     """Check if file is typically auto-generated."""
     for pattern in AUTO_GENERATED_FILES:
@@ -121,6 +170,7 @@ def is_auto_generated_file(filepath: str) -> bool:
     return False
 
 
+@profiled("detector.file_patterns")
 def is_test_file(filepath: str) -> bool:
     """Check if file is a test file."""
     for pattern in TEST_FILE_PATTERNS:
@@ -129,43 +179,141 @@ def is_test_file(filepath: str) -> bool:
     return False
 
 
-def parse_diff(diff_text: str) -> dict:
-    """Parse unified diff format into structured data."""
+@dataclass
+class DiffLimits:
+    """
+    Size guard for huge diffs (vendored dumps, generated SQL, ...).
+    Above these thresholds lines are sampled instead of kept, the AST scan is
+    skipped and metrics are marked approximate, bounding per-commit latency.
+    """
+
+    max_file_lines: int = 5000  # per side (added / deleted) per file
+    max_commit_lines: int = 20000  # added + deleted across the commit
+    sample_lines: int = 500  # lines kept per side once sampling kicks in
+
+
+class LineSampler:
+    """
+    Keep every line up to `exact_limit`, then an evenly spaced sample of
+    about `sample_size` lines (stride doubles as the stream grows).
+    """
+
+    __slots__ = ("lines", "count", "stride", "exact_limit", "sample_size")
+
+    def __init__(self, exact_limit: int, sample_size: int):
+        self.lines: list[str] = []
+        self.count = 0
+        self.stride = 1
+        self.exact_limit = exact_limit
+        self.sample_size = max(1, sample_size)
+
+    @property
+    def approximate(self) -> bool:
+        return self.stride > 1
+
+    def add(self, line: str) -> None:
+        if self.count % self.stride == 0:
+            self.lines.append(line)
+            if self.stride == 1:
+                if len(self.lines) > self.exact_limit:
+                    self.stride = -(-len(self.lines) // self.sample_size)
+                    self.lines = self.lines[:: self.stride]
+            elif len(self.lines) >= 2 * self.sample_size:
+                self.lines = self.lines[::2]
+                self.stride *= 2
+        self.count += 1
+
+
+HUNK_HEADER = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)")
+
+
+def parse_diff(diff_text: str, limits: DiffLimits | None = None) -> dict:
+    """
+    Parse unified diff format into structured data.
+    Lines are streamed; with `limits`, oversized files keep only a sample
+    and are flagged "approximate" (counts stay exact).
+    Each file also gets "added_ranges": inclusive [start, end] post-image
+    line numbers (1-based) of its added lines, from the hunk headers.
+    """
+    if limits is None:
+        exact_limit = sample_size = commit_limit = float("inf")
+    else:
+        exact_limit = limits.max_file_lines
+        sample_size = limits.sample_lines
+        commit_limit = limits.max_commit_lines
+
     files = []
     current_file = None
-    added_lines = []
-    deleted_lines = []
+    added = deleted = None
+    ranges: list[list[int]] = []
+    new_line = None
+    total_lines = 0
+    commit_over_limit = False
 
-    for line in diff_text.split("\n"):
+    def flush():
+        files.append(
+            {
+                "path": current_file,
+                "added": added.lines,
+                "deleted": deleted.lines,
+                "added_count": added.count,
+                "deleted_count": deleted.count,
+                "approximate": added.approximate or deleted.approximate,
+                "added_ranges": ranges,
+            }
+        )
+
+    for line in io.StringIO(diff_text):
+        if line.endswith("\n"):
+            line = line[:-1]
         # New file header
         if line.startswith("+++ b/") or line.startswith("+++ "):
             if current_file:
-                files.append(
-                    {
-                        "path": current_file,
-                        "added": added_lines,
-                        "deleted": deleted_lines,
-                    }
-                )
+                flush()
             current_file = line.replace("+++ b/", "").replace("+++ ", "").strip()
-            added_lines = []
-            deleted_lines = []
+            file_limit = 0 if commit_over_limit else exact_limit
+            added = LineSampler(file_limit, sample_size)
+            deleted = LineSampler(file_limit, sample_size)
+            ranges = []
+            new_line = None
+        elif current_file is None:
+            continue
+        elif line.startswith("@@"):
+            match = HUNK_HEADER.match(line)
+            new_line = int(match.group(1)) if match else None
+            continue
         elif line.startswith("+") and not line.startswith("+++"):
-            added_lines.append(line[1:])
+            added.add(line[1:])
+            total_lines += 1
+            if new_line is not None:
+                if ranges and ranges[-1][1] == new_line - 1:
+                    ranges[-1][1] = new_line
+                else:
+                    ranges.append([new_line, new_line])
+                new_line += 1
         elif line.startswith("-") and not line.startswith("---"):
-            deleted_lines.append(line[1:])
+            deleted.add(line[1:])
+            total_lines += 1
+        else:
+            if new_line is not None and line.startswith(" "):
+                new_line += 1
+            continue
+
+        if not commit_over_limit and total_lines > commit_limit:
+            commit_over_limit = True
+            # Start sampling the rest of the current file immediately
+            added.exact_limit = deleted.exact_limit = 0
 
     # Don't forget last file
     if current_file:
-        files.append(
-            {
-                "path": current_file,
-                "added": added_lines,
-                "deleted": deleted_lines,
-            }
-        )
+        flush()
 
-    return {"files": files}
+    return {
+        "files": files,
+        "total_lines": total_lines,
+        "approximate": commit_over_limit or any(f["approximate"] for f in files),
+        "commit_over_limit": commit_over_limit,
+    }
 
 
 def is_whitespace_only(line: str) -> bool:
@@ -187,6 +335,7 @@ def is_comment_line(line: str) -> bool:
     )
 
 
+@profiled("detector.effective_lines")
 def count_effective_lines(lines: list[str]) -> int:
     """Count non-whitespace, non-comment lines."""
     count = 0
@@ -196,6 +345,7 @@ def count_effective_lines(lines: list[str]) -> int:
     return count
 
 
+@profiled("detector.auto_generated")
 def detect_auto_generated(lines: list[str]) -> bool:
     """Detect auto-generated code patterns."""
     content = "\n".join(lines[:50])  # Check first 50 lines
@@ -205,6 +355,7 @@ def detect_auto_generated(lines: list[str]) -> bool:
     return False
 
 
+@profiled("detector.copypaste")
 def detect_copypaste(lines: list[str], threshold: int = 10) -> bool:
     """
     Detect likely copy-paste by looking for repeated patterns.
@@ -225,6 +376,7 @@ def detect_copypaste(lines: list[str], threshold: int = 10) -> bool:
     return repetition_ratio > 0.5 and len(normalized) > threshold
 
 
+@profiled("detector.formatting_only")
 def detect_formatting_only(added: list[str], deleted: list[str]) -> bool:
     """
     Detect if changes are formatting-only.
@@ -251,6 +403,7 @@ def detect_formatting_only(added: list[str], deleted: list[str]) -> bool:
     return False
 
 
+@profiled("detector.rename_only")
 def detect_rename_only(files: list[dict]) -> bool:
     """Detect if commit is just file renames."""
     if not files:
@@ -266,9 +419,17 @@ def detect_rename_only(files: list[dict]) -> bool:
     return len(files) > 0
 
 
-def analyze_commit(commit: dict) -> CodeMetrics:
-    """Analyze a single commit and return objective metrics."""
+def extract_features(
+    commit: dict, limits: DiffLimits | None = None
+) -> tuple[CodeMetrics, list[dict]]:
+    """
+    Compute every text-level feature of a commit (no AST scan, no scores).
+    Returns the partial metrics and the parsed files eligible for the AST scan.
+    Diffs beyond `limits` (default DiffLimits()) are analyzed from sampled
+    lines, skip the AST scan and are flagged is_approximate.
+    """
     metrics = CodeMetrics()
+    limits = limits or DiffLimits()
 
     diff_text = commit.get("diff", "")
     stats = commit.get("stats", {})
@@ -281,9 +442,19 @@ def analyze_commit(commit: dict) -> CodeMetrics:
     metrics.files_changed = stats.get("files_changed", 0)
 
     # Parse diff for detailed analysis
-    parsed = parse_diff(diff_text)
+    with stage("parse_diff", len(diff_text)):
+        parsed = parse_diff(diff_text, limits)
     files = parsed.get("files", [])
 
+    if parsed.get("approximate"):
+        metrics.is_approximate = True
+        metrics.approximate_files = [f["path"] for f in files if f.get("approximate")]
+        metrics.warnings.append(
+            f"⚠️ Large diff ({parsed['total_lines']} lines): "
+            "metrics approximated from sampled lines"
+        )
+        count("analyze.approximate_commits")
+
     all_added = []
     all_deleted = []
     auto_gen_files = 0
@@ -293,6 +464,11 @@ def analyze_commit(commit: dict) -> CodeMetrics:
         filepath = f.get("path", "")
         added = f.get("added", [])
         deleted = f.get("deleted", [])
+        # Sampled files scale their counts back up to the real line totals
+        added_scale = f.get("added_count", len(added)) / len(added) if added else 0
+        deleted_scale = (
+            f.get("deleted_count", len(deleted)) / len(deleted) if deleted else 0
+        )
 
         all_added.extend(added)
         all_deleted.extend(deleted)
@@ -304,11 +480,17 @@ def analyze_commit(commit: dict) -> CodeMetrics:
 
         if is_test_file(filepath):
             test_files += 1
-            metrics.test_lines_added += count_effective_lines(added)
+            metrics.test_lines_added += round(
+                count_effective_lines(added) * added_scale
+            )
 
         # Effective lines (non-whitespace, non-comment)
-        metrics.effective_lines_added += count_effective_lines(added)
-        metrics.effective_lines_deleted += count_effective_lines(deleted)
+        metrics.effective_lines_added += round(
+            count_effective_lines(added) * added_scale
+        )
+        metrics.effective_lines_deleted += round(
+            count_effective_lines(deleted) * deleted_scale
+        )
 
     # Bullshit detection
     if files:
@@ -353,102 +535,152 @@ def analyze_commit(commit: dict) -> CodeMetrics:
         if "📝 Trivial commit" not in str(metrics.warnings):
             metrics.warnings.append("📝 Trivial commit (< 5 effective lines)")
 
-    if (
+    # Oversized commits skip the AST scan entirely; oversized files are dropped
+    ast_files = (
+        []
+        if parsed.get("commit_over_limit")
+        else [f for f in files if not f.get("approximate")]
+    )
+    blobs = {f.get("path"): f.get("blob") for f in changed_files}
+    for f in ast_files:
+        if blobs.get(f["path"]):
+            f["blob"] = blobs[f["path"]]
+    return metrics, ast_files
+
+
+def ast_scan_enabled() -> bool:
+    return bool(
         AST_GREP_AVAILABLE
-        and files
         and analyze_diff_with_ast_grep
         and get_linus_comments_for_issues
-    ):
-        ast_result = analyze_diff_with_ast_grep(files)
-        metrics.ast_grep_issues = ast_result.get("total_matches", 0)
-        metrics.ast_grep_bullshit = ast_result.get("total_bullshit_from_ast", 0)
-
-        for match in ast_result.get("matches", [])[:10]:
-            metrics.code_smells.append(f"{match['rule']}: {match['description']}")
-
-        linus_comments = get_linus_comments_for_issues(ast_result.get("matches", []))
-        metrics.warnings.extend(linus_comments[:3])
-
-    metrics.substance_score = calculate_substance_score(metrics)
-    metrics.bullshit_score = calculate_bullshit_score(metrics)
-
-    return metrics
+    )
 
 
-def calculate_substance_score(m: CodeMetrics) -> float:
-    """
-    Calculate how much "real" work this commit represents.
-    0-100 scale.
-    """
-    if m.is_formatting_only or m.is_rename_only:
-        return 5.0
+def apply_ast_result(metrics: CodeMetrics, ast_result: dict) -> None:
+    """Fold an analyze_diff_with_ast_grep result into the commit metrics."""
+    metrics.ast_grep_issues = ast_result.get("total_matches", 0)
+    metrics.ast_grep_bullshit = ast_result.get("total_bullshit_from_ast", 0)
+    metrics.ast_issues_by_rule = dict(
+        ast_result.get("summary", {}).get("by_rule", {})
+    )
+    metrics.ast_bullshit_by_rule = dict(
+        ast_result.get("summary", {}).get("bullshit_by_rule", {})
+    )
+    metrics.ast_files_skipped = ast_result.get("files_skipped", 0)
+    if metrics.ast_files_skipped:
+        scanned = ast_result.get("files_analyzed", 0)
+        metrics.warnings.append(
+            f"⏱️ AST scan timed out or over budget: scanned {scanned}/"
+            f"{scanned + metrics.ast_files_skipped} files"
+        )
 
-    if m.is_auto_generated:
-        return 2.0
+    for match in ast_result.get("matches", [])[:10]:
+        metrics.code_smells.append(f"{match['rule']}: {match['description']}")
 
-    score = 0.0
+    linus_comments = get_linus_comments_for_issues(ast_result.get("matches", []))
+    metrics.warnings.extend(linus_comments[:3])
 
-    # Effective lines matter more than raw lines
-    score += min(m.effective_lines_added * 0.5, 30)
 
-    # Structural changes are valuable
-    score += m.functions_added * 5
-    score += m.classes_added * 8
+def blob_reader(repo_path: str):
+    """read_blobs callback for analyze_post_images over a local clone."""
+    return lambda shas: read_blobs(repo_path, shas)
 
-    # Tests are valuable
-    score += min(m.test_lines_added * 0.3, 15)
 
-    # Deletions can be good (cleanup)
-    score += min(m.effective_lines_deleted * 0.2, 10)
+def analyze_commit(
+    commit: dict,
+    scoring_config: ScoringConfig | None = None,
+    limits: DiffLimits | None = None,
+    scheduler: "ScanScheduler | None" = None,
+    post_image_repo: str | None = None,
+) -> CodeMetrics:
+    """Analyze a single commit and return objective metrics."""
+    metrics, ast_files = extract_features(commit, limits)
+
+    if ast_files and ast_scan_enabled():
+        with stage("ast_grep"):
+            if post_image_repo:
+                ast_result = analyze_post_images(
+                    {0: ast_files}, blob_reader(post_image_repo), scheduler=scheduler
+                )[0]
+            else:
+                ast_result = analyze_diff_with_ast_grep(ast_files, scheduler)
+        apply_ast_result(metrics, ast_result)
+
+    with stage("scoring"):
+        substance, bullshit = score_features([asdict(metrics)], scoring_config)
+    metrics.substance_score = substance[0]
+    metrics.bullshit_score = bullshit[0]
 
-    # Penalties
-    if m.is_likely_copypaste:
-        score *= 0.3
+    return metrics
 
-    if m.is_trivial:
-        score *= 0.5
 
-    return min(score, 100.0)
+def calculate_substance_score(
+    m: CodeMetrics, config: ScoringConfig | None = None
+) -> float:
+    """
+    Calculate how much "real" work this commit represents.
+    0-100 scale. Weights come from ScoringConfig (see scoring.py).
+    """
+    return score_features([asdict(m)], config)[0][0]
 
 
-def calculate_bullshit_score(m: CodeMetrics) -> float:
+def calculate_bullshit_score(
+    m: CodeMetrics, config: ScoringConfig | None = None
+) -> float:
     """
     Calculate how much of this commit is fluff/noise.
     0-100 scale. Higher = more bullshit.
     """
-    score = 0.0
-
-    if m.is_formatting_only:
-        score += 40
-
-    if m.is_rename_only:
-        score += 30
-
-    if m.is_auto_generated:
-        score += 50
-
-    if m.is_likely_copypaste:
-        score += 35
-
-    if m.is_trivial:
-        score += 20
-
-    if m.lines_added > 0:
-        effective_ratio = m.effective_lines_added / m.lines_added
-        if effective_ratio < 0.3:
-            score += 25 * (1 - effective_ratio)
-
-    score += m.ast_grep_bullshit
-
-    return min(score, 100.0)
-
+    return score_features([asdict(m)], config)[1][0]
+
+
+def analyze_commits(
+    commits: list[dict],
+    scoring_config: ScoringConfig | None = None,
+    profile: bool = False,
+    limits: DiffLimits | None = None,
+    batch_ast: bool = True,
+    scan_budget: "ScanBudget | None" = None,
+    post_image_repo: str | None = None,
+) -> dict:
+    """
+    Analyze all commits and generate summary.
+    With batch_ast the AST scan for the whole range runs as a handful of
+    batched ast-grep invocations instead of one per file per commit, and
+    scores are computed in one vectorized pass.
+    `scan_budget` caps ast-grep concurrency and time for the whole run;
+    files it leaves unscanned show up as ast_files_skipped.
+    With post_image_repo (a local clone holding the commits) rules run on
+    whole post-image files and only matches on added lines are kept.
+    With profile=True the result carries a per-stage timing report.
+    """
+    if profile:
+        with PROFILER.activate():
+            analysis = analyze_commits(
+                commits,
+                scoring_config,
+                limits=limits,
+                batch_ast=batch_ast,
+                scan_budget=scan_budget,
+                post_image_repo=post_image_repo,
+            )
+            analysis["profile"] = PROFILER.report()
+        return analysis
+
+    scheduler = ScanScheduler(scan_budget) if ScanScheduler else None
+    if batch_ast:
+        all_metrics = analyze_commits_batched(
+            commits, scoring_config, limits, scheduler, post_image_repo
+        )
+    else:
+        all_metrics = [
+            analyze_commit(c, scoring_config, limits, scheduler, post_image_repo)
+            for c in commits
+        ]
 
-def analyze_commits(commits: list[dict]) -> dict:
-    """Analyze all commits and generate summary."""
     results = []
 
-    for commit in commits:
-        metrics = analyze_commit(commit)
+    for commit, metrics in zip(commits, all_metrics):
         results.append(
             {
                 "sha": commit.get("sha", "")[:8],
@@ -458,6 +690,68 @@ def analyze_commits(commits: list[dict]) -> dict:
             }
         )
 
+    analysis = summarize_results(results)
+    analysis["scoring"] = scoring_info(scoring_config)
+    return analysis
+
+
+def analyze_commits_batched(
+    commits: list[dict],
+    scoring_config: ScoringConfig | None = None,
+    limits: DiffLimits | None = None,
+    scheduler: "ScanScheduler | None" = None,
+    post_image_repo: str | None = None,
+) -> list[CodeMetrics]:
+    """Per-commit metrics with one batched AST scan and one scoring pass."""
+    staged = [extract_features(c, limits) for c in commits]
+
+    if ast_scan_enabled():
+        pending = {i: files for i, (_, files) in enumerate(staged) if files}
+        if pending:
+            with stage("ast_grep"):
+                if post_image_repo:
+                    ast_results = analyze_post_images(
+                        pending, blob_reader(post_image_repo), scheduler=scheduler
+                    )
+                else:
+                    ast_results = analyze_diffs_batch(pending, scheduler=scheduler)
+            for i, ast_result in ast_results.items():
+                apply_ast_result(staged[i][0], ast_result)
+
+    all_metrics = [metrics for metrics, _ in staged]
+    with stage("scoring"):
+        substance, bullshit = score_features(
+            [asdict(m) for m in all_metrics], scoring_config
+        )
+    for m, sub, bs in zip(all_metrics, substance, bullshit):
+        m.substance_score = sub
+        m.bullshit_score = bs
+    return all_metrics
+
+
+def scoring_info(config: ScoringConfig | None) -> dict:
+    config = config or ScoringConfig()
+    return {"formula": config.formula, "config_hash": config.fingerprint()}
+
+
+def rescore_analysis(analysis: dict, config: ScoringConfig | None = None) -> dict:
+    """
+    Re-score a persisted *_metrics.json from its raw features.
+    No diff parsing or ast-grep involved - one pass over the whole history.
+    """
+    results = analysis.get("commits", [])
+    rescore_metrics([r["metrics"] for r in results], config)
+
+    rescored = summarize_results(results)
+    for key in ("source", "period"):
+        if key in analysis:
+            rescored[key] = analysis[key]
+    rescored["scoring"] = scoring_info(config)
+    return rescored
+
+
+def summarize_results(results: list[dict]) -> dict:
+    """Aggregate per-commit results by author and overall."""
     by_author: dict[str, dict] = {}
 
     for r in results:
@@ -490,7 +784,7 @@ def analyze_commits(commits: list[dict]) -> dict:
         "commits": results,
         "by_author": dict(by_author),
         "summary": {
-            "total_commits": len(commits),
+            "total_commits": len(results),
             "total_effective_lines": sum(
                 r["metrics"]["effective_lines_added"] for r in results
             ),
@@ -509,39 +803,269 @@ def analyze_commits(commits: list[dict]) -> dict:
     }
 
 
-def main():
-    parser = argparse.ArgumentParser(description="Objective code analysis for commits")
-    parser.add_argument(
-        "commits_file", help="Path to commits.json from fetch_commits.py"
-    )
-    parser.add_argument(
-        "--output", "-o", help="Output file (default: analysis_metrics.json)"
+def analyze_data(
+    data: dict,
+    scoring_config: ScoringConfig | None = None,
+    limits: DiffLimits | None = None,
+    batch_ast: bool = True,
+    scan_budget: "ScanBudget | None" = None,
+    post_image_repo: str | None = None,
+) -> dict:
+    """*_metrics.json contents for in-memory commits.json contents."""
+    analysis = analyze_commits(
+        data.get("commits", []),
+        scoring_config,
+        limits=limits,
+        batch_ast=batch_ast,
+        scan_budget=scan_budget,
+        post_image_repo=post_image_repo,
     )
 
-    args = parser.parse_args()
-
-    with open(args.commits_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    commits = data.get("commits", [])
-    analysis = analyze_commits(commits)
-
     # Add metadata
     analysis["source"] = data.get("source")
     analysis["period"] = {
         "since": data.get("since"),
         "until": data.get("until"),
     }
+    return analysis
+
+
+def record_history(
+    args,
+    source: str | None,
+    results: list[dict],
+    days: dict[str, str] | None = None,
+) -> None:
+    """Append results to the history store when --history is given."""
+    if args.history is None:
+        return
+    path = args.history or default_history_path()
+    if path is None:
+        print("--history: disabled by GCA_HISTORY")
+        return
+    with HistoryStore(path) as store:
+        written = store.record(source or "", results, days)
+    print(f"History updated: {path} ({written} commits)")
+
+
+def store_results(args, data: dict, analysis: dict, ingest: bool = True) -> None:
+    """
+    Save commits (unless they came from the store) and their metrics when
+    --store is given.
+    """
+    if args.store is None:
+        return
+    path = store_path(args)
+    with CommitStore(path) as store:
+        if ingest:
+            store.add_commits(data)
+        written = store.add_metrics(
+            data.get("commits", []),
+            analysis["commits"],
+            analysis["scoring"].get("config_hash"),
+            data.get("source") or "",
+        )
+    print(f"Commit store updated: {path} ({written} commits)")
+
+
+def run(args):
+    """Analyze (or rescore) the input file as requested by CLI args."""
+    scoring_config = (
+        ScoringConfig.load(args.scoring_config) if args.scoring_config else None
+    )
 
-    output_path = args.output or args.commits_file.replace(".json", "_metrics.json")
-    with open(output_path, "w", encoding="utf-8") as f:
+    if args.commits_file:
+        with stage("json.load"), open(args.commits_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    else:
+        data, _ = load_from_store(args, metrics=False)
+        print(f"Loaded {data['commit_count']} commits from the commit store")
+    if configure_rule_packs and args.rule_pack:
+        configure_rule_packs(args.rule_pack)
+
+    if args.rescore:
+        analysis = rescore_analysis(data, scoring_config)
+        output_path = args.output or args.commits_file.replace(
+            ".json", "_rescored.json"
+        )
+        with stage("json.dump"), open(output_path, "w", encoding="utf-8") as f:
+            json.dump(analysis, f, indent=2, ensure_ascii=False)
+
+        record_history(args, analysis.get("source"), analysis["commits"])
+        print(f"Rescore complete: {output_path}")
+        print(f"  Commits rescored: {len(analysis['commits'])}")
+        summary = analysis["summary"]
+        print(f"  Avg substance score: {summary['avg_substance_score']:.1f}")
+        print(f"  Avg bullshit score: {summary['avg_bullshit_score']:.1f}")
+        return
+
+    limits = DiffLimits(
+        max_file_lines=args.max_file_lines,
+        max_commit_lines=args.max_commit_lines,
+        sample_lines=args.sample_lines,
+    )
+    scan_budget = (
+        ScanBudget(
+            max_workers=args.ast_workers,
+            call_timeout=args.ast_timeout,
+            run_budget=args.ast_budget,
+        )
+        if ScanBudget
+        else None
+    )
+    if configure_ast_cache and (args.ast_cache or args.no_ast_cache):
+        configure_ast_cache(None if args.no_ast_cache else args.ast_cache)
+    if configure_sg_workers and args.no_sg_workers:
+        configure_sg_workers(False)
+    post_image_repo = args.post_image
+    if post_image_repo == "":
+        source = data.get("source") or ""
+        post_image_repo = source if os.path.isdir(source) else None
+        if not post_image_repo:
+            print("--post-image: source is not a local repository; scanning hunks only")
+    commits = data.get("commits", [])
+    analysis = analyze_data(
+        data,
+        scoring_config,
+        limits=limits,
+        batch_ast=not args.no_batch_ast,
+        scan_budget=scan_budget,
+        post_image_repo=post_image_repo,
+    )
+
+    input_name = args.commits_file or "commits.json"
+    output_path = args.output or input_name.replace(".json", "_metrics.json")
+    with stage("json.dump"), open(output_path, "w", encoding="utf-8") as f:
         json.dump(analysis, f, indent=2, ensure_ascii=False)
 
+    store_results(args, data, analysis, ingest=bool(args.commits_file))
+    record_history(args, data.get("source"), analysis["commits"], commit_days(commits))
     print(f"Analysis complete: {output_path}")
     print(f"  Commits analyzed: {len(commits)}")
     print(f"  Avg substance score: {analysis['summary']['avg_substance_score']:.1f}")
     print(f"  Avg bullshit score: {analysis['summary']['avg_bullshit_score']:.1f}")
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Objective code analysis for commits")
+    parser.add_argument(
+        "commits_file",
+        nargs="?",
+        help="Path to commits.json from fetch_commits.py "
+        "(or query the commit store with --store)",
+    )
+    parser.add_argument(
+        "--output", "-o", help="Output file (default: analysis_metrics.json)"
+    )
+    parser.add_argument(
+        "--scoring-config", help="JSON file overriding scoring weights (see scoring.py)"
+    )
+    parser.add_argument(
+        "--rescore",
+        action="store_true",
+        help="Input is an existing *_metrics.json; recompute scores from its features",
+    )
+    parser.add_argument(
+        "--max-file-lines",
+        type=int,
+        default=DiffLimits.max_file_lines,
+        help="Per-file added/deleted lines before switching to sampled analysis",
+    )
+    parser.add_argument(
+        "--max-commit-lines",
+        type=int,
+        default=DiffLimits.max_commit_lines,
+        help="Per-commit changed lines before sampling everything and skipping AST",
+    )
+    parser.add_argument(
+        "--no-batch-ast",
+        action="store_true",
+        help="Scan each commit separately instead of one batched ast-grep run",
+    )
+    parser.add_argument(
+        "--sample-lines",
+        type=int,
+        default=DiffLimits.sample_lines,
+        help="Lines kept per side of an oversized file",
+    )
+    parser.add_argument(
+        "--ast-workers",
+        type=int,
+        default=ScanBudget.max_workers if ScanBudget else 1,
+        help="Concurrent ast-grep processes",
+    )
+    parser.add_argument(
+        "--ast-timeout",
+        type=float,
+        default=ScanBudget.call_timeout if ScanBudget else 10,
+        help="Seconds allowed per ast-grep call",
+    )
+    parser.add_argument(
+        "--ast-budget",
+        type=float,
+        metavar="SECONDS",
+        help="Total ast-grep scanning time for the run (diff parsing and text "
+        "analysis do not count); files left unscanned are reported as skipped",
+    )
+    parser.add_argument(
+        "--ast-cache",
+        metavar="PATH",
+        help="SQLite match cache "
+        "(default: $GCA_AST_CACHE or ~/.cache/git-commit-analyzer)",
+    )
+    parser.add_argument(
+        "--no-ast-cache",
+        action="store_true",
+        help="Scan every snippet even if its matches are cached",
+    )
+    parser.add_argument(
+        "--no-sg-workers",
+        action="store_true",
+        help="Spawn ast-grep per snippet instead of keeping `ast-grep lsp` workers",
+    )
+    parser.add_argument(
+        "--rule-pack",
+        action="append",
+        metavar="DIR",
+        help="Extra detection rules from YAML/JSON packs in DIR (repeatable; "
+        "default: $GCA_RULE_PACKS)",
+    )
+    parser.add_argument(
+        "--post-image",
+        nargs="?",
+        const="",
+        metavar="REPO",
+        help="Scan whole post-image files from this local clone (default: the "
+        "commits' source) and keep matches on added lines",
+    )
+    parser.add_argument(
+        "--history",
+        nargs="?",
+        const="",
+        metavar="PATH",
+        help="Append per-author daily rollups to this SQLite store for trend reports "
+        "(default: $GCA_HISTORY or ~/.local/share/git-commit-analyzer/history.sqlite)",
+    )
+    add_query_args(
+        parser,
+        "Analyze the commits matching the filters below from the SQLite commit store, "
+        "and save their metrics there; with a commits file, ingest it first",
+    )
+    add_profile_args(parser)
+
+    args = parser.parse_args()
+    check_query_args(args, parser, bool(args.commits_file), file_with_store=True)
+    if args.rescore and args.store is not None:
+        parser.error(
+            "--rescore reads a *_metrics.json file; it cannot be combined with --store"
+        )
+
+    with profile_session(args, "analyze_code"):
+        try:
+            run(args)
+        except (ScoringConfigError, StoreQueryError) as e:
+            parser.error(str(e))
+
+
 if __name__ == "__main__":
     main()
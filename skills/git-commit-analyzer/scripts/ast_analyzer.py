@@ -4,25 +4,32 @@ AST-based code analysis using ast-grep (sg).
 Multi-language support with pattern-based detection.
 """
 
+import atexit
+import functools
+import hashlib
+import itertools
 import json
 import os
-import re
 import shutil
 import subprocess
 import tempfile
-from dataclasses import dataclass, field
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 
-
-@dataclass
-class AstPattern:
-    name: str
-    pattern: str
-    lang: str
-    severity: str  # "error", "warning", "info"
-    category: str  # "smell", "ai_generated", "antipattern", "security"
-    description: str
-    bullshit_score: int = 0
+import python_engine
+from ast_cache import (
+    DEFAULT_MAX_ENTRIES,
+    AstCache,
+    blob_key,
+    default_cache_path,
+    snippet_key,
+)
+from profiling import count, stage
+from rule_registry import AstPattern, RuleRegistry, default_pack_dirs
+from sg_worker import WorkerPool
 
 
 LANG_MAP = {
@@ -190,8 +197,176 @@ DETECTION_RULES: list[AstPattern] = [
 # fmt: on
 
 
+EXT_FOR_LANG = {lang: ext for ext, lang in LANG_MAP.items()}
+
+SG_TIMEOUT = 10
+
+_workdir: str | None = None
+_workdir_lock = threading.Lock()
+_snippet_counter = itertools.count()
+_ast_cache: AstCache | None = None
+_ast_cache_configured = False
+_registry: RuleRegistry | None = None
+_sg_pool: WorkerPool | None = None
+_sg_workers_enabled = True
+_sg_pool_lock = threading.Lock()
+
+# Placeholder result for work the run budget did not leave time for
+SKIPPED = object()
+# Result of an ast-grep call that ran out of time, as opposed to one that
+# failed (None)
+TIMED_OUT = object()
+
+
+@dataclass
+class ScanBudget:
+    """Concurrency and time limits for the ast-grep calls of one run."""
+
+    max_workers: int = min(4, os.cpu_count() or 1)
+    call_timeout: float = SG_TIMEOUT  # seconds per ast-grep process
+    run_budget: float | None = None  # seconds for the whole run; None = unbounded
+
+
+class ScanScheduler:
+    """
+    Run ast-grep jobs on a thread pool under a ScanBudget.
+    The run budget is shared by every map() call, so use one scheduler per
+    analysis run; it only runs down while map() is scanning, so diff parsing
+    and text analysis between scans do not use it up. Jobs that would start
+    with the budget spent are skipped; a running call's timeout is capped at
+    the time left.
+    """
+
+    def __init__(self, budget: ScanBudget | None = None):
+        self.budget = budget or ScanBudget()
+        self.spent = 0.0
+        # Set while map() runs under a run budget
+        self.deadline: float | None = None
+
+    def timeout(self, base: float | None = None) -> float | None:
+        """Timeout for a call starting now; None once the run budget is spent."""
+        if base is None:
+            base = self.budget.call_timeout
+        if self.deadline is None:
+            return base
+        left = self.deadline - time.monotonic()
+        return min(base, left) if left > 0 else None
+
+    def map(self, func, items: list, base_timeout=None) -> list:
+        """
+        Call func(item, timeout) for every item, max_workers at a time.
+        Results keep input order; items the run budget skipped yield SKIPPED.
+        `base_timeout(item)` overrides the per-call timeout for large items.
+        """
+
+        def job(item):
+            timeout = self.timeout(base_timeout(item) if base_timeout else None)
+            if timeout is None:
+                count("ast_grep.budget_skips")
+                return SKIPPED
+            return func(item, timeout)
+
+        workers = max(1, min(self.budget.max_workers, len(items)))
+        start = time.monotonic()
+        if self.budget.run_budget is not None:
+            self.deadline = start + max(0.0, self.budget.run_budget - self.spent)
+        try:
+            if workers == 1:
+                return [job(item) for item in items]
+            with ThreadPoolExecutor(workers, thread_name_prefix="ast-grep") as pool:
+                return list(pool.map(job, items))
+        finally:
+            self.spent += time.monotonic() - start
+            self.deadline = None
+
+
+@functools.lru_cache(maxsize=None)
+def find_ast_grep() -> str | None:
+    """
+    Locate the ast-grep binary once per process.
+    `sg` is also shadow-utils' newgrp on many Linux boxes, so the candidate
+    must identify itself as ast-grep.
+    """
+    for name in ("ast-grep", "sg"):
+        path = shutil.which(name)
+        if not path:
+            continue
+        try:
+            result = subprocess.run(
+                [path, "--version"], capture_output=True, text=True, timeout=5
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            continue
+        if "ast-grep" in (result.stdout + result.stderr).lower():
+            return path
+    return None
+
+
 def check_ast_grep_installed() -> bool:
-    return shutil.which("sg") is not None
+    return find_ast_grep() is not None
+
+
+@functools.lru_cache(maxsize=None)
+def ast_grep_version() -> str:
+    try:
+        result = subprocess.run(
+            [find_ast_grep(), "--version"], capture_output=True, text=True, timeout=5
+        )
+        return result.stdout.strip()
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+
+
+def configure_ast_cache(
+    path: str | Path | None, max_entries: int = DEFAULT_MAX_ENTRIES
+) -> None:
+    """Use the match cache at `path` for this process; None disables caching."""
+    global _ast_cache, _ast_cache_configured
+    if _ast_cache is not None:
+        _ast_cache.close()
+    _ast_cache = AstCache(path, max_entries) if path else None
+    _ast_cache_configured = True
+
+
+def get_ast_cache() -> AstCache | None:
+    if not _ast_cache_configured:
+        configure_ast_cache(default_cache_path())
+    return _ast_cache if _ast_cache and _ast_cache.enabled else None
+
+
+def configure_sg_workers(enabled: bool) -> None:
+    """Serve per-snippet scans from persistent `ast-grep lsp` workers, or spawn per call."""
+    global _sg_pool, _sg_workers_enabled
+    with _sg_pool_lock:
+        if _sg_pool is not None:
+            _sg_pool.close()
+        _sg_pool = None
+        _sg_workers_enabled = enabled
+
+
+def get_sg_pool() -> WorkerPool | None:
+    global _sg_pool
+    if not _sg_workers_enabled or not check_ast_grep_installed():
+        return None
+    with _sg_pool_lock:
+        if _sg_pool is None:
+            _sg_pool = WorkerPool(find_ast_grep(), ScanBudget.max_workers)
+            atexit.register(_sg_pool.close)
+        return _sg_pool
+
+
+def configure_rule_packs(pack_dirs: list[str | Path]) -> None:
+    """Use DETECTION_RULES plus the rule packs under `pack_dirs` for this process."""
+    global _registry
+    _registry = RuleRegistry(DETECTION_RULES, pack_dirs)
+    for cached in (in_process_rules, compile_rule_config, ruleset_version, _rule_order):
+        cached.cache_clear()
+
+
+def get_rule_registry() -> RuleRegistry:
+    if _registry is None:
+        configure_rule_packs(default_pack_dirs())
+    return _registry
 
 
 def get_lang_from_file(filepath: str) -> str | None:
@@ -199,69 +374,395 @@ def get_lang_from_file(filepath: str) -> str | None:
     return LANG_MAP.get(ext)
 
 
-def run_ast_grep(
-    pattern: str, lang: str, code: str, filepath: str = "code"
-) -> list[dict]:
-    """Run ast-grep pattern match on code snippet."""
-    if not check_ast_grep_installed():
+def _scratch_dir() -> str:
+    """One temp directory per process for snippet files, removed at exit."""
+    global _workdir
+    with _workdir_lock:
+        if _workdir is None:
+            _workdir = tempfile.mkdtemp(prefix="gca-ast-")
+            atexit.register(shutil.rmtree, _workdir, True)
+    return _workdir
+
+
+def _write_snippet(code: str, lang: str) -> Path:
+    ext = EXT_FOR_LANG.get(lang, ".txt")
+    path = Path(_scratch_dir()) / f"snippet_{next(_snippet_counter)}{ext}"
+    path.write_text(code, encoding="utf-8")
+    return path
+
+
+def rule_id(rule: AstPattern, lang: str) -> str:
+    return f"{rule.name}-{lang}"
+
+
+def _rule_yaml(rule: AstPattern, lang: str) -> str:
+    # JSON strings are valid YAML scalars, so no YAML dependency is needed
+    return "\n".join(
+        [
+            f"id: {json.dumps(rule_id(rule, lang))}",
+            f"language: {lang}",
+            f"severity: {rule.severity}",
+            f"message: {json.dumps(rule.description)}",
+            "rule:",
+            f"  pattern: {json.dumps(rule.pattern)}",
+        ]
+    )
+
+
+def _rules_compile(docs: list[str], lang: str) -> bool:
+    """Check that ast-grep accepts a rule set by scanning an empty snippet."""
+    tmp_file = _write_snippet("", lang)
+    try:
+        result = _sg_json(
+            ["scan", "--inline-rules", "\n---\n".join(docs), "--json", str(tmp_file)],
+            0,
+        )
+    finally:
+        tmp_file.unlink(missing_ok=True)
+    return isinstance(result, list)
+
+
+# Languages whose rules (all or some) run in-process. An engine module
+# provides supports(rule_name), scan(code, rules) and VERSION.
+IN_PROCESS_ENGINES = {
+    "python": python_engine,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def in_process_rules(lang: str) -> tuple[AstPattern, ...]:
+    """Rules for `lang` evaluated without ast-grep."""
+    engine = IN_PROCESS_ENGINES.get(lang)
+    if engine is None:
+        return ()
+    # Engines implement the built-in definitions; a pack rule reusing a
+    # built-in name with another pattern goes to ast-grep
+    return tuple(
+        rule
+        for rule in get_rule_registry().rules_for(lang)
+        if engine.supports(rule.name) and rule in DETECTION_RULES
+    )
+
+
+def scan_in_process(
+    code: str, lang: str, rules: list[AstPattern] | None = None
+) -> list[tuple[AstPattern, dict]]:
+    if rules is None:
+        rules = list(in_process_rules(lang))
+    if not rules:
         return []
+    with stage(f"engine.{lang}", len(code)):
+        return IN_PROCESS_ENGINES[lang].scan(code, rules)
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        ext_map = {v: k for k, v in LANG_MAP.items()}
-        ext = ext_map.get(lang, ".txt")
-        tmp_file = Path(tmpdir) / f"code{ext}"
-        tmp_file.write_text(code, encoding="utf-8")
 
-        try:
+def rules_for_snippet(
+    code: str, lang: str
+) -> tuple[list[AstPattern], list[AstPattern]]:
+    """
+    In-process and ast-grep rules for `lang` whose prefilter admits `code`.
+    Rules (and files) filtered out here are never dispatched to an engine.
+    """
+    engine_rules = in_process_rules(lang)
+    sg_rules = compile_rule_config(lang)[1].values()
+    engine = [rule for rule in engine_rules if rule.may_match(code)]
+    sg = [rule for rule in sg_rules if rule.may_match(code)]
+
+    count("prefilter.files_checked")
+    count("prefilter.rules_skipped", len(engine_rules) + len(sg_rules) - len(engine) - len(sg))
+    if not engine and not sg:
+        count("prefilter.files_skipped")
+    return engine, sg
+
+
+@functools.lru_cache(maxsize=None)
+def compile_rule_config(lang: str) -> tuple[str, dict[str, AstPattern]]:
+    """
+    Compile the registry's rules for `lang` that no in-process engine
+    covers into one multi-document ast-grep YAML rule set, once per process.
+    Patterns ast-grep cannot parse
+    for `lang` (which never matched under per-rule runs either) are dropped,
+    since a single bad rule fails the whole scan.
+    Returns (yaml_text, rule_id -> AstPattern).
+    """
+    rules = {
+        rule_id(rule, lang): rule
+        for rule in get_rule_registry().rules_for(lang)
+        if rule not in in_process_rules(lang)
+    }
+    docs = {rid: _rule_yaml(rule, lang) for rid, rule in rules.items()}
+
+    if docs and check_ast_grep_installed() and not _rules_compile(list(docs.values()), lang):
+        docs = {rid: doc for rid, doc in docs.items() if _rules_compile([doc], lang)}
+        count("ast_grep.invalid_rules", len(rules) - len(docs))
+
+    return "\n---\n".join(docs.values()), {rid: rules[rid] for rid in docs}
+
+
+@functools.lru_cache(maxsize=None)
+def ruleset_version(lang: str) -> str:
+    """Identifies the rules, ast-grep build and in-process engine behind matches."""
+    h = hashlib.sha256(compile_rule_config(lang)[0].encode("utf-8"))
+    h.update(get_rule_registry().version(lang).encode("utf-8"))
+    if compile_rule_config(lang)[1]:
+        h.update(ast_grep_version().encode("utf-8"))
+    engine = IN_PROCESS_ENGINES.get(lang)
+    if engine is not None:
+        h.update(",".join(r.name for r in in_process_rules(lang)).encode("utf-8"))
+        h.update(engine.VERSION.encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _cache_key(lang: str, code: str) -> str:
+    return snippet_key(lang, code, ruleset_version(lang))
+
+
+def _match_lines(match: dict) -> tuple[int, int]:
+    """0-based first and last line of a raw match."""
+    span = match.get("range", {})
+    start = span.get("start", {}).get("line", 0)
+    return start, span.get("end", {}).get("line", start)
+
+
+def _encode_pairs(pairs: list[tuple[AstPattern, dict]], lang: str) -> list:
+    # Only what _format_match and the post-image line filter read is kept
+    return [
+        [rule_id(rule, lang), *_match_lines(match), match.get("text", "")[:100]]
+        for rule, match in pairs
+    ]
+
+
+def _decode_pairs(payload: list, lang: str) -> list[tuple[AstPattern, dict]]:
+    by_id = {
+        **compile_rule_config(lang)[1],
+        **{rule_id(rule, lang): rule for rule in in_process_rules(lang)},
+    }
+    return [
+        (
+            by_id[rid],
+            {"range": {"start": {"line": start}, "end": {"line": end}}, "text": text},
+        )
+        for rid, start, end, text in payload
+        if rid in by_id
+    ]
+
+
+def _sg_json(args: list[str], nbytes: int, timeout: float = SG_TIMEOUT):
+    """
+    Run ast-grep with JSON output. Returns the matches, None when the call
+    itself failed, or TIMED_OUT when it did not finish within `timeout`.
+    """
+    try:
+        with stage("ast_grep.subprocess", nbytes):
             result = subprocess.run(
-                ["sg", "--pattern", pattern, "--lang", lang, "--json", str(tmp_file)],
+                [find_ast_grep(), *args],
                 capture_output=True,
                 text=True,
-                timeout=10,
+                timeout=timeout,
             )
-            if result.returncode == 0 and result.stdout.strip():
-                return json.loads(result.stdout)
-        except (subprocess.TimeoutExpired, json.JSONDecodeError, Exception):
-            pass
+    except subprocess.TimeoutExpired:
+        count("ast_grep.timeouts")
+        return TIMED_OUT
+    except OSError:
+        return None
+
+    # `sg scan` exits non-zero when error-severity rules match, so trust stdout
+    if not result.stdout.strip():
+        return [] if result.returncode in (0, 1) and not result.stderr.strip() else None
+    try:
+        return json.loads(result.stdout)
+    except json.JSONDecodeError:
+        return None
+
+
+def run_ast_grep(
+    pattern: str,
+    lang: str,
+    code: str,
+    filepath: str = "code",
+    timeout: float = SG_TIMEOUT,
+) -> list[dict]:
+    """Run a single ast-grep pattern on a code snippet."""
+    if not check_ast_grep_installed():
+        return []
+
+    results = _run_pattern(pattern, lang, code, timeout)
+    return results if isinstance(results, list) else []
+
+
+def _run_pattern(pattern: str, lang: str, code: str, timeout: float):
+    """`sg run --pattern` on a snippet, with _sg_json's results."""
+    tmp_file = _write_snippet(code, lang)
+    try:
+        return _sg_json(
+            ["run", "--pattern", pattern, "--lang", lang, "--json", str(tmp_file)],
+            len(code),
+            timeout,
+        )
+    finally:
+        tmp_file.unlink(missing_ok=True)
+
 
-    return []
+def rule_set_yaml(lang: str, rules: list[AstPattern] | None = None) -> str:
+    """Inline rule set for a subset of compile_rule_config(lang) rules."""
+    rules_yaml, by_id = compile_rule_config(lang)
+    if rules is None or len(rules) == len(by_id):
+        return rules_yaml
+    return "\n---\n".join(_rule_yaml(rule, lang) for rule in rules)
 
 
-def analyze_code_with_ast_grep(code: str, filepath: str) -> dict:
-    """Analyze code using ast-grep patterns."""
+def scan_with_rule_config(
+    code: str,
+    lang: str,
+    timeout: float = SG_TIMEOUT,
+    rules: list[AstPattern] | None = None,
+):
+    """
+    Scan a snippet with every rule for `lang` (or just `rules`) in one
+    `sg scan` call, within `timeout` seconds in all.
+    Returns (rule, raw_match) pairs, None if the scan itself failed, or
+    TIMED_OUT if it ran out of time.
+    """
+    rules_yaml, by_id = compile_rule_config(lang)
+    if not by_id or rules == []:
+        return []
+
+    deadline = time.monotonic() + timeout
+    pool = get_sg_pool()
+    if pool is not None:
+        # Workers hold the full rule set; narrow the matches instead
+        matches = pool.scan(lang, EXT_FOR_LANG.get(lang, ".txt"), rules_yaml, code, timeout)
+        if matches is not None:
+            wanted = set(by_id) if rules is None else {rule_id(r, lang) for r in rules}
+            return [(by_id[m["ruleId"]], m) for m in matches if m["ruleId"] in wanted]
+        count("sg_worker.fallbacks")
+        # A worker that timed out leaves the subprocess only the time left
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            count("ast_grep.timeouts")
+            return TIMED_OUT
+
+    rules_yaml = rule_set_yaml(lang, rules)
+
+    tmp_file = _write_snippet(code, lang)
+    try:
+        results = _sg_json(
+            ["scan", "--inline-rules", rules_yaml, "--json", str(tmp_file)],
+            len(code),
+            timeout,
+        )
+    finally:
+        tmp_file.unlink(missing_ok=True)
+    if not isinstance(results, list):
+        return results
+    return [(by_id[m["ruleId"]], m) for m in results if m.get("ruleId") in by_id]
+
+
+def _format_match(rule: AstPattern, match: dict) -> dict:
+    return {
+        "rule": rule.name,
+        "category": rule.category,
+        "severity": rule.severity,
+        "description": rule.description,
+        "bullshit_score": rule.bullshit_score,
+        "line": match.get("range", {}).get("start", {}).get("line", 0),
+        "text": match.get("text", "")[:100],
+    }
+
+
+def analyze_code_with_ast_grep(
+    code: str,
+    filepath: str,
+    timeout: float = SG_TIMEOUT,
+    scheduler: ScanScheduler | None = None,
+) -> dict:
+    """
+    Analyze code using the detection rules: in-process engines first, then
+    ast-grep for the rules they do not cover. Complete results are served
+    from and stored in the match cache. A file whose ast-grep calls ran out
+    of time, or out of `scheduler`'s run budget, comes back skipped.
+    """
     lang = get_lang_from_file(filepath)
     if not lang:
         return {"supported": False, "lang": None, "matches": [], "total_bullshit": 0}
 
-    if not check_ast_grep_installed():
-        return {
-            "supported": True,
-            "lang": lang,
-            "matches": [],
-            "total_bullshit": 0,
-            "warning": "ast-grep (sg) not installed - run: npm i -g @ast-grep/cli",
-        }
-
-    matches = []
-    total_bullshit = 0
+    if not _scannable(lang):
+        engine_rules, _ = rules_for_snippet(code, lang)
+        result = _file_result(lang, scan_in_process(code, lang, engine_rules))
+        if compile_rule_config(lang)[1]:
+            result["warning"] = "ast-grep (sg) not installed - run: npm i -g @ast-grep/cli"
+        return result
 
-    for rule in DETECTION_RULES:
-        if lang not in rule.lang.split(","):
-            continue
+    pairs = _scan_cached(code, lang, filepath, timeout, scheduler=scheduler)
+    if pairs is SKIPPED:
+        return _skipped_result(lang)
+    return _file_result(lang, pairs)
 
-        results = run_ast_grep(rule.pattern, lang, code, filepath)
-        for match in results:
-            matches.append(
-                {
-                    "rule": rule.name,
-                    "category": rule.category,
-                    "severity": rule.severity,
-                    "description": rule.description,
-                    "line": match.get("range", {}).get("start", {}).get("line", 0),
-                    "text": match.get("text", "")[:100],
-                }
-            )
-            total_bullshit += rule.bullshit_score
+
+def _scan_cached(
+    code: str,
+    lang: str,
+    filepath: str = "code",
+    timeout: float = SG_TIMEOUT,
+    key: str | None = None,
+    scheduler: ScanScheduler | None = None,
+):
+    """
+    (rule, match) pairs of every rule for a scannable `lang`, served from the
+    match cache under `key` (default: the snippet key) when present.
+    SKIPPED when an ast-grep call timed out or `scheduler` had no time left
+    for the per-rule fallback, whose calls each get a fresh timeout from it.
+    """
+    engine_rules, sg_rules = rules_for_snippet(code, lang)
+    if not engine_rules and not sg_rules:
+        return []
+
+    cache = get_ast_cache()
+    key = (key or _cache_key(lang, code)) if cache else None
+    if key:
+        cached = cache.get(key)
+        if cached is not None:
+            return _decode_pairs(cached, lang)
+
+    pairs = scan_in_process(code, lang, engine_rules)
+    complete = True
+    if sg_rules:
+        sg_pairs = scan_with_rule_config(code, lang, timeout, sg_rules)
+        if sg_pairs is TIMED_OUT:
+            return SKIPPED
+        if sg_pairs is None:
+            # One bad pattern fails the whole rule set; fall back to per-rule runs
+            count("ast_grep.rule_config_fallbacks")
+            complete = False
+            sg_pairs = []
+            for rule in sg_rules:
+                if scheduler is not None:
+                    timeout = scheduler.timeout()
+                    if timeout is None:
+                        count("ast_grep.budget_skips")
+                        return SKIPPED
+                matches = _run_pattern(rule.pattern, lang, code, timeout)
+                if matches is TIMED_OUT:
+                    return SKIPPED
+                sg_pairs += [(rule, match) for match in matches or []]
+        pairs += sg_pairs
+
+    if key and complete:
+        cache.put(key, _encode_pairs(pairs, lang))
+    return pairs
+
+
+@functools.lru_cache(maxsize=None)
+def _rule_order(lang: str) -> dict[int, int]:
+    return {id(rule): i for i, rule in enumerate(get_rule_registry().rules_for(lang))}
+
+
+def _file_result(lang: str, pairs: list[tuple[AstPattern, dict]]) -> dict:
+    # Report in rule definition order, as per-rule runs did
+    order = _rule_order(lang)
+    pairs = sorted(pairs, key=lambda pair: order.get(id(pair[0]), len(order)))
+
+    matches = [_format_match(rule, match) for rule, match in pairs]
+    total_bullshit = sum(rule.bullshit_score for rule, _ in pairs)
 
     return {
         "supported": True,
@@ -272,6 +773,30 @@ def analyze_code_with_ast_grep(code: str, filepath: str) -> dict:
     }
 
 
+def _skipped_result(lang: str) -> dict:
+    return {
+        "supported": True,
+        "lang": lang,
+        "skipped": True,
+        "matches": [],
+        "total_bullshit": 0,
+    }
+
+
+def _schedulable(lang: str | None) -> bool:
+    """Whether a file of `lang` needs an ast-grep call at all."""
+    return bool(lang and check_ast_grep_installed() and compile_rule_config(lang)[1])
+
+
+def _scannable(lang: str | None) -> bool:
+    """Whether every rule for `lang` can run here, so results are complete."""
+    if not lang:
+        return False
+    if compile_rule_config(lang)[1]:
+        return check_ast_grep_installed()
+    return bool(in_process_rules(lang))
+
+
 def categorize_matches(matches: list[dict]) -> dict:
     """Group matches by category."""
     categories = {}
@@ -283,12 +808,17 @@ def categorize_matches(matches: list[dict]) -> dict:
     return categories
 
 
-def analyze_diff_with_ast_grep(diff_files: list[dict]) -> dict:
-    """Analyze all files in a diff using ast-grep."""
-    all_matches = []
-    total_bullshit = 0
-    files_analyzed = 0
-    unsupported_files = 0
+def analyze_diff_with_ast_grep(
+    diff_files: list[dict], scheduler: ScanScheduler | None = None
+) -> dict:
+    """
+    Analyze all files in a diff using ast-grep.
+    Files are scanned concurrently under `scheduler` (default: a fresh one
+    with the default ScanBudget); files the run budget skipped are reported
+    as files_skipped.
+    """
+    scheduler = scheduler or ScanScheduler()
+    staged = []
 
     for file_info in diff_files:
         filepath = file_info.get("path", "")
@@ -297,12 +827,366 @@ def analyze_diff_with_ast_grep(diff_files: list[dict]) -> dict:
         if not added_lines:
             continue
 
-        code = "\n".join(added_lines)
-        result = analyze_code_with_ast_grep(code, filepath)
+        staged.append((filepath, "\n".join(added_lines)))
+
+    # Rule sets are compiled up front so workers only read the cache
+    scheduled = [
+        i for i, (filepath, _) in enumerate(staged)
+        if _schedulable(get_lang_from_file(filepath))
+    ]
+    scanned = scheduler.map(
+        lambda i, timeout: analyze_code_with_ast_grep(
+            staged[i][1], staged[i][0], timeout, scheduler
+        ),
+        scheduled,
+    )
+    results = dict(zip(scheduled, scanned))
+
+    file_results = []
+    for i, (filepath, code) in enumerate(staged):
+        result = results.get(i)
+        if result is SKIPPED:
+            result = _skipped_result(get_lang_from_file(filepath))
+        elif result is None:
+            result = analyze_code_with_ast_grep(code, filepath)
+        file_results.append((filepath, result))
+
+    return _diff_result(file_results)
+
+
+BATCH_MAX_FILES = 2000
+BATCH_MIN_FILES = 200
+
 
+def analyze_diffs_batch(
+    diffs: dict,
+    batch_size: int = BATCH_MAX_FILES,
+    scheduler: ScanScheduler | None = None,
+) -> dict[object, dict]:
+    """
+    Analyze many diffs (e.g. every commit of a range) with batched scans.
+    Added-code snippets of all diffs are staged into one tree, scanned by
+    `sg scan` calls of at most `batch_size` files and demultiplexed back.
+    Snippets already in the match cache (see ast_cache.py) or repeated
+    within the run are scanned at most once.
+    Batches are spread over the scheduler's workers; with a run budget,
+    batches that cannot start in time are reported as files_skipped.
+    Takes key -> parsed diff files; returns key -> the same shape as
+    analyze_diff_with_ast_grep.
+    """
+    file_results = _batch_file_results(diffs, batch_size, scheduler)
+    return {key: _diff_result(fr) for key, fr in file_results.items()}
+
+
+def _batch_file_results(
+    diffs: dict,
+    batch_size: int = BATCH_MAX_FILES,
+    scheduler: ScanScheduler | None = None,
+) -> dict[object, list[tuple[str, dict]]]:
+    """key -> [(filepath, analyze_code_with_ast_grep-shaped result)] per diff."""
+    scheduler = scheduler or ScanScheduler()
+    # Index of staged snippets: (key, filepath, lang, code)
+    entries = []
+    file_results: dict[object, list] = {key: [] for key in diffs}
+
+    for key, diff_files in diffs.items():
+        for file_info in diff_files:
+            filepath = file_info.get("path", "")
+            added_lines = file_info.get("added", [])
+            if not added_lines:
+                continue
+            entries.append(
+                (key, filepath, get_lang_from_file(filepath), "\n".join(added_lines))
+            )
+
+    scanned = _scan_items(
+        [(filepath, lang, code, None) for _, filepath, lang, code in entries],
+        scheduler,
+        batch_size,
+    )
+    for (key, filepath, lang, code), pairs in zip(entries, scanned):
+        if pairs is SKIPPED:
+            result = _skipped_result(lang)
+        elif pairs is None:
+            # Unsupported languages, or ast-grep missing for their rules
+            result = analyze_code_with_ast_grep(code, filepath)
+        else:
+            result = _file_result(lang, pairs)
+        file_results[key].append((filepath, result))
+
+    return file_results
+
+
+def _scan_items(
+    items: list[tuple[str, str | None, str, str | None]],
+    scheduler: ScanScheduler,
+    batch_size: int = BATCH_MAX_FILES,
+    use_cache: bool = True,
+) -> list:
+    """
+    Batched scan of (filepath, lang, code, cache key) items; a None key means
+    the snippet key. Returns per item its (rule, match) pairs, SKIPPED when
+    the run budget ran out, or None when the language is not scannable here.
+    Identical keys are scanned once; complete results are stored in the
+    match cache, which is only read when `use_cache` is set.
+    """
+    results: list = [None] * len(items)
+    scannable = []
+    hits: dict[int, tuple[list, list]] = {}
+    # Explicitly keyed items (blobs) are worth remembering even without
+    # rules to run, so their content is not read again
+    fresh = {}
+    for i, (_, lang, code, key) in enumerate(items):
+        if not _scannable(lang):
+            continue
+        hits[i] = rules_for_snippet(code, lang)
+        if hits[i][0] or hits[i][1]:
+            scannable.append(i)
+        else:
+            results[i] = []
+            if key:
+                fresh[key] = []
+
+    # Identical snippets are scanned once per run, and not at all when the
+    # persistent cache already has them
+    keys = {i: items[i][3] or _cache_key(items[i][1], items[i][2]) for i in scannable}
+    cache = get_ast_cache()
+    payloads = cache.get_many(list(keys.values())) if cache and use_cache else {}
+    pairs_by_key = {
+        keys[i]: _decode_pairs(payloads[keys[i]], items[i][1])
+        for i in scannable
+        if keys[i] in payloads
+    }
+    pending: dict[str, int] = {}
+    for i in scannable:
+        if keys[i] not in pairs_by_key:
+            pending.setdefault(keys[i], i)
+    todo = list(pending.values())
+    count(
+        "ast_grep.deduplicated",
+        sum(1 for i in scannable if keys[i] not in payloads) - len(todo),
+    )
+    sg_todo = [i for i in todo if hits[i][1]]
+
+    # Enough batches to keep every worker busy, but not so small that
+    # ast-grep start-up dominates
+    per_worker = -(-len(sg_todo) // scheduler.budget.max_workers)
+    size = max(1, min(batch_size, max(BATCH_MIN_FILES, per_worker)))
+    chunks = [sg_todo[start : start + size] for start in range(0, len(sg_todo), size)]
+
+    scanned = scheduler.map(
+        lambda chunk, timeout: _scan_batch(
+            [(items[i][1], items[i][2]) for i in chunk],
+            timeout,
+            [hits[i][1] for i in chunk],
+        ),
+        chunks,
+        base_timeout=lambda chunk: _batch_timeout(len(chunk), scheduler.budget.call_timeout),
+    )
+    sg_pairs: dict[int, list] = {i: [] for i in todo}
+    skipped_keys = set()
+    for chunk, chunk_pairs in zip(chunks, scanned):
+        if chunk_pairs is SKIPPED:
+            skipped_keys.update(keys[i] for i in chunk)
+        elif chunk_pairs is None:
+            count("ast_grep.batch_fallbacks")
+            for i in chunk:
+                del sg_pairs[i]
+        else:
+            sg_pairs.update(zip(chunk, chunk_pairs))
+
+    for i in todo:
+        if keys[i] in skipped_keys or i not in sg_pairs:
+            continue
+        _, lang, code, _ = items[i]
+        pairs = scan_in_process(code, lang, hits[i][0]) + sg_pairs[i]
+        pairs_by_key[keys[i]] = pairs
+        fresh[keys[i]] = _encode_pairs(pairs, lang)
+    if cache:
+        cache.put_many(fresh)
+
+    for i in scannable:
+        if keys[i] in pairs_by_key:
+            results[i] = pairs_by_key[keys[i]]
+        elif keys[i] in skipped_keys:
+            results[i] = SKIPPED
+
+    # Files of failed batches are retried one by one, still under the budget
+    retry = [i for i in scannable if results[i] is None]
+    retried = scheduler.map(
+        lambda i, timeout: _scan_cached(
+            items[i][2], items[i][1], items[i][0], timeout, keys[i], scheduler
+        ),
+        retry,
+    )
+    for i, pairs in zip(retry, retried):
+        results[i] = pairs
+
+    return results
+
+
+def analyze_post_images(
+    diffs: dict,
+    read_blobs,
+    batch_size: int = BATCH_MAX_FILES,
+    scheduler: ScanScheduler | None = None,
+) -> dict[object, dict]:
+    """
+    Like analyze_diffs_batch, but scans each changed file's whole post-image
+    so rules see complete syntax, then keeps only matches that touch the
+    file's added_ranges. Match lines are file lines (0-based).
+    Files need "blob" (post-image blob SHA) and "added_ranges"; results are
+    cached per blob, so a file unchanged across commits is scanned once.
+    `read_blobs(shas)` returns sha -> text for the blobs it could read;
+    files without a readable blob fall back to scanning their added lines.
+    """
+    scheduler = scheduler or ScanScheduler()
+    per_file: dict[tuple, tuple[str, dict]] = {}
+    fallback: dict[tuple, list] = {}
+    blob_files = []  # (slot, file_info, lang, blob key)
+
+    for key, diff_files in diffs.items():
+        for index, file_info in enumerate(diff_files):
+            if not file_info.get("added"):
+                continue
+            slot = (key, index)
+            lang = get_lang_from_file(file_info.get("path", ""))
+            if file_info.get("blob") and file_info.get("added_ranges") and _scannable(lang):
+                bkey = blob_key(lang, file_info["blob"], ruleset_version(lang))
+                blob_files.append((slot, file_info, lang, bkey))
+            else:
+                fallback[slot] = [file_info]
+
+    cache = get_ast_cache()
+    payloads = cache.get_many([b[3] for b in blob_files]) if cache else {}
+    full = {
+        bkey: _decode_pairs(payloads[bkey], lang)
+        for _, _, lang, bkey in blob_files
+        if bkey in payloads
+    }
+    missing = {}
+    for _, file_info, lang, bkey in blob_files:
+        if bkey not in full:
+            missing.setdefault(bkey, (file_info, lang))
+
+    with stage("ast_grep.read_blobs"):
+        texts = read_blobs(list({info["blob"] for info, _ in missing.values()})) if missing else {}
+    count("ast_grep.blobs_read", len(texts))
+    items = [
+        (info["path"], lang, texts[info["blob"]], bkey)
+        for bkey, (info, lang) in missing.items()
+        if info["blob"] in texts
+    ]
+    for (_, _, _, bkey), pairs in zip(items, _scan_items(items, scheduler, batch_size, False)):
+        full[bkey] = pairs
+
+    for slot, file_info, lang, bkey in blob_files:
+        pairs = full.get(bkey)
+        if pairs is SKIPPED:
+            per_file[slot] = (file_info["path"], _skipped_result(lang))
+        elif pairs is None:
+            fallback[slot] = [file_info]
+        else:
+            ranges = file_info["added_ranges"]
+            kept = [(rule, m) for rule, m in pairs if _touches(_match_lines(m), ranges)]
+            per_file[slot] = (file_info["path"], _file_result(lang, kept))
+
+    count("ast_grep.post_image_fallbacks", sum(1 for slot, *_ in blob_files if slot in fallback))
+    for slot, results in _batch_file_results(fallback, batch_size, scheduler).items():
+        per_file[slot] = results[0]
+
+    file_results: dict[object, list] = {key: [] for key in diffs}
+    for key, diff_files in diffs.items():
+        for index in range(len(diff_files)):
+            if (key, index) in per_file:
+                file_results[key].append(per_file[key, index])
+    return {key: _diff_result(fr) for key, fr in file_results.items()}
+
+
+def _touches(lines: tuple[int, int], ranges: list) -> bool:
+    """Whether 0-based lines [first, last] meet any 1-based inclusive range."""
+    first, last = lines[0] + 1, lines[1] + 1
+    return any(first <= end and last >= start for start, end in ranges)
+
+
+def _batch_timeout(n_files: int, call_timeout: float = SG_TIMEOUT) -> float:
+    return call_timeout + n_files * 0.05
+
+
+def _scan_batch(
+    snippets: list[tuple[str, str]],
+    timeout: float | None = None,
+    snippet_rules: list[list[AstPattern]] | None = None,
+) -> list[list] | None:
+    """
+    Stage (lang, code) snippets as files of one directory and scan them with
+    a single ast-grep call. With `snippet_rules` the rule set is narrowed to
+    the rules some snippet needs. Returns per-snippet (rule, match) pairs in
+    input order, or None if the scan failed.
+    """
+    stage_dir = Path(tempfile.mkdtemp(prefix="batch_", dir=_scratch_dir()))
+    try:
+        names = {}
+        nbytes = 0
+        for i, (lang, code) in enumerate(snippets):
+            name = f"s{i}{EXT_FOR_LANG.get(lang, '.txt')}"
+            (stage_dir / name).write_text(code, encoding="utf-8")
+            names[name] = i
+            nbytes += len(code)
+
+        langs = sorted({lang for lang, _ in snippets})
+        by_id = {rid: rule for lang in langs for rid, rule in compile_rule_config(lang)[1].items()}
+        if snippet_rules is None:
+            docs = [rule_set_yaml(lang) for lang in langs]
+        else:
+            needed: dict[str, list[AstPattern]] = {lang: [] for lang in langs}
+            for (lang, _), rules in zip(snippets, snippet_rules):
+                needed[lang].extend(r for r in rules if r not in needed[lang])
+            # Keep compile order so unchanged sets reuse the compiled YAML
+            docs = [
+                rule_set_yaml(
+                    lang,
+                    [r for r in compile_rule_config(lang)[1].values() if r in needed[lang]],
+                )
+                for lang in langs
+            ]
+        rules_yaml = "\n---\n".join(doc for doc in docs if doc)
+
+        results = _sg_json(
+            ["scan", "--inline-rules", rules_yaml, "--json", str(stage_dir)],
+            nbytes,
+            timeout=timeout if timeout is not None else _batch_timeout(len(snippets)),
+        )
+    finally:
+        shutil.rmtree(stage_dir, ignore_errors=True)
+
+    if not isinstance(results, list):
+        # Timed-out batches are retried file by file, under the run budget
+        return None
+    pairs: list[list] = [[] for _ in snippets]
+    for m in results:
+        i = names.get(Path(m.get("file", "")).name)
+        rule = by_id.get(m.get("ruleId"))
+        if i is not None and rule is not None:
+            pairs[i].append((rule, m))
+    return pairs
+
+
+def _diff_result(file_results: list[tuple[str, dict]]) -> dict:
+    """Aggregate per-file analyze_code_with_ast_grep results for one diff."""
+    all_matches = []
+    total_bullshit = 0
+    files_analyzed = 0
+    unsupported_files = 0
+    files_skipped = 0
+
+    for filepath, result in file_results:
         if not result.get("supported"):
             unsupported_files += 1
             continue
+        if result.get("skipped"):
+            files_skipped += 1
+            continue
 
         files_analyzed += 1
         total_bullshit += result.get("total_bullshit", 0)
@@ -314,6 +1198,7 @@ def analyze_diff_with_ast_grep(diff_files: list[dict]) -> dict:
     return {
         "files_analyzed": files_analyzed,
         "unsupported_files": unsupported_files,
+        "files_skipped": files_skipped,
         "total_matches": len(all_matches),
         "total_bullshit_from_ast": total_bullshit,
         "matches": all_matches,
@@ -326,17 +1211,22 @@ def summarize_issues(matches: list[dict]) -> dict:
     by_severity = {"error": 0, "warning": 0, "info": 0}
     by_category = {"smell": 0, "antipattern": 0, "ai_generated": 0, "security": 0}
     by_rule = {}
+    # Weights of the rules that matched, per language, so rescoring does not
+    # have to look rules up by name alone
+    bullshit_by_rule = {}
 
     for m in matches:
         by_severity[m.get("severity", "info")] += 1
         by_category[m.get("category", "smell")] += 1
         rule = m.get("rule", "unknown")
         by_rule[rule] = by_rule.get(rule, 0) + 1
+        bullshit_by_rule[rule] = bullshit_by_rule.get(rule, 0) + m.get("bullshit_score", 0)
 
     return {
         "by_severity": by_severity,
         "by_category": by_category,
         "by_rule": by_rule,
+        "bullshit_by_rule": bullshit_by_rule,
         "top_issues": sorted(by_rule.items(), key=lambda x: -x[1])[:5],
     }
 
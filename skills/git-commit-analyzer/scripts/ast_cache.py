@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Persistent cache of ast-grep match lists, keyed by snippet hash or
+git blob SHA. Identical added code (cherry-picks, reverts, backports,
+merges) and unchanged post-image files are scanned once and served from
+SQLite afterwards, across runs and across concurrent processes.
+
+Location: $GCA_AST_CACHE, else $XDG_CACHE_HOME/git-commit-analyzer/ast_grep.sqlite.
+Set GCA_AST_CACHE=off to disable.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from profiling import count
+
+DEFAULT_MAX_ENTRIES = 200_000
+SCHEMA_VERSION = 2
+
+# SQLite caps host parameters per statement; stay well below it
+_CHUNK = 500
+
+
+def default_cache_path() -> Path | None:
+    env = os.environ.get("GCA_AST_CACHE")
+    if env is not None:
+        return None if env.strip().lower() in ("", "0", "off", "none") else Path(env)
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "git-commit-analyzer" / "ast_grep.sqlite"
+
+
+def _key(kind: str, lang: str, ruleset_version: str, content: str) -> str:
+    h = hashlib.sha256()
+    for part in (str(SCHEMA_VERSION), kind, lang, ruleset_version):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    h.update(content.encode("utf-8"))
+    return h.hexdigest()
+
+
+def snippet_key(lang: str, code: str, ruleset_version: str) -> str:
+    return _key("snippet", lang, ruleset_version, code)
+
+
+def blob_key(lang: str, blob_sha: str, ruleset_version: str) -> str:
+    """Key for a whole git blob; the SHA already identifies its content."""
+    return _key("blob", lang, ruleset_version, blob_sha)
+
+
+class AstCache:
+    """
+    key -> match list store with an LRU bound on the number of entries.
+    Safe to share between threads; SQLite WAL handles other processes.
+    Any database error disables the cache for the rest of the process
+    instead of failing the analysis.
+    """
+
+    def __init__(self, path: str | Path, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                str(self.path), timeout=30, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS matches ("
+                " key TEXT PRIMARY KEY,"
+                " payload TEXT NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS matches_last_used ON matches(last_used)"
+            )
+            conn.commit()
+            self._conn = conn
+        except (OSError, sqlite3.Error):
+            count("ast_cache.errors")
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    def _fail(self) -> None:
+        count("ast_cache.errors")
+        try:
+            self._conn.close()
+        except sqlite3.Error:
+            pass
+        self._conn = None
+
+    def get_many(self, keys: list[str]) -> dict[str, list]:
+        """Return cached match lists for the keys present; bumps their recency."""
+        found: dict[str, list] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            if self._conn is None:
+                return found
+            try:
+                for start in range(0, len(unique), _CHUNK):
+                    chunk = unique[start : start + _CHUNK]
+                    rows = self._conn.execute(
+                        "SELECT key, payload FROM matches WHERE key IN "
+                        f"({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                    for key, payload in rows:
+                        found[key] = json.loads(payload)
+                if found:
+                    now = time.time()
+                    self._conn.executemany(
+                        "UPDATE matches SET last_used = ? WHERE key = ?",
+                        [(now, key) for key in found],
+                    )
+                    self._conn.commit()
+            except (sqlite3.Error, ValueError):
+                self._fail()
+                return {}
+        count("ast_cache.hits", sum(1 for key in keys if key in found))
+        count("ast_cache.misses", sum(1 for key in keys if key not in found))
+        return found
+
+    def get(self, key: str) -> list | None:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: dict[str, list]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO matches (key, payload, last_used)"
+                    " VALUES (?, ?, ?)",
+                    [(key, json.dumps(value), now) for key, value in items.items()],
+                )
+                self._evict()
+                self._conn.commit()
+            except sqlite3.Error:
+                self._fail()
+                return
+        count("ast_cache.stores", len(items))
+
+    def put(self, key: str, value: list) -> None:
+        self.put_many({key: value})
+
+    def _evict(self) -> None:
+        # Trim to 90% so eviction runs once per overflow, not on every insert
+        (size,) = self._conn.execute("SELECT COUNT(*) FROM matches").fetchone()
+        if size <= self.max_entries:
+            return
+        excess = size - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM matches WHERE key IN"
+            " (SELECT key FROM matches ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        count("ast_cache.evictions", excess)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
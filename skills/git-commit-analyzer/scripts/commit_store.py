@@ -0,0 +1,615 @@
+#!/usr/bin/env python3
+"""
+Optional SQLite store of fetched commits (changed files, zlib-compressed
+diffs) and their analyze_code.py metrics, indexed by repository, author,
+date and path. "What did X do between A and B across repos" becomes a
+query instead of loading every commits.json.
+
+    fetch_commits.py /path/to/repo --since "1 week ago" --store
+    analyze_code.py --store --author alice --since 2026-01-01
+    generate_prompt.py --store --path src/payments --since "2 weeks ago"
+    commit_store.py --author alice --since 2026-01-01 -o alice.json
+
+Location: $GCA_STORE, else $XDG_DATA_HOME/git-commit-analyzer/commits.sqlite.
+"""
+
+import argparse
+import functools
+import json
+import os
+import re
+import sqlite3
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from profiling import add_profile_args, count, profile_session, stage
+
+SCHEMA_VERSION = 1
+# Commits per transaction when ingesting
+BATCH_SIZE = 500
+ZLIB_LEVEL = 6
+
+_CHUNK = 500
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS commits ("
+    " id INTEGER PRIMARY KEY,"
+    " source TEXT NOT NULL,"
+    " sha TEXT NOT NULL,"
+    " author TEXT NOT NULL,"
+    " email TEXT NOT NULL,"
+    " ts INTEGER NOT NULL,"
+    " date TEXT NOT NULL,"
+    " message TEXT NOT NULL,"
+    " additions INTEGER NOT NULL,"
+    " deletions INTEGER NOT NULL,"
+    " files_changed INTEGER NOT NULL,"
+    " diff BLOB NOT NULL,"
+    " UNIQUE (source, sha))",
+    "CREATE TABLE IF NOT EXISTS files ("
+    " commit_id INTEGER NOT NULL REFERENCES commits(id) ON DELETE CASCADE,"
+    " path TEXT NOT NULL,"
+    " status TEXT NOT NULL,"
+    " blob TEXT)",
+    "CREATE TABLE IF NOT EXISTS metrics ("
+    " commit_id INTEGER PRIMARY KEY REFERENCES commits(id) ON DELETE CASCADE,"
+    " config_hash TEXT,"
+    " substance REAL NOT NULL,"
+    " bullshit REAL NOT NULL,"
+    " data TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS commits_ts ON commits(ts)",
+    "CREATE INDEX IF NOT EXISTS commits_author_ts ON commits(author, ts)",
+    "CREATE INDEX IF NOT EXISTS commits_email_ts ON commits(email, ts)",
+    "CREATE INDEX IF NOT EXISTS commits_source_ts ON commits(source, ts)",
+    "CREATE INDEX IF NOT EXISTS files_path ON files(path)",
+    "CREATE INDEX IF NOT EXISTS files_commit ON files(commit_id)",
+)
+
+_RELATIVE = re.compile(r"^(\d+)\s*(minute|hour|day|week|month|year)s?\s+ago$")
+_UNIT_DAYS = {
+    "minute": 1 / 1440,
+    "hour": 1 / 24,
+    "day": 1,
+    "week": 7,
+    "month": 30,
+    "year": 365,
+}
+
+
+def default_store_path() -> Path | None:
+    env = os.environ.get("GCA_STORE")
+    if env is not None:
+        return None if env.strip().lower() in ("", "0", "off", "none") else Path(env)
+    base = os.environ.get("XDG_DATA_HOME") or Path.home() / ".local" / "share"
+    return Path(base) / "git-commit-analyzer" / "commits.sqlite"
+
+
+def timestamp(value: str) -> int:
+    """Epoch seconds of an ISO date/datetime (git %aI, GitHub, GitLab); naive = UTC."""
+    when = datetime.fromisoformat(value.strip())
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return int(when.timestamp())
+
+
+def parse_when(text: str, now: datetime | None = None) -> int:
+    """
+    --since/--until value: ISO date or datetime, "N days ago", "yesterday" or
+    "today".
+    """
+    now = now or datetime.now(timezone.utc)
+    text = text.strip().lower()
+    if text in ("today", "yesterday"):
+        day = now.astimezone().replace(hour=0, minute=0, second=0, microsecond=0)
+        return int((day - timedelta(days=1 if text == "yesterday" else 0)).timestamp())
+    match = _RELATIVE.match(text)
+    if match:
+        return int(
+            (
+                now - timedelta(days=int(match.group(1)) * _UNIT_DAYS[match.group(2)])
+            ).timestamp()
+        )
+    try:
+        return timestamp(text)
+    except ValueError:
+        raise StoreQueryError(
+            f"unrecognized date {text!r}; use YYYY-MM-DD[THH:MM] or 'N days ago'"
+        ) from None
+
+
+@functools.lru_cache(maxsize=256)
+def normalize_source(source: str) -> str:
+    """
+    A local repository as its real absolute path, so `../repo` and
+    `/abs/repo` match.
+    """
+    if source and os.path.exists(os.path.join(source, ".git")):
+        return os.path.realpath(source)
+    return source
+
+
+class StoreQueryError(ValueError):
+    """The --store options name no usable store, commits or dates."""
+
+
+@dataclass
+class CommitQuery:
+    """Filters; empty lists and None mean no restriction."""
+
+    sources: list[str] = field(default_factory=list)
+    authors: list[str] = field(default_factory=list)
+    paths: list[str] = field(default_factory=list)
+    since: str | None = None
+    until: str | None = None
+    limit: int | None = None
+
+    def where(self) -> tuple[str, list]:
+        clauses, params = [], []
+        if self.sources:
+            clauses.append(f"c.source IN ({','.join('?' * len(self.sources))})")
+            params += [normalize_source(s) for s in self.sources]
+        if self.authors:
+            marks = ",".join("?" * len(self.authors))
+            clauses.append(f"(c.author IN ({marks}) OR c.email IN ({marks}))")
+            params += self.authors * 2
+        if self.since:
+            clauses.append("c.ts >= ?")
+            params.append(parse_when(self.since))
+        if self.until:
+            clauses.append("c.ts < ?")
+            params.append(parse_when(self.until))
+        if self.paths:
+            terms = []
+            for path in self.paths:
+                if any(ch in path for ch in "*?["):
+                    terms.append("f.path GLOB ?")
+                    params.append(path)
+                else:
+                    # A file, or everything below a directory
+                    terms.append("(f.path = ? OR f.path GLOB ?)")
+                    params += [path.rstrip("/"), path.rstrip("/") + "/*"]
+            clauses.append(
+                f"c.id IN (SELECT f.commit_id FROM files f WHERE {' OR '.join(terms)})"
+            )
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+class CommitStore:
+    """
+    SQLite commits/files/metrics; one connection per process (WAL for
+    concurrent writers).
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        for statement in _SCHEMA:
+            self.conn.execute(statement)
+        self.conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES ('schema_version', ?)",
+            (str(SCHEMA_VERSION),),
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    # -- ingest ------------------------------------------------------------
+
+    def _ids(self, pairs: list[tuple[str, str]]) -> dict[tuple[str, str], int]:
+        """(source, sha) -> commit id for stored commits."""
+        ids = {}
+        by_source: dict[str, list[str]] = {}
+        for source, sha in pairs:
+            by_source.setdefault(source, []).append(sha)
+        for source, shas in by_source.items():
+            for start in range(0, len(shas), _CHUNK):
+                chunk = shas[start : start + _CHUNK]
+                marks = ",".join("?" * len(chunk))
+                for commit_id, sha in self.conn.execute(
+                    "SELECT id, sha FROM commits"
+                    f" WHERE source = ? AND sha IN ({marks})",
+                    [source, *chunk],
+                ):
+                    ids[(source, sha)] = commit_id
+        return ids
+
+    def add_commits(self, data: dict) -> int:
+        """
+        Ingest commits.json contents (re-ingesting a commit replaces it).
+        Returns commits written.
+        """
+        default_source = normalize_source(data.get("source") or "")
+        commits = data.get("commits", [])
+        with stage("store.ingest") as st:
+            for start in range(0, len(commits), BATCH_SIZE):
+                batch = commits[start : start + BATCH_SIZE]
+                rows, raw = [], 0
+                for c in batch:
+                    author = c.get("author", {})
+                    stats = c.get("stats", {})
+                    diff = c.get("diff", "").encode("utf-8")
+                    raw += len(diff)
+                    rows.append(
+                        (
+                            (
+                                normalize_source(c["source"])
+                                if c.get("source")
+                                else default_source
+                            ),
+                            c.get("sha", ""),
+                            author.get("name", "Unknown"),
+                            author.get("email", ""),
+                            timestamp(c["date"]) if c.get("date") else 0,
+                            c.get("date", ""),
+                            c.get("message", ""),
+                            stats.get("additions", 0),
+                            stats.get("deletions", 0),
+                            stats.get("files_changed", len(c.get("changed_files", []))),
+                            zlib.compress(diff, ZLIB_LEVEL),
+                        )
+                    )
+                st.add_bytes(raw)
+                with self.conn:
+                    self.conn.executemany(
+                        "INSERT INTO commits (source, sha, author, email, ts, date,"
+                        " message, additions, deletions, files_changed, diff)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                        " ON CONFLICT (source, sha) DO UPDATE SET"
+                        " author = excluded.author, email = excluded.email,"
+                        " ts = excluded.ts, date = excluded.date,"
+                        " message = excluded.message, additions = excluded.additions,"
+                        " deletions = excluded.deletions,"
+                        " files_changed = excluded.files_changed, diff = excluded.diff",
+                        rows,
+                    )
+                    ids = self._ids([(row[0], row[1]) for row in rows])
+                    batch_ids = [ids[(row[0], row[1])] for row in rows]
+                    self.conn.executemany(
+                        "DELETE FROM files WHERE commit_id = ?",
+                        [(i,) for i in batch_ids],
+                    )
+                    self.conn.executemany(
+                        "INSERT INTO files (commit_id, path, status, blob)"
+                        " VALUES (?, ?, ?, ?)",
+                        [
+                            (
+                                commit_id,
+                                f.get("path", ""),
+                                f.get("status", ""),
+                                f.get("blob"),
+                            )
+                            for commit_id, c in zip(batch_ids, batch)
+                            for f in c.get("changed_files", [])
+                        ],
+                    )
+        count("store.commits_written", len(commits))
+        return len(commits)
+
+    def add_metrics(
+        self,
+        commits: list[dict],
+        results: list[dict],
+        config_hash: str | None = None,
+        source: str = "",
+    ) -> int:
+        """
+        Store analyze_code.py results; `results[i]` belongs to `commits[i]`
+        (the order analyze_commits keeps). Commits must already be stored.
+        """
+        with stage("store.metrics"):
+            default_source = normalize_source(source or "")
+            keys = [
+                (
+                    (
+                        normalize_source(c["source"])
+                        if c.get("source")
+                        else default_source
+                    ),
+                    c.get("sha", ""),
+                )
+                for c in commits
+            ]
+            with self.conn:
+                ids = self._ids(keys)
+                rows = [
+                    (
+                        ids[key],
+                        config_hash,
+                        r["metrics"].get("substance_score", 0.0),
+                        r["metrics"].get("bullshit_score", 0.0),
+                        json.dumps(r["metrics"], ensure_ascii=False),
+                    )
+                    for key, r in zip(keys, results)
+                    if key in ids
+                ]
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?, ?)", rows
+                )
+        count("store.metrics_written", len(rows))
+        return len(rows)
+
+    # -- query -------------------------------------------------------------
+
+    def _select(self, query: CommitQuery, columns: str, extra: str = "") -> list[tuple]:
+        where, params = query.where()
+        sql = f"SELECT {columns} FROM commits c {extra}{where} ORDER BY c.ts DESC, c.id"
+        if query.limit:
+            sql += " LIMIT ?"
+            params.append(query.limit)
+        with stage("store.query"):
+            return self.conn.execute(sql, params).fetchall()
+
+    def _files(self, ids: list[int]) -> dict[int, list[dict]]:
+        files: dict[int, list[dict]] = {}
+        for start in range(0, len(ids), _CHUNK):
+            chunk = ids[start : start + _CHUNK]
+            for commit_id, path, status, blob in self.conn.execute(
+                "SELECT commit_id, path, status, blob FROM files"
+                f" WHERE commit_id IN ({','.join('?' * len(chunk))}) ORDER BY rowid",
+                chunk,
+            ):
+                entry = {"status": status, "path": path}
+                if blob:
+                    entry["blob"] = blob
+                files.setdefault(commit_id, []).append(entry)
+        return files
+
+    def load_commits(self, query: CommitQuery) -> dict:
+        """commits.json contents for the matching commits, newest first."""
+        rows = self._select(
+            query,
+            "c.id, c.source, c.sha, c.author, c.email, c.date, c.message,"
+            " c.additions, c.deletions, c.files_changed, c.diff",
+        )
+        files = self._files([row[0] for row in rows])
+        commits = []
+        with stage("store.decompress"):
+            for (
+                commit_id,
+                source,
+                sha,
+                author,
+                email,
+                date,
+                message,
+                added,
+                deleted,
+                changed,
+                diff,
+            ) in rows:
+                commits.append(
+                    {
+                        "sha": sha,
+                        "source": source,
+                        "author": {"name": author, "email": email},
+                        "date": date,
+                        "message": message,
+                        "diff": zlib.decompress(diff).decode("utf-8"),
+                        "changed_files": files.get(commit_id, []),
+                        "stats": {
+                            "additions": added,
+                            "deletions": deleted,
+                            "files_changed": changed,
+                        },
+                    }
+                )
+        sources = sorted({c["source"] for c in commits})
+        return {
+            "fetched_at": datetime.now().isoformat(),
+            "source": sources[0] if len(sources) == 1 else ", ".join(sources),
+            "since": query.since,
+            "until": query.until,
+            "commit_count": len(commits),
+            "commits": commits,
+        }
+
+    def load_results(self, query: CommitQuery) -> list[dict]:
+        """
+        analyze_code.py result entries (the *_metrics.json commits list)
+        stored for the matching commits.
+        """
+        rows = self._select(
+            query,
+            "c.sha, c.author, c.message, m.data",
+            "JOIN metrics m ON m.commit_id = c.id ",
+        )
+        return [
+            {
+                "sha": sha[:8],
+                "author": author,
+                "message": message[:100],
+                "metrics": json.loads(data),
+            }
+            for sha, author, message, data in rows
+        ]
+
+    def load_metrics(
+        self, query: CommitQuery, source: str | None = None
+    ) -> dict | None:
+        """
+        *_metrics.json contents for the matching analyzed commits; None if
+        none are.
+        """
+        results = self.load_results(query)
+        if not results:
+            return None
+        # Imported here: analyze_code itself imports this module
+        from analyze_code import summarize_results
+
+        metrics = summarize_results(results)
+        metrics["source"] = source
+        metrics["period"] = {"since": query.since, "until": query.until}
+        return metrics
+
+    def log(self, query: CommitQuery) -> list[str]:
+        """One line per matching commit, newest first."""
+        rows = self._select(
+            query,
+            "c.sha, c.source, c.author, c.date, c.additions, c.deletions," " c.message",
+        )
+        return [
+            f"{date[:16]}  {sha[:8]}  {source}  {author}  +{added} -{deleted}  "
+            + (message.splitlines() or [""])[0]
+            for sha, source, author, date, added, deleted, message in rows
+        ]
+
+
+def add_query_args(
+    parser,
+    store_help: str = (
+        "Read commits from the SQLite commit store instead of a JSON file"
+    ),
+) -> None:
+    """--store and the filters shared by every script that can read from the store."""
+    group = parser.add_argument_group("commit store")
+    group.add_argument(
+        "--store",
+        nargs="?",
+        const="",
+        metavar="PATH",
+        help=f"{store_help} (default: $GCA_STORE or "
+        "~/.local/share/git-commit-analyzer/commits.sqlite)",
+    )
+    group.add_argument(
+        "--author", action="append", help="Author name or email (repeatable)"
+    )
+    group.add_argument(
+        "--repo",
+        action="append",
+        help="Commits source: local path, owner/repo or GitLab project (repeatable)",
+    )
+    group.add_argument(
+        "--path",
+        action="append",
+        help="File, directory or glob the commit touched (repeatable)",
+    )
+    group.add_argument(
+        "--since",
+        help="Commits at or after: YYYY-MM-DD[THH:MM], 'N days ago', 'yesterday'",
+    )
+    group.add_argument("--until", help="Commits before this time")
+    group.add_argument("--limit", type=int, help="Newest N matching commits")
+
+
+def store_path(args) -> Path:
+    """The --store location; raises StoreQueryError when disabled."""
+    path = args.store or default_store_path()
+    if path is None:
+        raise StoreQueryError("--store: disabled by GCA_STORE")
+    return Path(path)
+
+
+def query_from_args(args) -> CommitQuery:
+    return CommitQuery(
+        sources=args.repo or [],
+        authors=args.author or [],
+        paths=args.path or [],
+        since=args.since,
+        until=args.until,
+        limit=args.limit,
+    )
+
+
+def check_query_args(
+    args, parser, has_file: bool, file_with_store: bool = False
+) -> None:
+    """
+    A JSON file, or --store with optional filters (both only when
+    `file_with_store`).
+    """
+    filters = any(
+        [args.author, args.repo, args.path, args.since, args.until, args.limit]
+    )
+    if has_file and args.store is not None and not file_with_store:
+        parser.error("give a JSON file or --store, not both")
+    if has_file and filters:
+        parser.error(
+            "--author/--repo/--path/--since/--until/--limit filter the commit "
+            "store, not a JSON file"
+        )
+    if not has_file and args.store is None:
+        parser.error("give a JSON file, or --store to read from the commit store")
+    if filters and args.store is None:
+        parser.error(
+            "--author/--repo/--path/--since/--until/--limit query the commit "
+            "store; add --store"
+        )
+
+
+def load_from_store(args, metrics: bool = True) -> tuple[dict, dict | None]:
+    """
+    commits.json and (if `metrics`) *_metrics.json contents for the --store
+    query options; raises StoreQueryError.
+    """
+    path = store_path(args)
+    if not path.exists():
+        raise StoreQueryError(
+            f"no commit store at {path}; run fetch_commits.py --store first"
+        )
+    query = query_from_args(args)
+    query.where()  # rejects unparseable dates
+    with CommitStore(path) as store:
+        data = store.load_commits(query)
+        if not data["commits"]:
+            raise StoreQueryError(f"no commits match the query in {path}")
+        return data, store.load_metrics(query, data["source"]) if metrics else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the commit store")
+    parser.add_argument(
+        "--output",
+        "-o",
+        help="Write matching commits as commits.json "
+        "(plus <name>_metrics.json when analyzed)",
+    )
+    add_query_args(parser, "Store to query")
+    add_profile_args(parser)
+
+    args = parser.parse_args()
+
+    with profile_session(args, "commit_store"):
+        try:
+            if args.output:
+                data, metrics = load_from_store(args)
+            else:
+                path = store_path(args)
+                query = query_from_args(args)
+                query.where()  # rejects unparseable dates
+                if not path.exists():
+                    raise StoreQueryError(
+                        f"no commit store at {path}; run fetch_commits.py --store first"
+                    )
+                with CommitStore(path) as store:
+                    print("\n".join(store.log(query)))
+                return
+        except ValueError as e:
+            parser.error(str(e))
+        with stage("json.dump"), open(args.output, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        print(f"Exported {data['commit_count']} commits -> {args.output}")
+        if metrics:
+            metrics_path = args.output.replace(".json", "_metrics.json")
+            with stage("json.dump"), open(metrics_path, "w", encoding="utf-8") as f:
+                json.dump(metrics, f, indent=2, ensure_ascii=False)
+            analyzed = len(metrics["commits"])
+            print(f"Exported metrics for {analyzed} commits -> {metrics_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Condense commit diffs before they go into a prompt.
+
+- the `git show` preamble (header, message, --stat) is dropped: the prompt
+  carries those fields already
+- `index` lines and "\\ No newline at end of file" markers are dropped
+- context lines further than `context` lines from a change are dropped and
+  hunks are split with recomputed headers, so the result is still a diff
+  parse_diff() reads the same way
+- generated files and lockfiles collapse to a one-line summary
+- hunks that only change whitespace are dropped; in files where
+  indentation is syntax (Python, YAML, Makefiles) a re-indented line is a
+  change
+- a hunk whose changes already appeared in an earlier commit of the same
+  run is replaced by a reference to that commit
+"""
+
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+
+from analyze_code import is_auto_generated_file
+from profiling import count
+
+CONTEXT_LINES = 2
+# Shorter hunks (a lone `}` or import) repeat by coincidence, not by copy
+MIN_DEDUP_LINES = 3
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,\d+)? \+(\d+)(?:,\d+)? @@(.*)$")
+# File header lines worth keeping; `index` and similar are noise
+KEPT_HEADERS = (
+    "--- ",
+    "+++ ",
+    "new file mode",
+    "deleted file mode",
+    "rename from",
+    "rename to",
+    "Binary files",
+)
+# Files whose leading whitespace is syntax: re-indenting changes meaning
+# fmt: off
+INDENT_SIGNIFICANT_SUFFIXES = (
+    ".py", ".pyi", ".pyw", ".yaml", ".yml", ".mk",
+    ".coffee", ".haml", ".pug", ".sass", ".nim",
+)
+# fmt: on
+INDENT_SIGNIFICANT_NAMES = ("Makefile", "makefile", "GNUmakefile")
+
+
+@dataclass
+class CondenseStats:
+    chars_in: int = 0
+    chars_out: int = 0
+    files_collapsed: int = 0
+    whitespace_hunks: int = 0
+    duplicate_hunks: int = 0
+    context_lines_dropped: int = 0
+
+    @property
+    def ratio(self) -> float:
+        """Output size as a fraction of the input (lower is better)."""
+        return self.chars_out / self.chars_in if self.chars_in else 1.0
+
+    def to_dict(self) -> dict:
+        return {
+            "chars_in": self.chars_in,
+            "chars_out": self.chars_out,
+            "ratio": round(self.ratio, 3),
+            "files_collapsed": self.files_collapsed,
+            "whitespace_hunks": self.whitespace_hunks,
+            "duplicate_hunks": self.duplicate_hunks,
+            "context_lines_dropped": self.context_lines_dropped,
+        }
+
+
+def _squash(line: str) -> str:
+    return "".join(line.split())
+
+
+def _indent_significant(path: str) -> bool:
+    name = os.path.basename(path)
+    return name in INDENT_SIGNIFICANT_NAMES or name.endswith(
+        INDENT_SIGNIFICANT_SUFFIXES
+    )
+
+
+def _whitespace_only(body: list[str], keep_indent: bool = False) -> bool:
+    """
+    Whether a hunk only changes whitespace. With `keep_indent`, leading
+    whitespace counts: moving a Python line into a block is a real change.
+    """
+
+    def key(line: str) -> str:
+        text = line[1:]
+        indent = text[: len(text) - len(text.lstrip())] if keep_indent else ""
+        return indent + _squash(text)
+
+    # In order: a hunk that only reorders lines is a real change
+    removed = [key(l) for l in body if l.startswith("-")]
+    added = [key(l) for l in body if l.startswith("+")]
+    return removed == added
+
+
+def _file_path(header: list[str]) -> str:
+    for line in header:
+        if line.startswith("+++ ") and not line.startswith("+++ /dev/null"):
+            return line[4:].removeprefix("b/").strip()
+    for line in header:
+        if line.startswith("--- "):
+            return line[4:].removeprefix("a/").strip()
+        if line.startswith("diff --git "):
+            return line.rsplit(" b/", 1)[-1]
+    return ""
+
+
+def _span(start: int, length: int) -> str:
+    if length == 1:
+        return str(start)
+    # An empty side is numbered by the line before it, as git does
+    return f"{start - 1 if length == 0 and start else start},{length}"
+
+
+class DiffCondenser:
+    """
+    Condenses the diffs of one run. Keep one instance per prompt so repeated
+    hunks are recognised across commits; `stats` accumulates over all calls.
+    """
+
+    def __init__(self, context: int = CONTEXT_LINES):
+        self.context = max(0, context)
+        self.stats = CondenseStats()
+        self._seen: dict[str, str] = {}
+
+    def condense(self, diff: str, sha: str = "") -> str:
+        out: list[str] = []
+        header: list[str] | None = None
+        hunks: list[tuple[str, list[str]]] = []
+
+        def flush():
+            if header is not None:
+                out.extend(self._file(header, hunks, sha))
+
+        lines = diff.split("\n")
+        # GitLab diffs have no `diff --git` lines, only ---/+++ pairs
+        git_format = diff.startswith("diff --git ") or "\ndiff --git " in diff
+        for i, line in enumerate(lines):
+            starts_file = line.startswith("diff --git ") or (
+                not git_format
+                and line.startswith("--- ")
+                and i + 1 < len(lines)
+                and lines[i + 1].startswith("+++ ")
+                and (header is None or hunks)
+            )
+            if starts_file:
+                flush()
+                header, hunks = [line], []
+            elif header is None:
+                continue  # commit header, message and --stat
+            elif line.startswith("@@"):
+                hunks.append((line, []))
+            elif hunks:
+                if not line.startswith("\\"):
+                    hunks[-1][1].append(line)
+            else:
+                header.append(line)
+        flush()
+
+        result = "\n".join(out) + "\n" if out else ""
+        self.stats.chars_in += len(diff)
+        self.stats.chars_out += len(result)
+        return result
+
+    def _file(
+        self, header: list[str], hunks: list[tuple[str, list[str]]], sha: str
+    ) -> list[str]:
+        kept = [header[0]] + [l for l in header[1:] if l.startswith(KEPT_HEADERS)]
+        path = _file_path(header)
+        if is_auto_generated_file(path):
+            added = sum(1 for _, body in hunks for l in body if l.startswith("+"))
+            deleted = sum(1 for _, body in hunks for l in body if l.startswith("-"))
+            self.stats.files_collapsed += 1
+            first = (
+                header[0] if header[0].startswith("diff --git ") else f"+++ b/{path}"
+            )
+            return [first, f"...[generated file: +{added} -{deleted} lines]"]
+
+        out = kept
+        keep_indent = _indent_significant(path)
+        for head, body in hunks:
+            # Trailing blank lines come from the split, not from the hunk
+            while body and body[-1] == "":
+                body.pop()
+            changed = [l for l in body if l[:1] in ("+", "-")]
+            if not changed:
+                continue
+            if _whitespace_only(body, keep_indent):
+                self.stats.whitespace_hunks += 1
+                continue
+            match = HUNK_HEADER.match(head)
+            if match is None:
+                out.append(head)
+                out.extend(body)
+                continue
+            key = hashlib.sha1("\n".join(changed).encode("utf-8")).hexdigest()
+            first = self._seen.get(key)
+            if first is None and len(changed) >= MIN_DEDUP_LINES:
+                self._seen[key] = sha[:8] or "?"
+            elif first is not None and first != (sha[:8] or "?"):
+                self.stats.duplicate_hunks += 1
+                out.append(f"{head} ...[same change as {first}]")
+                continue
+            out.extend(
+                self._trim(
+                    int(match.group(1)), int(match.group(2)), match.group(3), body
+                )
+            )
+        return out
+
+    def _trim(self, old: int, new: int, suffix: str, body: list[str]) -> list[str]:
+        """Split a hunk so each part keeps `context` lines around its changes."""
+        changes = [i for i, l in enumerate(body) if l[:1] in ("+", "-")]
+        keep = [False] * len(body)
+        for i in changes:
+            for j in range(
+                max(0, i - self.context), min(len(body), i + self.context + 1)
+            ):
+                keep[j] = True
+
+        out: list[str] = []
+        group: list[str] = []
+        group_old = group_new = 0
+        old_count = new_count = 0
+
+        def close():
+            if group:
+                old = _span(group_old, old_count)
+                new = _span(group_new, new_count)
+                out.append(f"@@ -{old} +{new} @@{suffix}")
+                out.extend(group)
+
+        for line, wanted in zip(body, keep):
+            kind = line[:1]
+            if wanted:
+                if not group:
+                    group_old, group_new, old_count, new_count = old, new, 0, 0
+                group.append(line)
+                old_count += kind != "+"
+                new_count += kind != "-"
+            elif group:
+                close()
+                group = []
+            if not wanted:
+                self.stats.context_lines_dropped += 1
+            old += kind != "+"
+            new += kind != "-"
+        close()
+        return out
+
+
+def condense_commits(
+    commits: list[dict], context: int = CONTEXT_LINES
+) -> tuple[list[dict], CondenseStats]:
+    """Copies of `commits` with condensed diffs, plus the run's stats."""
+    condenser = DiffCondenser(context)
+    condensed = [
+        {**c, "diff": condenser.condense(c.get("diff", ""), c.get("sha", ""))}
+        for c in commits
+    ]
+    stats = condenser.stats
+    count("condense.chars_in", stats.chars_in)
+    count("condense.chars_out", stats.chars_out)
+    count("condense.files_collapsed", stats.files_collapsed)
+    count("condense.whitespace_hunks", stats.whitespace_hunks)
+    count("condense.duplicate_hunks", stats.duplicate_hunks)
+    return condensed, stats
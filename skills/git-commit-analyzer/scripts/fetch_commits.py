@@ -12,18 +12,62 @@ import sys
 from datetime import datetime
 from typing import Optional
 
+from commit_store import CommitStore, default_store_path
+from profiling import add_profile_args, profile_session, stage
+
 def run_git_command(args: list[str], cwd: str) -> str:
     """Execute git command and return output."""
-    result = subprocess.run(
-        ["git"] + args,
-        cwd=cwd,
-        capture_output=True,
-        text=True
-    )
+    with stage(f"git.{args[0]}") as st:
+        result = subprocess.run(
+            ["git"] + args,
+            cwd=cwd,
+            capture_output=True,
+            text=True
+        )
+        st.add_bytes(len(result.stdout))
     if result.returncode != 0:
         raise RuntimeError(f"Git command failed: {result.stderr}")
     return result.stdout
 
+MAX_BLOB_BYTES = 1024 * 1024
+
+def read_blobs(repo_path: str, shas: list[str], max_bytes: int = MAX_BLOB_BYTES) -> dict[str, str]:
+    """
+    Read blob contents by SHA with a single `git cat-file --batch` call.
+    Missing, binary and larger-than-max_bytes blobs are left out.
+    """
+    unique = list(dict.fromkeys(shas))
+    if not unique:
+        return {}
+    with stage("git.cat-file") as st:
+        result = subprocess.run(
+            ["git", "cat-file", "--batch"],
+            cwd=repo_path,
+            input="".join(f"{sha}\n" for sha in unique).encode(),
+            capture_output=True
+        )
+        st.add_bytes(len(result.stdout))
+    if result.returncode != 0:
+        raise RuntimeError(f"Git command failed: {result.stderr.decode(errors='replace')}")
+    
+    out = result.stdout
+    pos = 0
+    blobs = {}
+    for sha in unique:
+        end = out.index(b"\n", pos)
+        header = out[pos:end].split()
+        pos = end + 1
+        # "<sha> <type> <size>" followed by the content, or "<sha> missing"
+        if len(header) != 3:
+            continue
+        size = int(header[2])
+        data = out[pos:pos + size]
+        pos += size + 1
+        if header[1] != b"blob" or size > max_bytes or b"\0" in data[:8000]:
+            continue
+        blobs[sha] = data.decode("utf-8", errors="replace")
+    return blobs
+
 def fetch_local_commits(repo_path: str, since: str, until: Optional[str] = None) -> list[dict]:
     """Fetch commits from local git repository."""
     
@@ -48,17 +92,21 @@ def fetch_local_commits(repo_path: str, since: str, until: Optional[str] = None)
         # Get diff for this commit
         diff = run_git_command(["show", sha, "--stat", "--patch"], repo_path)
         
-        # Get changed files
-        files_output = run_git_command(["show", sha, "--name-status", "--pretty=format:"], repo_path)
+        # Get changed files, with post-image blob SHAs
+        files_output = run_git_command(["show", sha, "--raw", "--no-abbrev", "--pretty=format:"], repo_path)
         changed_files = []
         for file_line in files_output.strip().split("\n"):
-            if file_line.strip():
-                parts = file_line.split("\t")
-                if len(parts) >= 2:
-                    changed_files.append({
-                        "status": parts[0],
-                        "path": parts[-1]
-                    })
+            meta, _, paths = file_line.partition("\t")
+            # ":old_mode new_mode old_sha new_sha status" (merges: "::" and more columns)
+            fields = meta.lstrip(":").split()
+            if paths and len(fields) >= 2:
+                entry = {
+                    "status": fields[-1],
+                    "path": paths.split("\t")[-1]
+                }
+                if fields[-2].strip("0"):
+                    entry["blob"] = fields[-2]
+                changed_files.append(entry)
         
         # Get line stats
         numstat = run_git_command(["show", sha, "--numstat", "--pretty=format:"], repo_path)
@@ -114,8 +162,10 @@ def fetch_github_commits(repo: str, since: str, until: Optional[str] = None) ->
     req.add_header("Authorization", f"token {token}")
     req.add_header("Accept", "application/vnd.github.v3+json")
     
-    with urllib.request.urlopen(req) as response:
-        commits_data = json.loads(response.read().decode())
+    with stage("http.github") as st, urllib.request.urlopen(req) as response:
+        body = response.read()
+        st.add_bytes(len(body))
+    commits_data = json.loads(body.decode())
     
     commits = []
     for commit_info in commits_data:
@@ -127,16 +177,20 @@ def fetch_github_commits(repo: str, since: str, until: Optional[str] = None) ->
         req.add_header("Authorization", f"token {token}")
         req.add_header("Accept", "application/vnd.github.v3.diff")
         
-        with urllib.request.urlopen(req) as response:
-            diff = response.read().decode()
+        with stage("http.github") as st, urllib.request.urlopen(req) as response:
+            body = response.read()
+            st.add_bytes(len(body))
+        diff = body.decode()
         
         # Fetch commit details
         req = urllib.request.Request(detail_url)
         req.add_header("Authorization", f"token {token}")
         req.add_header("Accept", "application/vnd.github.v3+json")
         
-        with urllib.request.urlopen(req) as response:
-            detail = json.loads(response.read().decode())
+        with stage("http.github") as st, urllib.request.urlopen(req) as response:
+            body = response.read()
+            st.add_bytes(len(body))
+        detail = json.loads(body.decode())
         
         commits.append({
             "sha": sha,
@@ -148,7 +202,9 @@ def fetch_github_commits(repo: str, since: str, until: Optional[str] = None) ->
             "message": commit_info["commit"]["message"],
             "diff": diff,
             "changed_files": [
-                {"status": f["status"], "path": f["filename"]}
+                {"status": f["status"], "path": f["filename"], "blob": f["sha"]}
+                if f.get("sha") and f["status"] != "removed"
+                else {"status": f["status"], "path": f["filename"]}
                 for f in detail.get("files", [])
             ],
             "stats": {
@@ -184,8 +240,10 @@ def fetch_gitlab_commits(project_id: str, since: str, until: Optional[str] = Non
     req = urllib.request.Request(url)
     req.add_header("PRIVATE-TOKEN", token)
     
-    with urllib.request.urlopen(req) as response:
-        commits_data = json.loads(response.read().decode())
+    with stage("http.gitlab") as st, urllib.request.urlopen(req) as response:
+        body = response.read()
+        st.add_bytes(len(body))
+    commits_data = json.loads(body.decode())
     
     commits = []
     for commit_info in commits_data:
@@ -196,8 +254,10 @@ def fetch_gitlab_commits(project_id: str, since: str, until: Optional[str] = Non
         req = urllib.request.Request(diff_url)
         req.add_header("PRIVATE-TOKEN", token)
         
-        with urllib.request.urlopen(req) as response:
-            diff_data = json.loads(response.read().decode())
+        with stage("http.gitlab") as st, urllib.request.urlopen(req) as response:
+            body = response.read()
+            st.add_bytes(len(body))
+        diff_data = json.loads(body.decode())
         
         # Build diff string
         diff_lines = []
@@ -233,6 +293,61 @@ def fetch_gitlab_commits(project_id: str, since: str, until: Optional[str] = Non
     
     return commits
 
+def fetch(
+    repo_path: Optional[str] = None,
+    github: Optional[str] = None,
+    gitlab: Optional[str] = None,
+    since: str = "1 day ago",
+    until: Optional[str] = None,
+) -> dict:
+    """commits.json contents for one source (GitHub, GitLab or a local repo)."""
+    if github:
+        print(f"Fetching commits from GitHub: {github}")
+        commits = fetch_github_commits(github, since, until)
+    elif gitlab:
+        print(f"Fetching commits from GitLab: {gitlab}")
+        commits = fetch_gitlab_commits(gitlab, since, until)
+    elif repo_path:
+        # One spelling per repository, whichever directory it was fetched from
+        repo_path = os.path.realpath(repo_path)
+        print(f"Fetching commits from local repo: {repo_path}")
+        commits = fetch_local_commits(repo_path, since, until)
+    else:
+        raise ValueError("Must specify repo_path, --github, or --gitlab")
+
+    return {
+        "fetched_at": datetime.now().isoformat(),
+        "source": github or gitlab or repo_path,
+        "since": since,
+        "until": until,
+        "commit_count": len(commits),
+        "commits": commits
+    }
+
+def run(args, parser):
+    """Fetch commits as requested by CLI args and write the JSON output."""
+    try:
+        output = fetch(args.repo_path, args.github, args.gitlab, args.since, args.until)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    if args.store is not None:
+        path = args.store or default_store_path()
+        if path is None:
+            parser.error("--store: disabled by GCA_STORE")
+        with CommitStore(path) as store:
+            store.add_commits(output)
+        print(f"Stored {output['commit_count']} commits -> {path}")
+        if not args.output:
+            return
+    
+    # Write output
+    output_path = args.output or "commits.json"
+    with stage("json.dump"), open(output_path, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2, ensure_ascii=False)
+    
+    print(f"Fetched {output['commit_count']} commits -> {output_path}")
+
 def main():
     parser = argparse.ArgumentParser(description="Fetch git commits for AI analysis")
     parser.add_argument("repo_path", nargs="?", help="Local repository path")
@@ -240,38 +355,21 @@ def main():
     parser.add_argument("--gitlab", help="GitLab project ID or path")
     parser.add_argument("--since", required=True, help="Fetch commits since (e.g., '1 day ago', '2024-01-01')")
     parser.add_argument("--until", help="Fetch commits until (optional)")
-    parser.add_argument("--output", "-o", default="commits.json", help="Output file path")
+    parser.add_argument("--output", "-o", help="Output file path (default: commits.json; none with --store)")
+    parser.add_argument(
+        "--store",
+        nargs="?",
+        const="",
+        metavar="PATH",
+        help="Also ingest into the SQLite commit store "
+        "(default: $GCA_STORE or ~/.local/share/git-commit-analyzer/commits.sqlite)",
+    )
+    add_profile_args(parser)
     
     args = parser.parse_args()
     
-    # Determine source and fetch commits
-    if args.github:
-        print(f"Fetching commits from GitHub: {args.github}")
-        commits = fetch_github_commits(args.github, args.since, args.until)
-    elif args.gitlab:
-        print(f"Fetching commits from GitLab: {args.gitlab}")
-        commits = fetch_gitlab_commits(args.gitlab, args.since, args.until)
-    elif args.repo_path:
-        print(f"Fetching commits from local repo: {args.repo_path}")
-        commits = fetch_local_commits(args.repo_path, args.since, args.until)
-    else:
-        parser.error("Must specify repo_path, --github, or --gitlab")
-    
-    # Build output
-    output = {
-        "fetched_at": datetime.now().isoformat(),
-        "source": args.github or args.gitlab or args.repo_path,
-        "since": args.since,
-        "until": args.until,
-        "commit_count": len(commits),
-        "commits": commits
-    }
-    
-    # Write output
-    with open(args.output, "w", encoding="utf-8") as f:
-        json.dump(output, f, indent=2, ensure_ascii=False)
-    
-    print(f"Fetched {len(commits)} commits -> {args.output}")
+    with profile_session(args, "fetch_commits"):
+        run(args, parser)
 
 if __name__ == "__main__":
     main()
@@ -5,10 +5,55 @@ Combines playful Chinese corporate style with Linus-style brutal honesty.
 """
 
 import argparse
+import hashlib
 import json
+import math
 import sys
 from pathlib import Path
 
+from analyze_code import is_auto_generated_file
+from commit_store import add_query_args, check_query_args, load_from_store
+from condense_diff import CONTEXT_LINES, condense_commits
+from metrics_table import MetricsTable, encode_metrics
+from profiling import add_profile_args, count, profile_session, stage
+
+DIFF_CHAR_LIMIT = 5000
+
+# Token estimate: code and JSON run about 3.5 ASCII characters per token;
+# any other character (CJK, emoji) is counted as a token of its own
+ASCII_CHARS_PER_TOKEN = 3.5
+# Diff excerpts smaller than this say too little to be worth their header
+MIN_EXCERPT_TOKENS = 120
+# Share of the data budget kept for diff excerpts before commits are demoted
+DIFF_BUDGET_SHARE = 0.5
+MAX_PACK_PASSES = 5
+
+# Metric flags that make a commit a one-line summary in --max-tokens mode
+SUMMARY_FLAGS = (
+    ("is_auto_generated", "auto_generated"),
+    ("is_formatting_only", "formatting_only"),
+    ("is_rename_only", "rename_only"),
+    ("is_trivial", "trivial"),
+)
+
+# json: indented *_metrics.json; table: the compact metrics_table encoding
+METRICS_FORMATS = ("json", "table")
+# classic: data in the middle of the instructions; cached: instructions
+# first as a stable prefix, then data in a deterministic order
+LAYOUTS = ("classic", "cached")
+
+CACHED_DATA_HEADER_ZH = """
+---
+
+# 本次数据
+"""
+
+CACHED_DATA_HEADER_EN = """
+---
+
+# Data for This Run
+"""
+
 PROMPT_ZH = """
 你是「牛马鉴定师」，既懂代码又懂职场，同时还有 Linus Torvalds 附体。
 
@@ -360,80 +405,611 @@ For each person, also provide:
 """
 
 
+def _split_template(template: str) -> tuple[str, str, str]:
+    """(instructions, metrics block, commits block) of a PROMPT_* template."""
+    start = template.rfind("\n## ", 0, template.index("{metrics_json}")) + 1
+    middle = template.rfind("\n## ", 0, template.index("{commits_json}")) + 1
+    end = template.index("{commits_json}") + len("{commits_json}")
+    return (
+        template[:start] + template[end:].lstrip("\n"),
+        template[start:middle].rstrip("\n") + "\n",
+        template[middle:end] + "\n",
+    )
+
+
+def build_template(lang: str = "zh", layout: str = "classic", note: str = "") -> str:
+    """
+    The prompt template for `layout`, with `note` (already formatted text)
+    ahead of the data. The cached layout keeps everything before the data
+    identical across runs; commits come before metrics since a growing
+    window appends to them while the totals change every run.
+    """
+    template = PROMPT_ZH if lang == "zh" else PROMPT_EN
+    note = note.replace("{", "{{").replace("}", "}}")
+    if layout == "classic":
+        return note + template
+    instructions, metrics_block, commits_block = _split_template(template)
+    header = CACHED_DATA_HEADER_ZH if lang == "zh" else CACHED_DATA_HEADER_EN
+    return instructions + header + note + "\n" + commits_block + "\n" + metrics_block
+
+
+def prompt_prefix(lang: str = "zh", layout: str = "cached") -> str:
+    """The run-independent start of every prompt in `layout`."""
+    if layout != "cached":
+        return ""
+    instructions, _, _ = _split_template(PROMPT_ZH if lang == "zh" else PROMPT_EN)
+    return instructions.format() + (CACHED_DATA_HEADER_ZH if lang == "zh" else CACHED_DATA_HEADER_EN)
+
+
+def prefix_hash(lang: str = "zh", layout: str = "cached") -> str:
+    return hashlib.sha256(prompt_prefix(lang, layout).encode("utf-8")).hexdigest()
+
+
+def stable_order(data: dict, metrics: dict | None) -> tuple[dict, dict | None]:
+    """Copies with commits sorted by (date, sha) and authors by name."""
+    commits = sorted(data.get("commits", []), key=lambda c: (c["date"], c["sha"]))
+    data = {**data, "commits": commits}
+    if metrics is not None:
+        rank = {c["sha"][:8]: i for i, c in enumerate(commits)}
+        metrics = {
+            **metrics,
+            "commits": sorted(
+                metrics.get("commits", []), key=lambda r: (rank.get(r["sha"], len(rank)), r["sha"])
+            ),
+            "by_author": dict(sorted(metrics.get("by_author", {}).items())),
+        }
+    return data, metrics
+
+
 def load_metrics(commits_file: str) -> dict | None:
     metrics_file = commits_file.replace(".json", "_metrics.json")
     if Path(metrics_file).exists():
-        with open(metrics_file, "r", encoding="utf-8") as f:
+        with stage("json.load"), open(metrics_file, "r", encoding="utf-8") as f:
             return json.load(f)
     return None
 
 
-def generate_prompt(commits_file: str, lang: str = "zh", max_commits: int = 50) -> str:
-    with open(commits_file, "r", encoding="utf-8") as f:
+def estimate_tokens(text: str) -> int:
+    non_ascii = len(text) - len(text.encode("ascii", "ignore"))
+    return math.ceil((len(text) - non_ascii) / ASCII_CHARS_PER_TOKEN) + non_ascii
+
+
+def _json_tokens(value, depth: int = 0) -> int:
+    """Tokens of `value` as dumped with indent=2, nested `depth` levels deep."""
+    text = json.dumps(value, indent=2, ensure_ascii=False)
+    indent = (text.count("\n") + 1) * 2 * depth
+    # +2 for the separating ",\n"
+    return estimate_tokens(text) + math.ceil((indent + 2) / ASCII_CHARS_PER_TOKEN)
+
+
+def commit_header(c: dict) -> dict:
+    return {
+        "sha": c["sha"][:8],
+        "author": c["author"]["name"],
+        "date": c["date"],
+        "message": c["message"],
+        "stats": c["stats"],
+        "changed_files": c["changed_files"],
+    }
+
+
+def split_diff(diff: str) -> list[str]:
+    """Per-file sections of a unified diff, each starting at `diff --git`."""
+    sections: list[str] = []
+    start = 0
+    while True:
+        pos = diff.find("\ndiff --git ", start + 1)
+        if pos < 0:
+            sections.append(diff[start:])
+            return [section for section in sections if section]
+        sections.append(diff[start : pos + 1])
+        start = pos + 1
+
+
+def _section_path(section: str) -> str:
+    first = section.split("\n", 1)[0]
+    return first.rsplit(" b/", 1)[-1] if " b/" in first else first
+
+
+def _truncate_lines(text: str, max_tokens: int) -> str:
+    lines = text.split("\n")
+    kept, used = [], 0
+    for line in lines:
+        # +1 for the escaped newline in the JSON string
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    dropped = len(lines) - len(kept)
+    if dropped:
+        kept.append(f"...[truncated {dropped} lines]")
+    return "\n".join(kept)
+
+
+def excerpt_diff(diff: str, max_tokens: int) -> str:
+    """
+    Cut a diff down to about `max_tokens`. Generated files shrink to their
+    header line first; the rest share the budget evenly, keeping the head
+    of each file.
+    """
+    if _json_tokens(diff) <= max_tokens:
+        return diff
+    sections = split_diff(diff)
+    generated = [is_auto_generated_file(_section_path(s)) for s in sections]
+    sections = [
+        s.split("\n", 1)[0] + "\n...[generated file diff omitted]\n" if gen else s
+        for s, gen in zip(sections, generated)
+    ]
+    costs = [_json_tokens(s) for s in sections]
+    shares = _water_fill(costs, [1.0] * len(sections), max_tokens)
+    return "".join(
+        s if share >= cost else _truncate_lines(s, int(share))
+        for s, cost, share in zip(sections, costs, shares)
+    )
+
+
+def _water_fill(demands: list[int], weights: list[float], budget: float) -> list[float]:
+    """
+    Split `budget` in proportion to `weights`, capping each share at its
+    demand and handing what capped items leave over to the others.
+    """
+    shares = [0.0] * len(demands)
+    open_items = [i for i, d in enumerate(demands) if d > 0]
+    while open_items and budget > 0:
+        total = sum(weights[i] for i in open_items)
+        capped = [i for i in open_items if demands[i] <= budget * weights[i] / total]
+        if not capped:
+            for i in open_items:
+                shares[i] = budget * weights[i] / total
+            break
+        for i in capped:
+            shares[i] = demands[i]
+            budget -= demands[i]
+        open_items = [i for i in open_items if i not in capped]
+    return shares
+
+
+def commit_priority(c: dict, m: dict | None) -> float:
+    """Most informative first: real work, and padding worth calling out."""
+    if m is None:
+        stats = c.get("stats", {})
+        return float(stats.get("additions", 0) + stats.get("deletions", 0))
+    return m.get("substance_score", 0) + m.get("bullshit_score", 0) / 2
+
+
+def summary_reason(m: dict | None) -> str | None:
+    if m is None:
+        return None
+    for flag, reason in SUMMARY_FLAGS:
+        if m.get(flag):
+            return reason
+    return None
+
+
+def summarize_commit(c: dict, m: dict | None, reason: str) -> dict:
+    entry = {
+        "sha": c["sha"][:8],
+        "author": c["author"]["name"],
+        "message": c["message"].split("\n", 1)[0][:100],
+        "stats": c["stats"],
+        "reason": reason,
+    }
+    if m is not None:
+        entry["substance_score"] = m.get("substance_score", 0)
+        entry["bullshit_score"] = m.get("bullshit_score", 0)
+    return entry
+
+
+def compact_commit_metrics(m: dict) -> dict:
+    """Scores plus every non-default feature of one commit."""
+    out = {"substance_score": m.get("substance_score", 0), "bullshit_score": m.get("bullshit_score", 0)}
+    out.update({k: v for k, v in m.items() if k not in out and v not in (0, False, None, "", [], {})})
+    return out
+
+
+def compact_metrics(metrics: dict, inlined: list[str]) -> dict:
+    """Metrics section for --max-tokens: totals, authors and inlined commits only."""
+    keep = set(inlined)
+    by_author = {}
+    for name, data in metrics.get("by_author", {}).items():
+        warnings: dict[str, int] = {}
+        for w in data.get("warnings", []):
+            warnings[w] = warnings.get(w, 0) + 1
+        top = sorted(warnings.items(), key=lambda kv: -kv[1])[:5]
+        by_author[name] = {**data, "warnings": dict(top)}
+    out = {
+        "summary": metrics.get("summary", {}),
+        "by_author": by_author,
+        "commits": [
+            {"sha": r["sha"], "metrics": compact_commit_metrics(r["metrics"])}
+            for r in metrics.get("commits", [])
+            if r["sha"] in keep
+        ],
+    }
+    if "scoring" in metrics:
+        out["scoring"] = metrics["scoring"]
+    return out
+
+
+def pack_commits(
+    data: dict,
+    metrics: dict | None,
+    budget: int,
+    max_commits: int | None = None,
+    metrics_format: str = "json",
+    lang: str = "zh",
+) -> tuple[dict, list[str]]:
+    """
+    Choose how each commit appears within `budget` tokens (for both data
+    sections): inlined with a diff excerpt, summarized in one line, or
+    omitted. Returns the commits section and the short SHAs of the inlined
+    commits, whose metrics go into the metrics section.
+    """
+    commits = data.get("commits", [])
+    by_sha = {r["sha"]: r["metrics"] for r in (metrics or {}).get("commits", [])}
+    info = []  # (commit, metrics, priority, reason)
+    for c in commits:
+        m = by_sha.get(c["sha"][:8])
+        info.append((c, m, commit_priority(c, m), summary_reason(m)))
+    order = sorted(range(len(info)), key=lambda i: -info[i][2])
+
+    inline = [i for i in order if info[i][3] is None]
+    summarized = {i: info[i][3] for i in order if info[i][3] is not None}
+    if max_commits is not None:
+        for i in inline[max_commits:]:
+            summarized[i] = "max_commits"
+        inline = inline[:max_commits]
+
+    table = MetricsTable(metrics) if metrics is not None and metrics_format == "table" else None
+
+    def header_cost(i):
+        c, m, _, _ = info[i]
+        cost = _json_tokens(commit_header(c), depth=2)
+        if m is None:
+            return cost
+        if table is not None:
+            return cost + estimate_tokens(table.row(c["sha"][:8])) + 1
+        return cost + _json_tokens(compact_commit_metrics(m), depth=2)
+
+    def summary_cost(i):
+        c, m, _, reason = info[i]
+        return _json_tokens(summarize_commit(c, m, summarized.get(i) or reason or "budget"), depth=2)
+
+    fixed = _json_tokens({"source": data.get("source"), "period": {}})
+    if metrics is not None:
+        fixed += estimate_tokens(render_metrics(metrics, lang, metrics_format, []))
+    headers = {i: header_cost(i) for i in inline}
+    total = fixed + sum(headers.values()) + sum(summary_cost(i) for i in summarized)
+
+    # Leave room for the diffs of the commits that stay inlined, then
+    # demote and drop lowest priority first
+    diff_costs = {i: _json_tokens(info[i][0].get("diff", "")) for i in inline}
+    diff_demand = sum(diff_costs.values())
+
+    def reserve():
+        return min(diff_demand, int(budget * DIFF_BUDGET_SHARE))
+
+    while total > budget - reserve() and inline:
+        i = inline.pop()
+        summarized[i] = "budget"
+        total += summary_cost(i) - headers.pop(i)
+        diff_demand -= diff_costs.pop(i)
+    dropped = []
+    for i in sorted(summarized, key=lambda i: info[i][2]):
+        if total <= budget:
+            break
+        total -= summary_cost(i)
+        dropped.append(i)
+    for i in dropped:
+        del summarized[i]
+
+    # Diff excerpts share what is left, weighted by priority
+    diffs = {i: info[i][0].get("diff", "") for i in inline}
+    with_diff = [i for i in inline if diffs[i]]
+    excerpts: dict[int, str] = {}
+    left = budget - total
+    while with_diff:
+        demands = [_json_tokens(diffs[i]) for i in with_diff]
+        shares = _water_fill(demands, [info[i][2] + 1 for i in with_diff], left)
+        small = [i for i, share, d in zip(with_diff, shares, demands) if share < min(d, MIN_EXCERPT_TOKENS)]
+        if small:
+            with_diff.remove(min(small, key=lambda i: info[i][2]))
+            continue
+        for i, share, demand in zip(with_diff, shares, demands):
+            excerpts[i] = diffs[i] if share >= demand else excerpt_diff(diffs[i], int(share))
+        break
+    left -= sum(_json_tokens(e) for e in excerpts.values())
+
+    # Promote demoted commits back, best first, while the budget has room
+    for i in sorted((i for i, r in summarized.items() if r == "budget"), key=lambda i: -info[i][2]):
+        diff = info[i][0].get("diff", "")
+        room = left - header_cost(i) + summary_cost(i)
+        if room < min(_json_tokens(diff), MIN_EXCERPT_TOKENS):
+            continue
+        excerpt = excerpt_diff(diff, room) if diff else ""
+        left = room - _json_tokens(excerpt)
+        headers[i] = header_cost(i)
+        del summarized[i]
+        if excerpt:
+            excerpts[i] = excerpt
+
+    section = {
+        "source": data.get("source"),
+        "period": {"since": data.get("since"), "until": data.get("until")},
+        "commits": [],
+        "summarized_commits": [],
+    }
+    for i in range(len(info)):
+        c, m, _, reason = info[i]
+        if i in headers:
+            entry = commit_header(c)
+            entry["diff"] = excerpts.get(i, "")
+            if entry["diff"] != c.get("diff", ""):
+                entry["diff_excerpted"] = True
+            section["commits"].append(entry)
+        elif i in summarized:
+            section["summarized_commits"].append(summarize_commit(c, m, summarized[i]))
+    if dropped:
+        section["omitted_commits"] = len(dropped)
+    count("prompt.commits_inlined", len(section["commits"]))
+    count("prompt.commits_summarized", len(section["summarized_commits"]))
+    count("prompt.commits_omitted", len(dropped))
+
+    return section, [info[i][0]["sha"][:8] for i in headers]
+
+
+def _no_metrics_json(lang: str) -> str:
+    msg = (
+        "[未找到预计算指标，请先运行 analyze_code.py]"
+        if lang == "zh"
+        else "[No pre-computed metrics found. Run analyze_code.py first]"
+    )
+    return f'"{msg}"'
+
+
+def render_metrics(
+    metrics: dict | None, lang: str, metrics_format: str = "json", shas: list[str] | None = None
+) -> str:
+    """
+    The metrics section: indented JSON, or the compact table with its format
+    explanation. With `shas`, only those commits' metrics (plus rollups).
+    """
+    if metrics is None:
+        return _no_metrics_json(lang)
+    if metrics_format == "table":
+        return encode_metrics(metrics, shas, lang)
+    if shas is not None:
+        metrics = compact_metrics(metrics, shas)
+    return json.dumps(metrics, indent=2, ensure_ascii=False)
+
+
+def generate_prompt(
+    commits_file: str,
+    lang: str = "zh",
+    max_commits: int | None = 50,
+    max_tokens: int | None = None,
+    condense: bool = False,
+    context_lines: int = CONTEXT_LINES,
+    metrics_format: str = "json",
+    layout: str = "classic",
+) -> str:
+    """
+    Build the analysis prompt. By default the first `max_commits` commits are
+    inlined with diffs cut at DIFF_CHAR_LIMIT characters. With `max_tokens`
+    the prompt is packed to fit that (estimated) token budget instead; see
+    pack_commits(). `condense` runs the diffs through condense_diff first;
+    metrics_format="table" embeds metrics as a compact table (metrics_table).
+    layout="cached" puts the instructions first (see build_template).
+    """
+    with stage("json.load"), open(commits_file, "r", encoding="utf-8") as f:
         data = json.load(f)
 
+    return build_prompt(
+        data,
+        load_metrics(commits_file),
+        lang,
+        max_commits,
+        max_tokens,
+        condense=condense,
+        context_lines=context_lines,
+        metrics_format=metrics_format,
+        layout=layout,
+    )
+
+
+def build_prompt(
+    data: dict,
+    metrics: dict | None,
+    lang: str = "zh",
+    max_commits: int | None = 50,
+    max_tokens: int | None = None,
+    condense: bool = False,
+    context_lines: int = CONTEXT_LINES,
+    metrics_format: str = "json",
+    layout: str = "classic",
+) -> str:
+    """generate_prompt() on an in-memory commits.json and *_metrics.json."""
+    data = dict(data)
+    template = build_template(lang, layout)
+    if max_tokens is not None:
+        if layout == "cached":
+            data, metrics = stable_order(data, metrics)
+        if condense:
+            data["commits"] = condense_for_prompt(data.get("commits", []), context_lines)
+        with stage("prompt.pack"):
+            return pack_prompt(
+                data, metrics, template, lang, max_tokens, max_commits, metrics_format
+            )
+
     commits = data.get("commits", [])[:max_commits]
-    metrics = load_metrics(commits_file)
+    if layout == "cached":
+        ordered, metrics = stable_order({**data, "commits": commits}, metrics)
+        commits = ordered["commits"]
+    if condense:
+        commits = condense_for_prompt(commits, context_lines)
 
     simplified_commits = []
     for c in commits:
-        simplified = {
-            "sha": c["sha"][:8],
-            "author": c["author"]["name"],
-            "date": c["date"],
-            "message": c["message"],
-            "stats": c["stats"],
-            "changed_files": c["changed_files"],
-            "diff": c.get("diff", "")[:5000]
-            + ("...[truncated]" if len(c.get("diff", "")) > 5000 else ""),
-        }
+        simplified = commit_header(c)
+        simplified["diff"] = c.get("diff", "")[:DIFF_CHAR_LIMIT] + (
+            "...[truncated]" if len(c.get("diff", "")) > DIFF_CHAR_LIMIT else ""
+        )
         simplified_commits.append(simplified)
 
-    commits_json = json.dumps(
-        {
-            "source": data.get("source"),
-            "period": {"since": data.get("since"), "until": data.get("until")},
-            "commits": simplified_commits,
-        },
-        indent=2,
-        ensure_ascii=False,
-    )
+    with stage("json.dumps") as st:
+        commits_json = json.dumps(
+            {
+                "source": data.get("source"),
+                "period": {"since": data.get("since"), "until": data.get("until")},
+                "commits": simplified_commits,
+            },
+            indent=2,
+            ensure_ascii=False,
+        )
+        st.add_bytes(len(commits_json))
 
     if metrics:
-        metrics_json = json.dumps(metrics, indent=2, ensure_ascii=False)
+        with stage("json.dumps") as st:
+            metrics_json = render_metrics(metrics, lang, metrics_format)
+            st.add_bytes(len(metrics_json))
     else:
-        msg = (
-            "[未找到预计算指标，请先运行 analyze_code.py]"
-            if lang == "zh"
-            else "[No pre-computed metrics found. Run analyze_code.py first]"
-        )
-        metrics_json = f'"{msg}"'
+        metrics_json = _no_metrics_json(lang)
 
-    template = PROMPT_ZH if lang == "zh" else PROMPT_EN
-    return template.format(metrics_json=metrics_json, commits_json=commits_json)
+    with stage("prompt.format"):
+        return template.format(metrics_json=metrics_json, commits_json=commits_json)
+
+
+def condense_for_prompt(commits: list[dict], context_lines: int) -> list[dict]:
+    with stage("prompt.condense"):
+        commits, stats = condense_commits(commits, context_lines)
+    print(
+        f"Condensed diffs: {stats.chars_in:,} -> {stats.chars_out:,} chars "
+        f"(ratio {stats.ratio:.2f}; {stats.files_collapsed} generated files collapsed, "
+        f"{stats.whitespace_hunks} whitespace-only and {stats.duplicate_hunks} duplicate hunks dropped, "
+        f"{stats.context_lines_dropped} context lines trimmed)",
+        file=sys.stderr,
+    )
+    return commits
+
+
+def pack_prompt(
+    data: dict,
+    metrics: dict | None,
+    template: str,
+    lang: str,
+    max_tokens: int,
+    max_commits: int | None = None,
+    metrics_format: str = "json",
+) -> str:
+    """Format the template with data sections packed into what it leaves of max_tokens."""
+    fixed = estimate_tokens(template.format(metrics_json="", commits_json=""))
+    budget = max_tokens - fixed
+    if budget <= 0:
+        raise ValueError(f"--max-tokens {max_tokens} is below the template's own ~{fixed} tokens")
+    # Estimates of the parts miss some JSON nesting; shrink until the whole fits
+    for _ in range(MAX_PACK_PASSES):
+        section, inlined = pack_commits(
+            data, metrics, budget, max_commits, metrics_format, lang
+        )
+        commits_json = json.dumps(section, indent=2, ensure_ascii=False)
+        metrics_json = render_metrics(metrics, lang, metrics_format, inlined)
+        prompt = template.format(metrics_json=metrics_json, commits_json=commits_json)
+        over = estimate_tokens(prompt) - max_tokens
+        if over <= 0:
+            return prompt
+        budget -= over + max(1, budget // 100)
+        if budget <= 0:
+            break
+    raise ValueError(
+        f"--max-tokens {max_tokens}: the packed prompt still needs ~{max_tokens + over} tokens "
+        "(metrics and commit summaries alone do not fit)"
+    )
 
 
 def main():
     parser = argparse.ArgumentParser(description="Generate analysis prompt for Claude")
-    parser.add_argument("commits_file", help="Path to commits.json")
+    parser.add_argument("commits_file", nargs="?", help="Path to commits.json (or query the commit store with --store)")
     parser.add_argument(
         "--lang", "-l", choices=["zh", "en"], default="zh", help="Prompt language"
     )
     parser.add_argument(
-        "--max-commits", type=int, default=50, help="Max commits to include"
+        "--max-commits",
+        type=int,
+        help="Max commits to include (default: 50; no limit with --max-tokens)",
+    )
+    parser.add_argument(
+        "--max-tokens",
+        type=int,
+        help="Pack the prompt into this many (estimated) tokens, most informative "
+        "commits first; trivial and generated commits become one-line summaries",
+    )
+    parser.add_argument(
+        "--condense",
+        action="store_true",
+        help="Condense diffs first: drop the --stat preamble, distant context, "
+        "whitespace-only and repeated hunks; collapse generated files",
+    )
+    parser.add_argument(
+        "--context-lines",
+        type=int,
+        default=CONTEXT_LINES,
+        help=f"Context lines kept around changes with --condense (default: {CONTEXT_LINES})",
+    )
+    parser.add_argument(
+        "--metrics-format",
+        choices=METRICS_FORMATS,
+        default="json",
+        help="How to embed *_metrics.json: indented JSON, or a compact table "
+        "(about 10x fewer tokens, same information)",
+    )
+    parser.add_argument(
+        "--layout",
+        choices=LAYOUTS,
+        default="classic",
+        help="cached: static instructions first as a stable, cacheable prefix, "
+        "then data sorted by date and SHA",
     )
     parser.add_argument("--output", "-o", help="Output file (default: stdout)")
+    add_query_args(parser, "Build the prompt from the commits (and stored metrics) matching the filters below")
+    add_profile_args(parser)
 
     args = parser.parse_args()
-
-    prompt = generate_prompt(args.commits_file, args.lang, args.max_commits)
-
-    if args.output:
-        with open(args.output, "w", encoding="utf-8") as f:
-            f.write(prompt)
-        print(f"Prompt written to {args.output}", file=sys.stderr)
-    else:
-        print(prompt)
+    check_query_args(args, parser, bool(args.commits_file))
+
+    with profile_session(args, "generate_prompt"):
+        max_commits = args.max_commits
+        if max_commits is None and args.max_tokens is None:
+            max_commits = 50
+        options = dict(
+            condense=args.condense,
+            context_lines=args.context_lines,
+            metrics_format=args.metrics_format,
+            layout=args.layout,
+        )
+        try:
+            if args.commits_file:
+                prompt = generate_prompt(args.commits_file, args.lang, max_commits, args.max_tokens, **options)
+            else:
+                data, metrics = load_from_store(args)
+                prompt = build_prompt(data, metrics, args.lang, max_commits, args.max_tokens, **options)
+        except ValueError as e:
+            parser.error(str(e))
+
+        if args.layout == "cached":
+            prefix = prompt_prefix(args.lang)
+            print(
+                f"Prompt prefix: sha256:{prefix_hash(args.lang)} "
+                f"(~{estimate_tokens(prefix)} tokens, {len(prefix)} chars)",
+                file=sys.stderr,
+            )
+
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(prompt)
+            print(f"Prompt written to {args.output}", file=sys.stderr)
+        else:
+            print(prompt)
 
 
 if __name__ == "__main__":
@@ -5,8 +5,24 @@ Displays both playful corporate style and Linus-style comments together.
 """
 
 import argparse
+import html
+import io
 import json
-from datetime import datetime
+import os
+from dataclasses import dataclass, fields
+from datetime import date, datetime
+
+from history_store import (
+    HistoryStore,
+    Trends,
+    bucket_series,
+    default_history_path,
+    load_trends,
+    svg_histogram,
+    svg_sparkline,
+    text_sparkline,
+)
+from profiling import add_profile_args, count, profile_session, stage
 
 I18N = {
     "zh": {
@@ -48,6 +64,14 @@ I18N = {
         "team_future": "团队前景",
         "daily_roast": "🎤 今日金句",
         "closing_rant": "🎤 Linus 收尾",
+        "trends": "📈 趋势",
+        "team": "全队",
+        "vs_previous": "较上期",
+        "substance_sum": "实质分合计",
+        "avg_substance": "平均实质分",
+        "avg_bullshit": "平均水分",
+        "daily_substance": "每日实质分",
+        "substance_dist": "实质分分布",
         "disclaimer": "本报告由 AI 生成，仅供娱乐，严禁用于绩效评估。在 AI 时代，代码量不代表贡献，脑子才是。",
     },
     "en": {
@@ -89,173 +113,329 @@ I18N = {
         "team_future": "Team Future",
         "daily_roast": "🎤 Daily Roast",
         "closing_rant": "🎤 Linus Closing",
+        "trends": "📈 Trends",
+        "team": "Team",
+        "vs_previous": "vs previous",
+        "substance_sum": "Substance Total",
+        "avg_substance": "Avg Substance",
+        "avg_bullshit": "Avg Bullshit",
+        "daily_substance": "Daily Substance",
+        "substance_dist": "Substance Distribution",
         "disclaimer": "This report is AI-generated for entertainment only. Not for performance evaluation. In the AI era, code volume ≠ contribution. Brains matter.",
     },
 }
 
+QUALITY_EMOJI = {"good": "✨", "acceptable": "👍", "poor": "😐", "shit": "💩"}
+RANK_EMOJI = {1: "🥇", 2: "🥈", 3: "🥉"}
+FORMATS = {"markdown": ".md", "html": ".html", "json": ".json"}
+SUMMARY_FORMAT = "gca-report-summary/1"
+# Points per Markdown sparkline; longer windows are summed into buckets
+TREND_POINTS = 30
 
-def generate_markdown_report(analysis: dict, lang: str = "zh") -> str:
+
+@dataclass(slots=True)
+class LeaderEntry:
+    rank: object
+    name: str
+    grade: str
+    title: str
+    award: str
+    final_score: object
+    commits: object
+    effective_lines: object
+    badges: list
+    summary: str | None
+    linus_review: str | None
+    ai_survivor_score: object
+    ai_verdict: str | None
+    future_advice: str | None
+
+    @property
+    def rank_emoji(self) -> str:
+        return RANK_EMOJI.get(self.rank, "🏅")
+
+
+@dataclass(slots=True)
+class CommitEntry:
+    sha: str
+    author: str
+    code_quality: str
+    final_score: object
+    rewrite_index: object
+    business_value: object
+    complexity: object
+    impact: object
+    substance_score: object
+    bullshit_score: object
+    ai_could_write: object
+    roast: str | None
+    linus_says: str | None
+    badges: list
+
+    @property
+    def quality_emoji(self) -> str:
+        return QUALITY_EMOJI.get(self.code_quality, "📦")
+
+
+@dataclass
+class ReportModel:
+    """analysis.json with defaults and legacy fallbacks applied once; every
+    output format and language renders from this."""
+
+    report_date: str
+    team_vibe: str | None
+    linus_mood: str | None
+    team: dict
+    leaderboard: list[LeaderEntry]
+    commits: list[CommitEntry]
+    wall_of_shame: list
+    ai_era_verdict: dict
+    daily_roast: str | None
+    closing_rant: str | None
+    trends: Trends | None = None
+
+
+def report_authors(model: ReportModel) -> list[str]:
+    """Names the report covers: the leaderboard, else the commit authors."""
+    names = [e.name for e in model.leaderboard] or [c.author for c in model.commits]
+    return list(dict.fromkeys(names))
+
+
+def report_day(model: ReportModel) -> str:
+    try:
+        return date.fromisoformat(str(model.report_date)[:10]).isoformat()
+    except ValueError:
+        return date.today().isoformat()
+
+
+def _change(current: int, previous: int) -> str:
+    if not previous:
+        return "new" if current else "-"
+    return f"{(current - previous) / previous * 100:+.0f}%"
+
+
+def _markdown_trends(trends: Trends, t: dict) -> list[str]:
+    lines = [f"## {t['trends']} ({trends.since} ~ {trends.until})", ""]
+    lines.append(
+        f"| {t['name']} | {t['commits']} ({t['vs_previous']}) | {t['substance_sum']} | "
+        f"{t['avg_substance']} | {t['avg_bullshit']} | {t['daily_substance']} | "
+        f"{t['substance_dist']} |"
+    )
+    lines.append("|------|------|------|------|------|------|------|")
+    for i, trend in enumerate([trends.team, *trends.authors]):
+        name = f"**{t['team']}**" if i == 0 else trend.name
+        total = trend.total
+        change = _change(total.commits, trend.previous.commits)
+        series = bucket_series(trend.series("substance_sum"), TREND_POINTS)
+        lines.append(
+            f"| {name} | {total.commits} ({change}) | {total.substance_sum:.0f} | "
+            f"{total.avg_substance:.1f} | {total.avg_bullshit:.1f} | "
+            f"`{text_sparkline(series)}` | `{text_sparkline(total.substance_hist)}` |"
+        )
+    lines.append("")
+    return lines
+
+
+def build_report_model(analysis: dict) -> ReportModel:
+    with stage("report.model"):
+        team = analysis.get("team_summary", {})
+        if team:
+            team = {
+                "total_commits": team.get("total_commits", 0),
+                "real_work_score": team.get(
+                    "real_work_score", team.get("team_effort_score", 0)
+                ),
+                "bullshit_ratio": team.get("bullshit_ratio", "N/A"),
+                "team_grade": team.get("team_grade", "N/A"),
+                "mvp": team.get("mvp", "N/A"),
+                "daily_vibe": team.get("daily_vibe"),
+                "linus_says": team.get("linus_says"),
+            }
+        leaderboard = [
+            LeaderEntry(
+                rank=e.get("rank", "?"),
+                name=e.get("name", "Unknown"),
+                grade=e.get("grade", ""),
+                title=e.get("title", ""),
+                award=e.get("award", ""),
+                final_score=e.get("final_score", e.get("effort_score", 0)),
+                commits=e.get("commits", 0),
+                effective_lines=e.get("effective_lines", 0),
+                badges=e.get("badges", []),
+                summary=e.get("summary"),
+                linus_review=e.get("linus_review"),
+                ai_survivor_score=e.get("ai_survivor_score"),
+                ai_verdict=e.get("ai_verdict"),
+                future_advice=e.get("future_advice"),
+            )
+            for e in analysis.get("leaderboard", [])
+        ]
+        commits = [
+            CommitEntry(
+                sha=c.get("sha", "N/A")[:8],
+                author=c.get("author", "Unknown"),
+                code_quality=c.get("code_quality", ""),
+                final_score=c.get("final_score", c.get("effort_score", 0)),
+                rewrite_index=c.get("rewrite_index"),
+                business_value=c.get("business_value"),
+                complexity=c.get("complexity", ""),
+                impact=c.get("impact", ""),
+                substance_score=c.get("substance_score", 0),
+                bullshit_score=c.get("bullshit_score", 0),
+                ai_could_write=c.get("ai_could_write"),
+                roast=c.get("roast"),
+                linus_says=c.get("linus_says"),
+                badges=c.get("badges", []),
+            )
+            for c in analysis.get("commits", [])
+        ]
+        return ReportModel(
+            report_date=analysis.get(
+                "report_date", datetime.now().strftime("%Y-%m-%d")
+            ),
+            team_vibe=analysis.get("team_vibe"),
+            linus_mood=analysis.get("linus_mood"),
+            team=team,
+            leaderboard=leaderboard,
+            commits=commits,
+            wall_of_shame=analysis.get("wall_of_shame", []),
+            ai_era_verdict=analysis.get("ai_era_verdict", {}),
+            daily_roast=analysis.get("daily_roast"),
+            closing_rant=analysis.get("closing_rant"),
+        )
+
+
+def render_markdown(model: ReportModel, lang: str = "zh") -> str:
     t = I18N.get(lang, I18N["en"])
     lines = []
 
     lines.append(f"# {t['title']}")
     lines.append("")
-    lines.append(
-        f"**{t['date']}**: {analysis.get('report_date', datetime.now().strftime('%Y-%m-%d'))}"
-    )
-    if analysis.get("team_vibe"):
-        lines.append(f"**{t['team_vibe']}**: {analysis['team_vibe']}")
-    if analysis.get("linus_mood"):
-        lines.append(f"**{t['linus_mood']}**: {analysis['linus_mood']}")
+    lines.append(f"**{t['date']}**: {model.report_date}")
+    if model.team_vibe:
+        lines.append(f"**{t['team_vibe']}**: {model.team_vibe}")
+    if model.linus_mood:
+        lines.append(f"**{t['linus_mood']}**: {model.linus_mood}")
     lines.append("")
 
-    team = analysis.get("team_summary", {})
+    team = model.team
     if team:
         lines.append(f"## {t['team_summary']}")
         lines.append("")
-        lines.append(
-            f"| {'指标' if lang == 'zh' else 'Metric'} | {'数值' if lang == 'zh' else 'Value'} |"
-        )
+        metric, value = ("指标", "数值") if lang == "zh" else ("Metric", "Value")
+        lines.append(f"| {metric} | {value} |")
         lines.append("|------|------|")
-        lines.append(f"| {t['total_commits']} | {team.get('total_commits', 0)} |")
-        lines.append(
-            f"| {t['real_work_score']} | {team.get('real_work_score', team.get('team_effort_score', 0))} |"
-        )
-        lines.append(f"| {t['bullshit_ratio']} | {team.get('bullshit_ratio', 'N/A')} |")
-        lines.append(f"| {t['team_grade']} | {team.get('team_grade', 'N/A')} |")
-        lines.append(f"| {t['mvp']} | {team.get('mvp', 'N/A')} |")
+        for key in (
+            "total_commits",
+            "real_work_score",
+            "bullshit_ratio",
+            "team_grade",
+            "mvp",
+        ):
+            lines.append(f"| {t[key]} | {team[key]} |")
         lines.append("")
 
-        if team.get("daily_vibe"):
+        if team["daily_vibe"]:
             lines.append(f"> 💬 {team['daily_vibe']}")
             lines.append("")
-        if team.get("linus_says"):
+        if team["linus_says"]:
             lines.append(f'> 🔥 Linus: *"{team["linus_says"]}"*')
             lines.append("")
 
-    leaderboard = analysis.get("leaderboard", [])
-    if leaderboard:
+    if model.leaderboard:
         lines.append(f"## {t['leaderboard']}")
         lines.append("")
 
-        for entry in leaderboard:
-            rank = entry.get("rank", "?")
-            rank_emoji = {1: "🥇", 2: "🥈", 3: "🥉"}.get(rank, "🏅")
-
-            lines.append(f"### {rank_emoji} #{rank} {entry.get('name', 'Unknown')}")
+        for entry in model.leaderboard:
+            lines.append(f"### {entry.rank_emoji} #{entry.rank} {entry.name}")
             lines.append("")
 
-            grade = entry.get("grade", "")
-            title = entry.get("title", "")
-            award = entry.get("award", "")
-            score = entry.get("final_score", entry.get("effort_score", 0))
-
-            if title and award:
-                lines.append(f"**{grade}** | {title} | *{award}*")
-            elif title:
-                lines.append(f"**{grade}** | {title}")
+            if entry.title and entry.award:
+                lines.append(f"**{entry.grade}** | {entry.title} | *{entry.award}*")
+            elif entry.title:
+                lines.append(f"**{entry.grade}** | {entry.title}")
             else:
-                lines.append(f"**{grade}**")
+                lines.append(f"**{entry.grade}**")
             lines.append("")
             lines.append(
-                f"{t['score']}: **{score}** | {t['commits']}: {entry.get('commits', 0)} | {t['effective_lines']}: {entry.get('effective_lines', 0)}"
+                f"{t['score']}: **{entry.final_score}** | {t['commits']}: "
+                f"{entry.commits} | {t['effective_lines']}: {entry.effective_lines}"
             )
             lines.append("")
 
-            badges = entry.get("badges", [])
-            if badges:
-                lines.append(f"**{t['badges']}**: {' '.join(badges)}")
+            if entry.badges:
+                lines.append(f"**{t['badges']}**: {' '.join(entry.badges)}")
                 lines.append("")
 
-            if entry.get("summary"):
-                lines.append(f"> 💬 {entry['summary']}")
-            if entry.get("linus_review"):
-                lines.append(f'> 🔥 Linus: *"{entry["linus_review"]}"*')
+            if entry.summary:
+                lines.append(f"> 💬 {entry.summary}")
+            if entry.linus_review:
+                lines.append(f'> 🔥 Linus: *"{entry.linus_review}"*')
 
-            if entry.get("ai_survivor_score") is not None:
+            if entry.ai_survivor_score is not None:
                 lines.append("")
-                lines.append(
-                    f"**{t['ai_survivor']}**: {entry['ai_survivor_score']}/100"
-                )
-                if entry.get("ai_verdict"):
-                    lines.append(f"> 🤖 {entry['ai_verdict']}")
-                if entry.get("future_advice"):
-                    lines.append(f"> 💡 {entry['future_advice']}")
-
-            if (
-                entry.get("summary")
-                or entry.get("linus_review")
-                or entry.get("ai_survivor_score")
-            ):
+                lines.append(f"**{t['ai_survivor']}**: {entry.ai_survivor_score}/100")
+                if entry.ai_verdict:
+                    lines.append(f"> 🤖 {entry.ai_verdict}")
+                if entry.future_advice:
+                    lines.append(f"> 💡 {entry.future_advice}")
+
+            if entry.summary or entry.linus_review or entry.ai_survivor_score:
                 lines.append("")
 
-    commits = analysis.get("commits", [])
-    if commits:
+    if model.trends:
+        lines.extend(_markdown_trends(model.trends, t))
+
+    if model.commits:
         lines.append(f"## {t['commit_details']}")
         lines.append("")
 
-        for c in commits:
-            quality_emoji = {
-                "good": "✨",
-                "acceptable": "👍",
-                "poor": "😐",
-                "shit": "💩",
-            }.get(c.get("code_quality", ""), "📦")
-
-            lines.append(
-                f"### {quality_emoji} `{c.get('sha', 'N/A')[:8]}` - {c.get('author', 'Unknown')}"
-            )
+        for c in model.commits:
+            lines.append(f"### {c.quality_emoji} `{c.sha}` - {c.author}")
             lines.append("")
 
-            rewrite_idx = c.get("rewrite_index")
-            biz_value = c.get("business_value")
-
-            if rewrite_idx and biz_value:
+            if c.rewrite_index and c.business_value:
+                lines.append(
+                    f"{t['rewrite_index']}: {c.rewrite_index}/5 | "
+                    f"{t['business_value']}: {c.business_value} | "
+                    f"**{t['final']}: {c.final_score}**"
+                )
+            elif c.complexity and c.impact:
                 lines.append(
-                    f"{t['rewrite_index']}: {rewrite_idx}/5 | {t['business_value']}: {biz_value} | "
-                    f"**{t['final']}: {c.get('final_score', 0)}**"
+                    f"{t['complexity']}: {c.complexity}/5 | "
+                    f"{t['impact']}: {c.impact}/5 | **{t['final']}: {c.final_score}**"
                 )
             else:
-                complexity = c.get("complexity", "")
-                impact = c.get("impact", "")
-                if complexity and impact:
-                    lines.append(
-                        f"{t['complexity']}: {complexity}/5 | {t['impact']}: {impact}/5 | "
-                        f"**{t['final']}: {c.get('final_score', c.get('effort_score', 0))}**"
-                    )
-                else:
-                    lines.append(
-                        f"{t['substance']}: {c.get('substance_score', 0)} | "
-                        f"{t['bullshit']}: {c.get('bullshit_score', 0)} | "
-                        f"**{t['final']}: {c.get('final_score', 0)}**"
-                    )
+                lines.append(
+                    f"{t['substance']}: {c.substance_score} | "
+                    f"{t['bullshit']}: {c.bullshit_score} | "
+                    f"**{t['final']}: {c.final_score}**"
+                )
             lines.append("")
 
-            if c.get("ai_could_write"):
-                lines.append(f"> 🤖 {c['ai_could_write']}")
+            if c.ai_could_write:
+                lines.append(f"> 🤖 {c.ai_could_write}")
                 lines.append("")
 
-            if c.get("roast"):
-                lines.append(f"> 💬 {c['roast']}")
-            if c.get("linus_says"):
-                lines.append(f'> 🔥 Linus: *"{c["linus_says"]}"*')
-            if c.get("roast") or c.get("linus_says"):
+            if c.roast:
+                lines.append(f"> 💬 {c.roast}")
+            if c.linus_says:
+                lines.append(f'> 🔥 Linus: *"{c.linus_says}"*')
+            if c.roast or c.linus_says:
                 lines.append("")
 
-            badges = c.get("badges", [])
-            if badges:
-                lines.append(f"🏅 {' '.join(badges)}")
+            if c.badges:
+                lines.append(f"🏅 {' '.join(c.badges)}")
                 lines.append("")
 
-    wall = analysis.get("wall_of_shame", [])
-    if wall:
+    if model.wall_of_shame:
         lines.append(f"## {t['wall_of_shame']}")
         lines.append("")
-        for item in wall:
+        for item in model.wall_of_shame:
             lines.append(f"- {item}")
         lines.append("")
 
-    ai_verdict = analysis.get("ai_era_verdict", {})
+    ai_verdict = model.ai_era_verdict
     if ai_verdict:
         lines.append(f"## {t['ai_era_verdict']}")
         lines.append("")
@@ -263,33 +443,26 @@ def generate_markdown_report(analysis: dict, lang: str = "zh") -> str:
             lines.append(
                 f"**{t['ai_survivor']}**: {ai_verdict['team_ai_survivor_score']}/100"
             )
-        if ai_verdict.get("most_irreplaceable"):
-            lines.append(
-                f"**{t['most_irreplaceable']}**: {ai_verdict['most_irreplaceable']}"
-            )
-        if ai_verdict.get("most_replaceable"):
-            lines.append(
-                f"**{t['most_replaceable']}**: {ai_verdict['most_replaceable']}"
-            )
-        if ai_verdict.get("team_future"):
-            lines.append(f"**{t['team_future']}**: {ai_verdict['team_future']}")
+        for key in ("most_irreplaceable", "most_replaceable", "team_future"):
+            if ai_verdict.get(key):
+                lines.append(f"**{t[key]}**: {ai_verdict[key]}")
         lines.append("")
         if ai_verdict.get("linus_ai_rant"):
             lines.append(f'> 🔥 Linus: *"{ai_verdict["linus_ai_rant"]}"*')
             lines.append("")
 
-    if analysis.get("daily_roast"):
+    if model.daily_roast:
         lines.append("---")
         lines.append("")
         lines.append(f"## {t['daily_roast']}")
         lines.append("")
-        lines.append(f"*{analysis['daily_roast']}*")
+        lines.append(f"*{model.daily_roast}*")
         lines.append("")
 
-    if analysis.get("closing_rant"):
+    if model.closing_rant:
         lines.append(f"## {t['closing_rant']}")
         lines.append("")
-        lines.append(f"*{analysis['closing_rant']}*")
+        lines.append(f"*{model.closing_rant}*")
         lines.append("")
 
     lines.append("---")
@@ -299,80 +472,624 @@ def generate_markdown_report(analysis: dict, lang: str = "zh") -> str:
     return "\n".join(lines)
 
 
-def generate_html_report(analysis: dict, lang: str = "zh") -> str:
-    md_content = generate_markdown_report(analysis, lang)
+def _score_stats(values: list) -> dict | None:
+    numbers = [
+        v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)
+    ]
+    if not numbers:
+        return None
+    return {
+        "min": min(numbers),
+        "max": max(numbers),
+        "mean": round(sum(numbers) / len(numbers), 2),
+    }
+
+
+def render_summary(model: ReportModel) -> dict:
+    """Language-independent machine-readable digest for dashboards."""
+    by_author: dict[str, int] = {}
+    by_quality: dict[str, int] = {}
+    for c in model.commits:
+        by_author[c.author] = by_author.get(c.author, 0) + 1
+        if c.code_quality:
+            by_quality[c.code_quality] = by_quality.get(c.code_quality, 0) + 1
+    team = {
+        k: v for k, v in model.team.items() if k not in ("daily_vibe", "linus_says")
+    }
+    return {
+        "format": SUMMARY_FORMAT,
+        "report_date": model.report_date,
+        "team": team,
+        "leaderboard": [
+            {
+                "rank": e.rank,
+                "name": e.name,
+                "grade": e.grade,
+                "final_score": e.final_score,
+                "commits": e.commits,
+                "effective_lines": e.effective_lines,
+                "ai_survivor_score": e.ai_survivor_score,
+            }
+            for e in model.leaderboard
+        ],
+        "commits": {
+            "count": len(model.commits),
+            "by_author": by_author,
+            "by_quality": by_quality,
+            "final_score": _score_stats([c.final_score for c in model.commits]),
+        },
+        "team_ai_survivor_score": model.ai_era_verdict.get("team_ai_survivor_score"),
+        "wall_of_shame": len(model.wall_of_shame),
+        "trends": model.trends.to_dict() if model.trends else None,
+    }
+
+
+def generate_markdown_report(analysis: dict, lang: str = "zh") -> str:
+    return render_markdown(build_report_model(analysis), lang)
+
+
+# Commit details are embedded as JSON pages of positional rows (field order
+# below) and rendered client-side one page at a time
+HTML_PAGE_SIZE = 200
+HTML_RENDER_BATCH = 40
+COMMIT_FIELDS = tuple(f.name for f in fields(CommitEntry))
+
+HTML_STYLE = """
+body { font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, sans-serif;
+       max-width: 900px; margin: 0 auto; padding: 20px; line-height: 1.6; color: #333; }
+h1 { color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 10px; }
+h2 { color: #34495e; margin-top: 30px; }
+h3 { color: #7f8c8d; margin-bottom: 4px; }
+table { border-collapse: collapse; width: 100%; margin: 20px 0; }
+th, td { border: 1px solid #ddd; padding: 12px; text-align: left; }
+th { background: #f5f5f5; }
+blockquote { border-left: 4px solid #3498db; margin: 10px 0; padding: 10px 20px;
+             background: #f8f9fa; font-style: italic; }
+blockquote.linus { border-left-color: #e74c3c; }
+code { background: #f4f4f4; padding: 2px 6px; border-radius: 3px; }
+.card { border-bottom: 1px solid #eee; padding: 8px 0 12px; }
+.meta { color: #555; }
+.pager { display: flex; gap: 8px; align-items: center; margin: 12px 0; }
+.pager button { padding: 4px 12px; }
+td svg { vertical-align: middle; }
+"""
+
+# Pages are <script type="application/json" class="gca-page"> blocks; only the
+# current page is parsed, and its cards are appended in batches as the list
+# end scrolls into view, so DOM size stays bounded whatever the commit count.
+HTML_SCRIPT = """
+(function () {
+  var L = JSON.parse(document.getElementById("gca-labels").textContent);
+  var pages = document.querySelectorAll("script.gca-page");
+  var list = document.getElementById("gca-commits");
+  var status = document.getElementById("gca-page-status");
+  var prev = document.getElementById("gca-prev");
+  var next = document.getElementById("gca-next");
+  var current = -1, rows = [], shown = 0, observer = null;
+  var sentinel = document.createElement("div");
+
+  function esc(v) {
+    return String(v).replace(/[&<>"]/g, function (c) {
+      return {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"}[c];
+    });
+  }
+  function record(row) {
+    var c = {};
+    L.fields.forEach(function (f, i) { c[f] = row[i]; });
+    return c;
+  }
+  function card(c) {
+    var h = "<h3>" + (L.quality[c.code_quality] || "📦") + " <code>" +
+            esc(c.sha || "N/A") + "</code> - " + esc(c.author || "Unknown") +
+            "</h3><div class='meta'>";
+    var fin = "<b>" + esc(L.t.final) + ": " + esc(c.final_score || 0) + "</b>";
+    if (c.rewrite_index && c.business_value) {
+      h += esc(L.t.rewrite_index) + ": " + esc(c.rewrite_index) + "/5 | " +
+           esc(L.t.business_value) + ": " + esc(c.business_value) + " | " + fin;
+    } else if (c.complexity && c.impact) {
+      h += esc(L.t.complexity) + ": " + esc(c.complexity) + "/5 | " +
+           esc(L.t.impact) + ": " + esc(c.impact) + "/5 | " + fin;
+    } else {
+      h += esc(L.t.substance) + ": " + esc(c.substance_score || 0) + " | " +
+           esc(L.t.bullshit) + ": " + esc(c.bullshit_score || 0) + " | " + fin;
+    }
+    h += "</div>";
+    if (c.ai_could_write) {
+      h += "<blockquote>🤖 " + esc(c.ai_could_write) + "</blockquote>";
+    }
+    if (c.roast) h += "<blockquote>💬 " + esc(c.roast) + "</blockquote>";
+    if (c.linus_says) {
+      h += "<blockquote class='linus'>🔥 Linus: \\"" + esc(c.linus_says) +
+           "\\"</blockquote>";
+    }
+    if (c.badges && c.badges.length) {
+      h += "<div>🏅 " + esc(c.badges.join(" ")) + "</div>";
+    }
+    var div = document.createElement("div");
+    div.className = "card";
+    div.innerHTML = h;
+    return div;
+  }
+  function more() {
+    var end = Math.min(shown + L.batch, rows.length);
+    var frag = document.createDocumentFragment();
+    for (; shown < end; shown++) frag.appendChild(card(record(rows[shown])));
+    list.insertBefore(frag, sentinel);
+    if (shown >= rows.length && observer) observer.unobserve(sentinel);
+  }
+  function show(n) {
+    if (n < 0 || n >= pages.length || n === current) return;
+    current = n;
+    rows = JSON.parse(pages[n].textContent);
+    shown = 0;
+    list.textContent = "";
+    list.appendChild(sentinel);
+    status.textContent = (n + 1) + " / " + pages.length;
+    prev.disabled = n === 0;
+    next.disabled = n === pages.length - 1;
+    if (observer) {
+      more();
+      observer.observe(sentinel);
+    } else {
+      while (shown < rows.length) more();
+    }
+    if (location.hash !== "#page-" + (n + 1)) {
+      history.replaceState(null, "", "#page-" + (n + 1));
+    }
+  }
+  if ("IntersectionObserver" in window) {
+    observer = new IntersectionObserver(function (entries) {
+      if (entries[0].isIntersecting) more();
+    }, {rootMargin: "800px"});
+  }
+  prev.onclick = function () { show(current - 1); list.scrollIntoView(); };
+  next.onclick = function () { show(current + 1); list.scrollIntoView(); };
+  var m = /^#page-(\\d+)$/.exec(location.hash);
+  show(m ? Math.max(1, Math.min(parseInt(m[1], 10), pages.length)) - 1 : 0);
+})();
+"""
+
+
+def _esc(value) -> str:
+    return html.escape(str(value), quote=True)
+
+
+def _script_json(value) -> str:
+    """Compact JSON safe to embed in a <script> element."""
+    text = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return (
+        text.replace("<", "\\u003c")
+        .replace("\u2028", "\\u2028")
+        .replace("\u2029", "\\u2029")
+    )
+
+
+def _commit_row(c: CommitEntry) -> list:
+    row = [getattr(c, f) for f in COMMIT_FIELDS]
+    while row and row[-1] in (None, "", [], 0):
+        row.pop()
+    return row
+
+
+def _html_quote(text, linus: bool = False, icon: str = "💬") -> str:
+    if linus:
+        return f'<blockquote class="linus">🔥 Linus: "{_esc(text)}"</blockquote>\n'
+    return f"<blockquote>{icon} {_esc(text)}</blockquote>\n"
+
+
+def _html_header(model: ReportModel, t: dict, lang: str) -> str:
     html_lang = "zh-CN" if lang == "zh" else "en"
     title = "牛马鉴定报告" if lang == "zh" else "Code Commit Report"
+    parts = [
+        f'<!DOCTYPE html>\n<html lang="{html_lang}">\n<head>\n<meta charset="UTF-8">\n'
+        f'<meta name="viewport" content="width=device-width, initial-scale=1.0">\n'
+        f"<title>{title}</title>\n<style>{HTML_STYLE}</style>\n</head>\n<body>\n",
+        f"<h1>{_esc(t['title'])}</h1>\n",
+        f"<p><b>{t['date']}</b>: {_esc(model.report_date)}",
+    ]
+    if model.team_vibe:
+        parts.append(f"<br><b>{t['team_vibe']}</b>: {_esc(model.team_vibe)}")
+    if model.linus_mood:
+        parts.append(f"<br><b>{t['linus_mood']}</b>: {_esc(model.linus_mood)}")
+    parts.append("</p>\n")
+
+    team = model.team
+    if team:
+        parts.append(f"<h2>{t['team_summary']}</h2>\n<table>\n")
+        metric, value = ("指标", "数值") if lang == "zh" else ("Metric", "Value")
+        parts.append(f"<tr><th>{metric}</th><th>{value}</th></tr>\n")
+        parts.extend(
+            f"<tr><td>{t[key]}</td><td>{_esc(team[key])}</td></tr>\n"
+            for key in (
+                "total_commits",
+                "real_work_score",
+                "bullshit_ratio",
+                "team_grade",
+                "mvp",
+            )
+        )
+        parts.append("</table>\n")
+        if team["daily_vibe"]:
+            parts.append(_html_quote(team["daily_vibe"]))
+        if team["linus_says"]:
+            parts.append(_html_quote(team["linus_says"], linus=True))
+    return "".join(parts)
+
+
+def _html_leaderboard(leaderboard: list[LeaderEntry], t: dict) -> str:
+    parts = [f"<h2>{t['leaderboard']}</h2>\n"]
+    for entry in leaderboard:
+        head = [f"<b>{_esc(entry.grade)}</b>"]
+        if entry.title:
+            head.append(_esc(entry.title))
+            if entry.award:
+                head.append(f"<i>{_esc(entry.award)}</i>")
+        parts.append(
+            f"<h3>{entry.rank_emoji} #{_esc(entry.rank)} {_esc(entry.name)}</h3>\n"
+        )
+        parts.append(f"<p>{' | '.join(head)}<br>\n")
+        parts.append(
+            f"{t['score']}: <b>{_esc(entry.final_score)}</b> | "
+            f"{t['commits']}: {_esc(entry.commits)} | "
+            f"{t['effective_lines']}: {_esc(entry.effective_lines)}</p>\n"
+        )
+        if entry.badges:
+            parts.append(
+                f"<p><b>{t['badges']}</b>: {_esc(' '.join(entry.badges))}</p>\n"
+            )
+        if entry.summary:
+            parts.append(_html_quote(entry.summary))
+        if entry.linus_review:
+            parts.append(_html_quote(entry.linus_review, linus=True))
+        if entry.ai_survivor_score is not None:
+            score = _esc(entry.ai_survivor_score)
+            parts.append(f"<p><b>{t['ai_survivor']}</b>: {score}/100</p>\n")
+            if entry.ai_verdict:
+                parts.append(_html_quote(entry.ai_verdict, icon="🤖"))
+            if entry.future_advice:
+                parts.append(_html_quote(entry.future_advice, icon="💡"))
+    return "".join(parts)
+
+
+def _html_trends(trends: Trends, t: dict) -> str:
+    parts = [
+        f"<h2>{t['trends']} ({trends.since} ~ {trends.until})</h2>\n<table>\n",
+        f"<tr><th>{t['name']}</th><th>{t['commits']} ({t['vs_previous']})</th>"
+        f"<th>{t['substance_sum']}</th><th>{t['avg_substance']}</th>"
+        f"<th>{t['avg_bullshit']}</th><th>{t['daily_substance']}</th>"
+        f"<th>{t['substance_dist']}</th></tr>\n",
+    ]
+    for i, trend in enumerate([trends.team, *trends.authors]):
+        name = f"<b>{t['team']}</b>" if i == 0 else _esc(trend.name)
+        total = trend.total
+        change = _change(total.commits, trend.previous.commits)
+        parts.append(
+            f"<tr><td>{name}</td><td>{total.commits} ({change})</td>"
+            f"<td>{total.substance_sum:.0f}</td><td>{total.avg_substance:.1f}</td>"
+            f"<td>{total.avg_bullshit:.1f}</td>"
+            f"<td>{svg_sparkline(trend.series('substance_sum'))}</td>"
+            f"<td>{svg_histogram(total.substance_hist)}</td></tr>\n"
+        )
+    parts.append("</table>\n")
+    return "".join(parts)
+
+
+def _html_footer(model: ReportModel, t: dict) -> str:
+    parts = []
+    if model.wall_of_shame:
+        parts.append(f"<h2>{t['wall_of_shame']}</h2>\n<ul>\n")
+        parts.extend(f"<li>{_esc(item)}</li>\n" for item in model.wall_of_shame)
+        parts.append("</ul>\n")
+
+    ai_verdict = model.ai_era_verdict
+    if ai_verdict:
+        parts.append(f"<h2>{t['ai_era_verdict']}</h2>\n<p>")
+        lines = []
+        if ai_verdict.get("team_ai_survivor_score") is not None:
+            score = _esc(ai_verdict["team_ai_survivor_score"])
+            lines.append(f"<b>{t['ai_survivor']}</b>: {score}/100")
+        for key in ("most_irreplaceable", "most_replaceable", "team_future"):
+            if ai_verdict.get(key):
+                lines.append(f"<b>{t[key]}</b>: {_esc(ai_verdict[key])}")
+        parts.append("<br>\n".join(lines) + "</p>\n")
+        if ai_verdict.get("linus_ai_rant"):
+            parts.append(_html_quote(ai_verdict["linus_ai_rant"], linus=True))
+
+    if model.daily_roast:
+        parts.append(
+            f"<hr>\n<h2>{t['daily_roast']}</h2>\n"
+            f"<p><i>{_esc(model.daily_roast)}</i></p>\n"
+        )
+    if model.closing_rant:
+        parts.append(
+            f"<h2>{t['closing_rant']}</h2>\n<p><i>{_esc(model.closing_rant)}</i></p>\n"
+        )
+    parts.append(f"<hr>\n<p><i>{t['disclaimer']}</i></p>\n")
+    return "".join(parts)
+
+
+def write_html(
+    model: ReportModel, out, lang: str = "zh", page_size: int = HTML_PAGE_SIZE
+) -> int:
+    """
+    Stream the HTML report to the text file `out`; returns the number of
+    commit pages. Summary, leaderboard and closing sections are static HTML;
+    commit details follow as JSON pages written one page at a time.
+    """
+    t = I18N.get(lang, I18N["en"])
+    out.write(_html_header(model, t, lang))
+    if model.leaderboard:
+        out.write(_html_leaderboard(model.leaderboard, t))
+    if model.trends:
+        out.write(_html_trends(model.trends, t))
+
+    commits = model.commits
+    if commits:
+        out.write(
+            f"<h2>{t['commit_details']} ({len(commits)})</h2>\n"
+            '<div class="pager"><button id="gca-prev">&larr;</button>'
+            '<span id="gca-page-status"></span>'
+            '<button id="gca-next">&rarr;</button></div>\n'
+            '<div id="gca-commits">'
+            "<noscript>JavaScript is required for commit details.</noscript></div>\n"
+        )
+    out.write(_html_footer(model, t))
+
+    pages = 0
+    if commits:
+        labels = {
+            "fields": COMMIT_FIELDS,
+            "quality": QUALITY_EMOJI,
+            "batch": HTML_RENDER_BATCH,
+            "t": {
+                k: t[k]
+                for k in (
+                    "final",
+                    "rewrite_index",
+                    "business_value",
+                    "complexity",
+                    "impact",
+                    "substance",
+                    "bullshit",
+                )
+            },
+        }
+        out.write(
+            '<script type="application/json" id="gca-labels">'
+            f"{_script_json(labels)}</script>\n"
+        )
+        for start in range(0, len(commits), page_size):
+            page = [_commit_row(c) for c in commits[start : start + page_size]]
+            out.write(
+                '<script type="application/json" class="gca-page">'
+                f"{_script_json(page)}</script>\n"
+            )
+            pages += 1
+        out.write(f"<script>{HTML_SCRIPT}</script>\n")
+    out.write("</body>\n</html>\n")
+    count("report.html_pages", pages)
+    return pages
+
+
+def write_html_report(
+    analysis: dict, out, lang: str = "zh", page_size: int = HTML_PAGE_SIZE
+) -> int:
+    return write_html(build_report_model(analysis), out, lang, page_size)
 
-    return f'''<!DOCTYPE html>
-<html lang="{html_lang}">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{title}</title>
-    <style>
-        body {{
-            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, sans-serif;
-            max-width: 900px;
-            margin: 0 auto;
-            padding: 20px;
-            line-height: 1.6;
-            color: #333;
-        }}
-        h1 {{ color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 10px; }}
-        h2 {{ color: #34495e; margin-top: 30px; }}
-        h3 {{ color: #7f8c8d; }}
-        table {{ border-collapse: collapse; width: 100%; margin: 20px 0; }}
-        th, td {{ border: 1px solid #ddd; padding: 12px; text-align: left; }}
-        th {{ background: #f5f5f5; }}
-        blockquote {{
-            border-left: 4px solid #3498db;
-            margin: 10px 0;
-            padding: 10px 20px;
-            background: #f8f9fa;
-            font-style: italic;
-        }}
-        code {{ background: #f4f4f4; padding: 2px 6px; border-radius: 3px; }}
-    </style>
-</head>
-<body>
-    <pre style="white-space: pre-wrap;">{md_content}</pre>
-</body>
-</html>'''
+
+def generate_html_report(analysis: dict, lang: str = "zh") -> str:
+    buf = io.StringIO()
+    write_html_report(analysis, buf, lang)
+    return buf.getvalue()
+
+
+def output_path(
+    analysis_file: str,
+    fmt: str,
+    lang: str,
+    per_lang: bool,
+    output_dir: str | None = None,
+) -> str:
+    """<analysis>_report[.<lang>].md/.html, or <analysis>_summary.json."""
+    if fmt == "json":
+        suffix = "_summary.json"
+    else:
+        suffix = "_report" + (f".{lang}" if per_lang else "") + FORMATS[fmt]
+    path = (
+        analysis_file.replace(".json", suffix)
+        if analysis_file.endswith(".json")
+        else analysis_file + suffix
+    )
+    return os.path.join(output_dir, os.path.basename(path)) if output_dir else path
+
+
+def report_variants(
+    formats: list[str], langs: list[str]
+) -> list[tuple[str, str | None]]:
+    """(format, lang) pairs to write; the JSON summary is language-independent."""
+    variants = [
+        (fmt, None) if fmt == "json" else (fmt, lang)
+        for fmt in formats
+        for lang in langs
+    ]
+    return list(dict.fromkeys(variants))
+
+
+def emit_reports(
+    analysis_file: str,
+    formats: list[str],
+    langs: list[str],
+    output: str | None = None,
+    output_dir: str | None = None,
+    page_size: int = HTML_PAGE_SIZE,
+    trend_days: int | None = None,
+    history: str | None = None,
+    trend_source: str | None = None,
+) -> list[str]:
+    """
+    Load `analysis_file` once and write every format x language variant.
+    With trend_days, a trend section for the report's authors over that
+    many days up to the report date is read from the `history` store.
+    """
+    with stage("json.load"), open(analysis_file, "r", encoding="utf-8") as f:
+        analysis = json.load(f)
+    model = build_report_model(analysis)
+    del analysis
+    if trend_days:
+        attach_trends(model, trend_days, history, trend_source)
+    return write_reports(
+        model, analysis_file, formats, langs, output, output_dir, page_size
+    )
+
+
+def attach_trends(
+    model: ReportModel, days: int, history: str, source: str | None = None
+) -> None:
+    """Trend section for the report's authors over `days` days up to the report date."""
+    with HistoryStore(history) as store:
+        model.trends = load_trends(
+            store, days, report_day(model), report_authors(model), source
+        )
+
+
+def write_reports(
+    model: ReportModel,
+    analysis_file: str,
+    formats: list[str],
+    langs: list[str],
+    output: str | None = None,
+    output_dir: str | None = None,
+    page_size: int = HTML_PAGE_SIZE,
+) -> list[str]:
+    """
+    Write every format x language variant of `model`; paths derive from
+    `analysis_file`.
+    """
+    written = []
+    for fmt, lang in report_variants(formats, langs):
+        path = output or output_path(
+            analysis_file, fmt, lang, len(langs) > 1, output_dir
+        )
+        with stage(f"render.{fmt}") as st, open(path, "w", encoding="utf-8") as f:
+            if fmt == "html":
+                write_html(model, f, lang, page_size)
+            elif fmt == "json":
+                json.dump(render_summary(model), f, ensure_ascii=False, indent=2)
+            else:
+                f.write(render_markdown(model, lang))
+            st.add_bytes(f.tell())
+        written.append(path)
+    return written
 
 
 def main():
     parser = argparse.ArgumentParser(description="Generate report from analysis JSON")
-    parser.add_argument("analysis_file", help="Path to analysis.json (Claude output)")
     parser.add_argument(
-        "--format", "-f", choices=["markdown", "html"], default="markdown"
+        "analysis_file", nargs="+", help="Path(s) to analysis.json (Claude output)"
+    )
+    parser.add_argument(
+        "--format",
+        "-f",
+        choices=list(FORMATS),
+        action="append",
+        help="Output format; repeat for several (default: markdown). "
+        "json = machine-readable summary",
+    )
+    parser.add_argument(
+        "--lang",
+        "-l",
+        choices=["zh", "en"],
+        action="append",
+        help="Output language; repeat for both (default: zh)",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        help="Output file path (single input, format and language only)",
     )
     parser.add_argument(
-        "--lang", "-l", choices=["zh", "en"], default="zh", help="Output language"
+        "--output-dir",
+        help="Directory for generated files (default: next to each analysis file)",
     )
-    parser.add_argument("--output", "-o", help="Output file path")
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=HTML_PAGE_SIZE,
+        help=f"Commits per page in HTML commit details (default: {HTML_PAGE_SIZE})",
+    )
+    parser.add_argument(
+        "--trends",
+        type=int,
+        metavar="DAYS",
+        help="Add a trend section for the last DAYS days from the history store "
+        "(see analyze_code.py --history)",
+    )
+    parser.add_argument(
+        "--history",
+        metavar="PATH",
+        help="History store (default: $GCA_HISTORY or "
+        "~/.local/share/git-commit-analyzer/history.sqlite)",
+    )
+    parser.add_argument(
+        "--trend-source",
+        metavar="SOURCE",
+        help="Only rollups recorded for this commits source",
+    )
+    add_profile_args(parser)
 
     args = parser.parse_args()
+    formats = list(dict.fromkeys(args.format or ["markdown"]))
+    langs = list(dict.fromkeys(args.lang or ["zh"]))
+    if args.page_size < 1:
+        parser.error("--page-size must be at least 1")
+    if args.output and (
+        len(args.analysis_file) > 1
+        or len(formats) > 1
+        or (len(langs) > 1 and formats != ["json"])
+    ):
+        parser.error(
+            "--output writes a single file; use --output-dir for several formats, "
+            "languages or inputs"
+        )
+    if not args.output:
+        paths = [
+            output_path(a, fmt, lang, len(langs) > 1, args.output_dir)
+            for a in args.analysis_file
+            for fmt, lang in report_variants(formats, langs)
+        ]
+        clashes = sorted({p for p in paths if paths.count(p) > 1})
+        if clashes:
+            parser.error(
+                f"several inputs would write {clashes[0]}; give them distinct names "
+                "or drop --output-dir"
+            )
+    history = None
+    if args.trends is not None:
+        if args.trends < 1:
+            parser.error("--trends must be at least 1 day")
+        history = args.history or default_history_path()
+        if history is None or not os.path.exists(history):
+            parser.error(
+                f"--trends: no history store at {history}; "
+                "run analyze_code.py --history first"
+            )
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
 
-    with open(args.analysis_file, "r", encoding="utf-8") as f:
-        analysis = json.load(f)
-
-    if args.format == "html":
-        content = generate_html_report(analysis, args.lang)
-        ext = ".html"
-    else:
-        content = generate_markdown_report(analysis, args.lang)
-        ext = ".md"
-
-    if args.output:
-        output_path = args.output
-    else:
-        output_path = args.analysis_file.replace(".json", f"_report{ext}")
-
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(content)
-
-    print(f"Report generated: {output_path}")
+    with profile_session(args, "generate_report"):
+        for analysis_file in args.analysis_file:
+            for path in emit_reports(
+                analysis_file,
+                formats,
+                langs,
+                args.output,
+                args.output_dir,
+                args.page_size,
+                args.trends,
+                history,
+                args.trend_source,
+            ):
+                print(f"Report generated: {path}")
 
 
 if __name__ == "__main__":
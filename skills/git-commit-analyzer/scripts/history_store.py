@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Historical store of analyze_code.py results: one row per analyzed commit
+plus per-author, per-day rollups (counts, line totals, substance/bullshit
+sums and score histograms). Trend views over weeks or months are read
+from the rollups instead of re-fetching and re-analyzing history.
+
+Commits are keyed by (source, sha), so re-analyzing an overlapping window
+or rescoring replaces rows instead of double-counting them.
+
+Location: $GCA_HISTORY, else $XDG_DATA_HOME/git-commit-analyzer/history.sqlite.
+"""
+
+import json
+import os
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+
+from profiling import count, stage
+
+SCHEMA_VERSION = 1
+# Score histograms: HIST_BUCKETS equal buckets over 0-100
+HIST_BUCKETS = 10
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+_CHUNK = 500
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS commits ("
+    " source TEXT NOT NULL,"
+    " sha TEXT NOT NULL,"
+    " author TEXT NOT NULL,"
+    " day TEXT NOT NULL,"
+    " substance REAL NOT NULL,"
+    " bullshit REAL NOT NULL,"
+    " effective_lines INTEGER NOT NULL,"
+    " lines_added INTEGER NOT NULL,"
+    " lines_deleted INTEGER NOT NULL,"
+    " functions_added INTEGER NOT NULL,"
+    " PRIMARY KEY (source, sha))",
+    "CREATE TABLE IF NOT EXISTS rollups ("
+    " source TEXT NOT NULL,"
+    " author TEXT NOT NULL,"
+    " day TEXT NOT NULL,"
+    " commits INTEGER NOT NULL,"
+    " effective_lines INTEGER NOT NULL,"
+    " lines_added INTEGER NOT NULL,"
+    " lines_deleted INTEGER NOT NULL,"
+    " functions_added INTEGER NOT NULL,"
+    " substance_sum REAL NOT NULL,"
+    " bullshit_sum REAL NOT NULL,"
+    " substance_hist TEXT NOT NULL,"
+    " bullshit_hist TEXT NOT NULL,"
+    " PRIMARY KEY (source, author, day))",
+    "CREATE INDEX IF NOT EXISTS commits_author_day ON commits(source, author, day)",
+    "CREATE INDEX IF NOT EXISTS rollups_day ON rollups(day)",
+)
+
+
+def default_history_path() -> Path | None:
+    env = os.environ.get("GCA_HISTORY")
+    if env is not None:
+        return None if env.strip().lower() in ("", "0", "off", "none") else Path(env)
+    base = os.environ.get("XDG_DATA_HOME") or Path.home() / ".local" / "share"
+    return Path(base) / "git-commit-analyzer" / "history.sqlite"
+
+
+def _bucket(score: float) -> int:
+    return min(HIST_BUCKETS - 1, max(0, int(score * HIST_BUCKETS / 100)))
+
+
+@dataclass
+class Rollup:
+    """Totals for one author over one day (or any merged span)."""
+
+    commits: int = 0
+    effective_lines: int = 0
+    lines_added: int = 0
+    lines_deleted: int = 0
+    functions_added: int = 0
+    substance_sum: float = 0.0
+    bullshit_sum: float = 0.0
+    substance_hist: list[int] = field(default_factory=lambda: [0] * HIST_BUCKETS)
+    bullshit_hist: list[int] = field(default_factory=lambda: [0] * HIST_BUCKETS)
+
+    def merge(self, other: "Rollup") -> None:
+        self.commits += other.commits
+        self.effective_lines += other.effective_lines
+        self.lines_added += other.lines_added
+        self.lines_deleted += other.lines_deleted
+        self.functions_added += other.functions_added
+        self.substance_sum += other.substance_sum
+        self.bullshit_sum += other.bullshit_sum
+        self.substance_hist = [
+            a + b for a, b in zip(self.substance_hist, other.substance_hist)
+        ]
+        self.bullshit_hist = [
+            a + b for a, b in zip(self.bullshit_hist, other.bullshit_hist)
+        ]
+
+    @property
+    def avg_substance(self) -> float:
+        return self.substance_sum / self.commits if self.commits else 0.0
+
+    @property
+    def avg_bullshit(self) -> float:
+        return self.bullshit_sum / self.commits if self.commits else 0.0
+
+
+class HistoryStore:
+    """SQLite history; one connection per process (WAL for concurrent writers)."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self.conn.execute(statement)
+        self.conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES ('schema_version', ?)",
+            (str(SCHEMA_VERSION),),
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def record(
+        self, source: str, results: list[dict], days: dict[str, str] | None = None
+    ) -> int:
+        """
+        Store analyze_code.py results (the `commits` list of *_metrics.json)
+        for `source` and refresh the rollups they touch. `days` maps sha to
+        YYYY-MM-DD; results without a day (rescored metrics files) only
+        update commits already in the store. Returns the rows written.
+        """
+        days = days or {}
+        source = source or ""
+        with stage("history.record"):
+            rows = []
+            for r in results:
+                m = r["metrics"]
+                rows.append(
+                    (
+                        source,
+                        r["sha"],
+                        r.get("author", "Unknown"),
+                        days.get(r["sha"]),
+                        m.get("substance_score", 0.0),
+                        m.get("bullshit_score", 0.0),
+                        m.get("effective_lines_added", 0),
+                        m.get("lines_added", 0),
+                        m.get("lines_deleted", 0),
+                        m.get("functions_added", 0),
+                    )
+                )
+            dated = [row for row in rows if row[3]]
+            undated = [row for row in rows if not row[3]]
+            with self.conn:
+                touched = self._keys(source, [row[1] for row in rows])
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO commits (source, sha, author, day,"
+                    " substance, bullshit, effective_lines, lines_added,"
+                    " lines_deleted, functions_added)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    dated,
+                )
+                cursor = self.conn.executemany(
+                    "UPDATE commits SET author = ?, substance = ?, bullshit = ?,"
+                    " effective_lines = ?, lines_added = ?, lines_deleted = ?,"
+                    " functions_added = ?"
+                    " WHERE source = ? AND sha = ?",
+                    [(row[2], *row[4:], row[0], row[1]) for row in undated],
+                )
+                written = len(dated) + max(cursor.rowcount, 0)
+                touched |= self._keys(source, [row[1] for row in rows])
+                self._refresh(touched)
+        count("history.commits_recorded", written)
+        count("history.rollups_refreshed", len(touched))
+        return written
+
+    def _keys(self, source: str, shas: list[str]) -> set[tuple[str, str, str]]:
+        """(source, author, day) of stored commits among `shas`."""
+        keys = set()
+        for start in range(0, len(shas), _CHUNK):
+            chunk = shas[start : start + _CHUNK]
+            marks = ",".join("?" * len(chunk))
+            keys.update(
+                self.conn.execute(
+                    "SELECT source, author, day FROM commits"
+                    f" WHERE source = ? AND sha IN ({marks})",
+                    [source, *chunk],
+                ).fetchall()
+            )
+        return keys
+
+    def _refresh(self, keys: set[tuple[str, str, str]]) -> None:
+        for source, author, day in keys:
+            rollup = Rollup()
+            for sub, bs, eff, added, deleted, fns in self.conn.execute(
+                "SELECT substance, bullshit, effective_lines, lines_added,"
+                " lines_deleted, functions_added"
+                " FROM commits WHERE source = ? AND author = ? AND day = ?",
+                (source, author, day),
+            ):
+                rollup.merge(
+                    Rollup(
+                        1,
+                        eff,
+                        added,
+                        deleted,
+                        fns,
+                        sub,
+                        bs,
+                        _one_hot(sub),
+                        _one_hot(bs),
+                    )
+                )
+            if not rollup.commits:
+                self.conn.execute(
+                    "DELETE FROM rollups WHERE source = ? AND author = ? AND day = ?",
+                    (source, author, day),
+                )
+                continue
+            self.conn.execute(
+                "INSERT OR REPLACE INTO rollups"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    source,
+                    author,
+                    day,
+                    rollup.commits,
+                    rollup.effective_lines,
+                    rollup.lines_added,
+                    rollup.lines_deleted,
+                    rollup.functions_added,
+                    rollup.substance_sum,
+                    rollup.bullshit_sum,
+                    json.dumps(rollup.substance_hist),
+                    json.dumps(rollup.bullshit_hist),
+                ),
+            )
+
+    def rollups(
+        self,
+        since: str,
+        until: str,
+        authors: list[str] | None = None,
+        source: str | None = None,
+    ) -> dict[str, dict[str, Rollup]]:
+        """author -> day -> Rollup for days in [since, until], summed over sources."""
+        sql = (
+            "SELECT author, day, commits, effective_lines, lines_added,"
+            " lines_deleted, functions_added, substance_sum, bullshit_sum,"
+            " substance_hist, bullshit_hist"
+            " FROM rollups WHERE day BETWEEN ? AND ?"
+        )
+        params: list = [since, until]
+        if source is not None:
+            sql += " AND source = ?"
+            params.append(source)
+        if authors:
+            sql += f" AND author IN ({','.join('?' * len(authors))})"
+            params.extend(authors)
+        out: dict[str, dict[str, Rollup]] = {}
+        with stage("history.query"):
+            for author, day, *values in self.conn.execute(sql, params):
+                rollup = Rollup(
+                    *values[:7], json.loads(values[7]), json.loads(values[8])
+                )
+                days = out.setdefault(author, {})
+                if day in days:
+                    days[day].merge(rollup)
+                else:
+                    days[day] = rollup
+        return out
+
+
+def _one_hot(score: float) -> list[int]:
+    hist = [0] * HIST_BUCKETS
+    hist[_bucket(score)] = 1
+    return hist
+
+
+def commit_days(commits: list[dict]) -> dict[str, str]:
+    """
+    sha[:8] -> YYYY-MM-DD from fetch_commits.py records (git, GitHub and
+    GitLab dates).
+    """
+    return {c.get("sha", "")[:8]: c["date"][:10] for c in commits if c.get("date")}
+
+
+# ---------------------------------------------------------------------------
+# Trends
+
+
+@dataclass
+class AuthorTrend:
+    name: str
+    daily: list[Rollup]
+    total: Rollup
+    previous: Rollup
+
+    def series(self, metric: str) -> list[float]:
+        return [getattr(r, metric) for r in self.daily]
+
+
+@dataclass
+class Trends:
+    since: str
+    until: str
+    days: list[str]
+    team: AuthorTrend
+    authors: list[AuthorTrend]
+
+    def to_dict(self) -> dict:
+        def trend(t: AuthorTrend) -> dict:
+            return {
+                "name": t.name,
+                "commits": t.total.commits,
+                "effective_lines": t.total.effective_lines,
+                "substance_sum": round(t.total.substance_sum, 2),
+                "avg_substance": round(t.total.avg_substance, 2),
+                "avg_bullshit": round(t.total.avg_bullshit, 2),
+                "previous_commits": t.previous.commits,
+                "previous_avg_substance": round(t.previous.avg_substance, 2),
+                "substance_hist": t.total.substance_hist,
+                "bullshit_hist": t.total.bullshit_hist,
+                "daily_commits": t.series("commits"),
+                "daily_substance": [round(v, 2) for v in t.series("substance_sum")],
+            }
+
+        return {
+            "since": self.since,
+            "until": self.until,
+            "team": trend(self.team),
+            "authors": [trend(a) for a in self.authors],
+        }
+
+
+def _span(days: dict[str, Rollup], since: str, until: str) -> Rollup:
+    total = Rollup()
+    for day, rollup in days.items():
+        if since <= day <= until:
+            total.merge(rollup)
+    return total
+
+
+def load_trends(
+    store: HistoryStore,
+    days: int,
+    until: str | None = None,
+    authors: list[str] | None = None,
+    source: str | None = None,
+) -> Trends:
+    """
+    Daily series for the `days` days ending at `until` (default today),
+    plus totals for the window before it for comparison. Authors without
+    commits in either window are left out.
+    """
+    end = date.fromisoformat(until) if until else date.today()
+    start = end - timedelta(days=days - 1)
+    prev_start = start - timedelta(days=days)
+    window = [(start + timedelta(days=i)).isoformat() for i in range(days)]
+    prev_until = (start - timedelta(days=1)).isoformat()
+
+    data = store.rollups(prev_start.isoformat(), end.isoformat(), authors, source)
+    team_days: dict[str, Rollup] = {}
+    trends = []
+    for name in sorted(
+        data, key=lambda a: (-_span(data[a], window[0], window[-1]).substance_sum, a)
+    ):
+        by_day = data[name]
+        for day, rollup in by_day.items():
+            team_days.setdefault(day, Rollup()).merge(rollup)
+        trends.append(
+            AuthorTrend(
+                name=name,
+                daily=[by_day.get(d, Rollup()) for d in window],
+                total=_span(by_day, window[0], window[-1]),
+                previous=_span(by_day, prev_start.isoformat(), prev_until),
+            )
+        )
+    team = AuthorTrend(
+        name="team",
+        daily=[team_days.get(d, Rollup()) for d in window],
+        total=_span(team_days, window[0], window[-1]),
+        previous=_span(team_days, prev_start.isoformat(), prev_until),
+    )
+    return Trends(window[0], window[-1], window, team, trends)
+
+
+def text_sparkline(values: list[float]) -> str:
+    top = max(values, default=0)
+    if top <= 0:
+        return SPARK_CHARS[0] * len(values)
+    return "".join(
+        SPARK_CHARS[
+            min(len(SPARK_CHARS) - 1, int(v / top * (len(SPARK_CHARS) - 1) + 0.5))
+        ]
+        for v in values
+    )
+
+
+def bucket_series(values: list[float], points: int) -> list[float]:
+    """Sum consecutive values so the series has at most `points` entries."""
+    if len(values) <= points:
+        return values
+    size = -(-len(values) // points)
+    return [sum(values[i : i + size]) for i in range(0, len(values), size)]
+
+
+def svg_sparkline(
+    values: list[float], width: int = 160, height: int = 28, color: str = "#3498db"
+) -> str:
+    """Inline SVG polyline, scaled to the series maximum."""
+    top = max(values, default=0) or 1
+    n = max(len(values) - 1, 1)
+    points = " ".join(
+        f"{i * width / n:.1f},{height - 2 - v / top * (height - 4):.1f}"
+        for i, v in enumerate(values)
+    )
+    return (
+        f'<svg class="spark" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" xmlns="http://www.w3.org/2000/svg">'
+        f'<polyline fill="none" stroke="{color}" '
+        f'stroke-width="1.5" points="{points}"/></svg>'
+    )
+
+
+def svg_histogram(
+    counts: list[int], width: int = 80, height: int = 28, color: str = "#95a5a6"
+) -> str:
+    """Inline SVG bar chart, one bar per bucket."""
+    top = max(counts, default=0) or 1
+    bar = width / max(len(counts), 1)
+    bars = "".join(
+        f'<rect x="{i * bar:.1f}" y="{height - c / top * height:.1f}" '
+        f'width="{bar - 1:.1f}" height="{c / top * height:.1f}"/>'
+        for i, c in enumerate(counts)
+        if c
+    )
+    return (
+        f'<svg class="hist" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" xmlns="http://www.w3.org/2000/svg" '
+        f'fill="{color}">{bars}</svg>'
+    )
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Compact tabular encoding of *_metrics.json for prompts.
+
+The indented JSON repeats every key, zero and empty list for every commit
+and copies each warning sentence once per occurrence. The table keeps the
+same information in a fraction of the tokens:
+
+    [commits] sha|author|msg|sub|bs|+|-|...      header row, then one row per
+                                                  commit; empty cell = 0/false/empty
+    flags column                                  letters for the is_* flags
+    W3;W1  S2;S5                                  warnings / code smells by code
+    [authors] name|commits|sub|bs|...|warn        per-author rollups, W1*4 = 4 times
+    [summary] / [scoring] / [source]              key=value
+    [legend]  W1=... S1=...                       each text once
+
+Columns only appear when some commit has a non-default value in them.
+"""
+
+import json
+
+from profiling import stage
+
+FORMAT = "gca-metrics-table/1"
+FLOAT_DIGITS = 2
+
+# Metric keys in column order, with their short names
+COLUMNS = {
+    "substance_score": "sub",
+    "bullshit_score": "bs",
+    "lines_added": "+",
+    "lines_deleted": "-",
+    "files_changed": "files",
+    "effective_lines_added": "eff+",
+    "effective_lines_deleted": "eff-",
+    "functions_added": "fn+",
+    "functions_modified": "fn~",
+    "classes_added": "cls+",
+    "test_lines_added": "test+",
+    "doc_lines_added": "doc+",
+    "ast_grep_issues": "ast",
+    "ast_grep_bullshit": "ast_bs",
+    "ast_files_skipped": "ast_skip",
+    "ast_issues_by_rule": "rules",
+    "ast_bullshit_by_rule": "rule_bs",
+    "code_smells": "smells",
+    "warnings": "warn",
+    "approximate_files": "approx_files",
+}
+# Boolean metrics folded into the `flags` column
+FLAGS = {
+    "is_formatting_only": "F",
+    "is_rename_only": "R",
+    "is_auto_generated": "G",
+    "is_likely_copypaste": "C",
+    "is_trivial": "T",
+    "is_approximate": "A",
+}
+AUTHOR_COLUMNS = {
+    "commits": "commits",
+    "total_substance": "sub",
+    "total_bullshit": "bs",
+    "avg_substance": "avg_sub",
+    "avg_bullshit": "avg_bs",
+    "effective_lines": "eff",
+    "functions_added": "fn+",
+    "warnings": "warn",
+}
+
+LEGEND_ZH = f"""以下指标为紧凑表格（{FORMAT}）：`[commits]` 首行是列名，之后每行一个 commit，列以 `|` 分隔，
+空单元格表示 0 / false / 空。列名：msg=提交说明首行，sub=substance_score，bs=bullshit_score，+/-=增删行数，
+files=改动文件数，eff+/eff-=有效增删行，fn+/fn~=新增/修改函数，cls+=新增类，test+/doc+=测试/文档行，
+ast/ast_bs=AST 问题数/水分，ast_skip=超时或超预算未做 AST 扫描的文件数，rules=各规则命中数，rule_bs=各规则水分，
+approx_files=按采样近似计算的文件，flags=下列布尔标志的字母。
+flags 字母：F=仅格式化，R=仅重命名，G=自动生成，C=疑似复制粘贴，T=琐碎提交，A=近似值（大 diff 采样）。
+warn / smells 列是 `[legend]` 中 W* / S* 编号，`;` 分隔；`[authors]` 中 `W1*4` 表示该警告出现 4 次。
+"""
+
+LEGEND_EN = f"""Metrics below use a compact table ({FORMAT}): in `[commits]` the first row names the columns, then one
+row per commit, cells separated by `|`; an empty cell means 0 / false / empty. Columns: msg=first line of the
+commit message, sub=substance_score, bs=bullshit_score, +/-=lines added/deleted, files=files changed,
+eff+/eff-=effective lines, fn+/fn~=functions added/modified, cls+=classes added, test+/doc+=test/doc lines,
+ast/ast_bs=AST issues/bullshit, ast_skip=files left unscanned by a timeout or the scan budget, rules=hits per rule,
+rule_bs=bullshit per rule, approx_files=files measured from a sample, flags=letters of the flags below.
+flags letters: F=formatting only, R=rename only, G=auto-generated, C=likely copy-paste, T=trivial,
+A=approximate (sampled large diff). warn / smells cells hold W* / S* codes from `[legend]`, `;`-separated;
+in `[authors]`, `W1*4` means that warning occurred 4 times.
+"""
+
+
+def _default(value) -> bool:
+    return value in (0, False, None, "", [], {})
+
+
+def _number(value) -> str:
+    if isinstance(value, float):
+        value = round(value, FLOAT_DIGITS)
+        if value.is_integer():
+            value = int(value)
+    return str(value)
+
+
+def _cell(value) -> str:
+    if isinstance(value, str):
+        text = value
+    elif isinstance(value, (int, float)):
+        text = _number(value)
+    else:
+        text = json.dumps(value, ensure_ascii=False)
+    # Quote cells that would break the row; JSON strings are unambiguous
+    if any(c in text for c in "|;\n") or text != text.strip():
+        return json.dumps(text, ensure_ascii=False)
+    return text
+
+
+class MetricsTable:
+    """Encoder for one metrics file; render() any subset of its commits."""
+
+    def __init__(self, metrics: dict):
+        self.metrics = metrics
+        self.commits = metrics.get("commits", [])
+        self._codes: dict[str, dict[str, str]] = {"W": {}, "S": {}}
+        rows = [r["metrics"] for r in self.commits]
+        extra = sorted(
+            {k for m in rows for k, v in m.items() if k not in COLUMNS and k not in FLAGS and not _default(v)}
+        )
+        self.columns = [k for k in COLUMNS if any(not _default(m.get(k)) for m in rows)] + extra
+        self.has_flags = any(m.get(flag) for m in rows for flag in FLAGS)
+        self._rows = {r["sha"]: self._row(r) for r in self.commits}
+
+    def _code(self, kind: str, text: str) -> str:
+        codes = self._codes[kind]
+        if text not in codes:
+            codes[text] = f"{kind}{len(codes) + 1}"
+        return codes[text]
+
+    def _value(self, key: str, value) -> str:
+        if _default(value):
+            return ""
+        if key == "warnings":
+            return ";".join(self._code("W", w) for w in value)
+        if key == "code_smells":
+            return ";".join(self._code("S", s) for s in value)
+        if isinstance(value, dict):
+            return ";".join(f"{_cell(k)}:{_number(v)}" for k, v in value.items())
+        if isinstance(value, list):
+            return ";".join(_cell(v) for v in value)
+        return _cell(value)
+
+    def _row(self, record: dict) -> str:
+        m = record["metrics"]
+        cells = [record["sha"], _cell(record.get("author", "")), _cell(record.get("message", "").split("\n", 1)[0])]
+        cells += [self._value(k, m.get(k)) for k in self.columns]
+        if self.has_flags:
+            cells.append("".join(letter for flag, letter in FLAGS.items() if m.get(flag)))
+        return "|".join(cells)
+
+    def row(self, sha: str) -> str:
+        return self._rows[sha]
+
+    def header(self) -> str:
+        names = ["sha", "author", "msg"] + [COLUMNS.get(k, k) for k in self.columns]
+        return "|".join(names + (["flags"] if self.has_flags else []))
+
+    def _authors(self) -> list[str]:
+        by_author = self.metrics.get("by_author", {})
+        if not by_author:
+            return []
+        keys = [k for k in AUTHOR_COLUMNS if any(k in a for a in by_author.values())]
+        lines = ["[authors]", "|".join(["name"] + [AUTHOR_COLUMNS[k] for k in keys])]
+        for name, data in by_author.items():
+            cells = [_cell(name)]
+            for k in keys:
+                value = data.get(k)
+                if k == "warnings":
+                    counts: dict[str, int] = {}
+                    for w in value or []:
+                        code = self._code("W", w)
+                        counts[code] = counts.get(code, 0) + 1
+                    cells.append(";".join(f"{c}*{n}" if n > 1 else c for c, n in counts.items()))
+                else:
+                    cells.append("" if _default(value) else _cell(value))
+            lines.append("|".join(cells))
+        return lines
+
+    def render(self, shas: list[str] | None = None) -> str:
+        """The table for `shas` (all commits when None), rollups and legend."""
+        with stage("metrics.table"):
+            keep = None if shas is None else set(shas)
+            rows = [self._rows[r["sha"]] for r in self.commits if keep is None or r["sha"] in keep]
+            lines = [f"[commits] {len(rows)}/{len(self.commits)}", self.header(), *rows]
+            lines += self._authors()
+            for section in ("summary", "scoring"):
+                values = self.metrics.get(section)
+                if values:
+                    lines.append(f"[{section}] " + " ".join(f"{k}={_cell(v)}" for k, v in values.items()))
+            source = [
+                f"{k}={_cell(v if isinstance(v, str) else json.dumps(v, ensure_ascii=False))}"
+                for k, v in self.metrics.items()
+                if k in ("source", "period") and v
+            ]
+            if source:
+                lines.append("[source] " + " ".join(source))
+            # Only texts the rendered rows and rollups refer to
+            text = "\n".join(lines)
+            legend = [
+                f"{code}={value}"
+                for kind in ("W", "S")
+                for value, code in self._codes[kind].items()
+                if _mentions(text, code)
+            ]
+            if legend:
+                lines += ["[legend]", *legend]
+            return "\n".join(lines)
+
+
+def _mentions(text: str, code: str) -> bool:
+    """Whether `code` (W12) occurs in `text` as a whole code, not inside W123."""
+    start = 0
+    while True:
+        pos = text.find(code, start)
+        if pos < 0:
+            return False
+        end = pos + len(code)
+        before = text[pos - 1] if pos else ""
+        after = text[end] if end < len(text) else ""
+        if not before.isalnum() and not after.isdigit():
+            return True
+        start = end
+
+
+def encode_metrics(metrics: dict, shas: list[str] | None = None, lang: str = "zh") -> str:
+    """Format explanation plus the table, ready for the prompt's metrics slot."""
+    return (LEGEND_ZH if lang == "zh" else LEGEND_EN) + "\n" + MetricsTable(metrics).render(shas)
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+fetch → analyze → prompt → model → report in one process.
+
+Commits, metrics, the prompt and the model's analysis are passed between
+stages in memory; nothing is written except the reports, unless
+--save-intermediate DIR asks for commits.json, commits_metrics.json,
+prompt.txt and analysis.json (the files the single-stage scripts read).
+
+Without --backend the pipeline stops after the prompt, printed to stdout
+(or --prompt-output) for whoever answers it; render the answer with
+generate_report.py.
+
+    python pipeline.py ~/repo --since "1 day ago" -b anthropic -f markdown -f html
+    python pipeline.py --github owner/repo --since "1 week ago" > prompt.txt
+"""
+
+import argparse
+import json
+import os
+import sys
+from contextlib import redirect_stdout
+
+from analyze_code import analyze_data, record_history, store_results
+from fetch_commits import fetch
+from generate_prompt import CONTEXT_LINES, LAYOUTS, METRICS_FORMATS, build_prompt
+from generate_report import (
+    FORMATS,
+    HTML_PAGE_SIZE,
+    attach_trends,
+    build_report_model,
+    write_reports,
+)
+from history_store import commit_days, default_history_path
+from profiling import add_profile_args, profile_session, stage
+from run_model import ModelError, add_model_args, runner_from_args
+from scoring import ScoringConfig
+
+
+def _save(directory: str | None, name: str, content) -> None:
+    if not directory:
+        return
+    path = os.path.join(directory, name)
+    with stage("json.dump"), open(path, "w", encoding="utf-8") as f:
+        if isinstance(content, str):
+            f.write(content)
+        else:
+            json.dump(content, f, indent=2, ensure_ascii=False)
+    print(f"Saved {path}", file=sys.stderr)
+
+
+def run(args) -> None:
+    # Backend problems (missing model name) surface before any work is done
+    runner = runner_from_args(args) if args.backend else None
+    save = args.save_intermediate
+    if save:
+        os.makedirs(save, exist_ok=True)
+
+    # Stage chatter goes to stderr so stdout carries only the prompt
+    with redirect_stdout(sys.stderr):
+        if args.commits:
+            with stage("json.load"), open(args.commits, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        else:
+            with stage("pipeline.fetch"):
+                data = fetch(
+                    args.repo_path, args.github, args.gitlab, args.since, args.until
+                )
+            _save(save, "commits.json", data)
+        print(f"Commits: {len(data.get('commits', []))}")
+
+        scoring_config = (
+            ScoringConfig.load(args.scoring_config) if args.scoring_config else None
+        )
+        with stage("pipeline.analyze"):
+            metrics = analyze_data(data, scoring_config)
+        _save(save, "commits_metrics.json", metrics)
+        store_results(args, data, metrics)
+        record_history(
+            args,
+            data.get("source"),
+            metrics["commits"],
+            commit_days(data.get("commits", [])),
+        )
+
+        max_commits = args.max_commits
+        if max_commits is None and args.max_tokens is None:
+            max_commits = 50
+        with stage("pipeline.prompt"):
+            prompt = build_prompt(
+                data,
+                metrics,
+                args.lang,
+                max_commits,
+                args.max_tokens,
+                condense=args.condense,
+                context_lines=args.context_lines,
+                metrics_format=args.metrics_format,
+                layout=args.layout,
+            )
+        del data, metrics
+        _save(save, "prompt.txt", prompt)
+
+    if runner is None:
+        if args.prompt_output:
+            with open(args.prompt_output, "w", encoding="utf-8") as f:
+                f.write(prompt)
+            print(f"Prompt written to {args.prompt_output}", file=sys.stderr)
+        else:
+            print(prompt)
+        return
+
+    with stage("pipeline.model"):
+        analysis = runner.run(prompt, "prompt")
+    _save(save, "analysis.json", analysis)
+
+    model = build_report_model(analysis)
+    del analysis
+    if args.trends:
+        attach_trends(
+            model,
+            args.trends,
+            args.history or default_history_path(),
+            args.trend_source,
+        )
+    formats = list(dict.fromkeys(args.format or ["markdown"]))
+    langs = list(dict.fromkeys(args.report_lang or [args.lang]))
+    os.makedirs(args.output_dir, exist_ok=True)
+    base = os.path.join(args.output_dir, "analysis.json")
+    for path in write_reports(model, base, formats, langs, page_size=args.page_size):
+        print(f"Report generated: {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fetch, analyze, prompt, run the model and report in one go"
+    )
+    source = parser.add_argument_group("commits")
+    source.add_argument("repo_path", nargs="?", help="Local repository path")
+    source.add_argument("--github", help="GitHub repository (owner/repo)")
+    source.add_argument("--gitlab", help="GitLab project ID or path")
+    source.add_argument(
+        "--commits",
+        metavar="FILE",
+        help="Start from an existing commits.json instead of fetching",
+    )
+    source.add_argument(
+        "--since", help="Fetch commits since (e.g., '1 day ago', '2024-01-01')"
+    )
+    source.add_argument("--until", help="Fetch commits until (optional)")
+
+    analysis = parser.add_argument_group("analysis")
+    analysis.add_argument(
+        "--scoring-config", help="JSON file overriding scoring weights (see scoring.py)"
+    )
+    analysis.add_argument(
+        "--history",
+        nargs="?",
+        const="",
+        metavar="PATH",
+        help="Append daily rollups to the history store "
+        "(see analyze_code.py --history)",
+    )
+    analysis.add_argument(
+        "--store",
+        nargs="?",
+        const="",
+        metavar="PATH",
+        help="Save commits and metrics to the SQLite commit store "
+        "(see commit_store.py)",
+    )
+
+    prompt = parser.add_argument_group("prompt")
+    prompt.add_argument(
+        "--lang",
+        "-l",
+        choices=["zh", "en"],
+        default="zh",
+        help="Prompt and report language",
+    )
+    prompt.add_argument(
+        "--max-commits",
+        type=int,
+        help="Max commits to include (default: 50; no limit with --max-tokens)",
+    )
+    prompt.add_argument(
+        "--max-tokens",
+        type=int,
+        help="Pack the prompt into this many (estimated) tokens",
+    )
+    prompt.add_argument(
+        "--condense",
+        action="store_true",
+        help="Condense diffs first (see condense_diff.py)",
+    )
+    prompt.add_argument(
+        "--context-lines",
+        type=int,
+        default=CONTEXT_LINES,
+        help="Context lines kept with --condense",
+    )
+    prompt.add_argument("--metrics-format", choices=METRICS_FORMATS, default="json")
+    prompt.add_argument("--layout", choices=LAYOUTS, default="classic")
+    prompt.add_argument(
+        "--prompt-output",
+        metavar="PATH",
+        help="Without --backend: write the prompt here instead of stdout",
+    )
+
+    model = parser.add_argument_group("model (omit --backend to stop after the prompt)")
+    add_model_args(model, backend_default=None)
+
+    report = parser.add_argument_group("report")
+    report.add_argument(
+        "--format",
+        "-f",
+        choices=list(FORMATS),
+        action="append",
+        help="Repeatable (default: markdown)",
+    )
+    report.add_argument(
+        "--report-lang",
+        choices=["zh", "en"],
+        action="append",
+        help="Repeatable (default: --lang)",
+    )
+    report.add_argument(
+        "--output-dir", default=".", help="Directory for the reports (default: .)"
+    )
+    report.add_argument(
+        "--page-size", type=int, default=HTML_PAGE_SIZE, help="Commits per HTML page"
+    )
+    report.add_argument(
+        "--trends",
+        type=int,
+        metavar="DAYS",
+        help="Trend section from the history store",
+    )
+    report.add_argument(
+        "--trend-source", metavar="SOURCE", help="Only rollups recorded for this source"
+    )
+
+    parser.add_argument(
+        "--save-intermediate",
+        metavar="DIR",
+        help="Also write commits.json, commits_metrics.json, prompt.txt and "
+        "analysis.json to DIR",
+    )
+    add_profile_args(parser)
+
+    args = parser.parse_args()
+    if not args.commits and not (args.repo_path or args.github or args.gitlab):
+        parser.error("Must specify repo_path, --github, --gitlab or --commits")
+    if not args.commits and not args.since:
+        parser.error("--since is required unless --commits is given")
+    if args.page_size < 1:
+        parser.error("--page-size must be at least 1")
+    if args.trends is not None:
+        history = args.history or default_history_path()
+        if args.trends < 1 or history is None:
+            parser.error("--trends needs a positive day count and a history store")
+        if args.history is None and not os.path.exists(history):
+            parser.error(
+                f"--trends: no history store at {history}; add --history or run "
+                "analyze_code.py --history first"
+            )
+
+    with profile_session(args, "pipeline"):
+        try:
+            run(args)
+        except (ModelError, ValueError) as e:
+            print(f"❌ {e}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
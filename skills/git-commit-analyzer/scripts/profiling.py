@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Lightweight stage/detector profiler shared by all pipeline scripts.
+Records wall time, CPU time, call counts and bytes per named stage.
+
+Disabled by default: stage() then returns a shared no-op context,
+so instrumentation can stay in the hot paths permanently.
+"""
+
+import cProfile
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+
+class StageStats:
+    __slots__ = ("calls", "wall", "cpu", "bytes", "max_wall")
+
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.bytes = 0
+        self.max_wall = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "wall_s": round(self.wall, 6),
+            "cpu_s": round(self.cpu, 6),
+            "bytes": self.bytes,
+            "avg_wall_ms": round(self.wall / self.calls * 1000, 3) if self.calls else 0,
+            "max_wall_ms": round(self.max_wall * 1000, 3),
+        }
+
+
+class _NullStage:
+    """Returned by stage() while profiling is off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_bytes(self, n: int) -> None:
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("profiler", "name", "nbytes", "t0", "c0")
+
+    def __init__(self, profiler: "Profiler", name: str, nbytes: int):
+        self.profiler = profiler
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        self.c0 = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.t0
+        cpu = time.process_time() - self.c0
+        self.profiler._record(self.name, wall, cpu, self.nbytes)
+        return False
+
+    def add_bytes(self, n: int) -> None:
+        self.nbytes += n
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.stages: dict[str, StageStats] = {}
+        self.counters: dict[str, float] = {}
+        self._started_wall = time.perf_counter()
+        self._started_cpu = time.process_time()
+        self._started_at = datetime.now().isoformat()
+
+    def stage(self, name: str, nbytes: int = 0):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, nbytes)
+
+    def count(self, name: str, n: float = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def _record(self, name: str, wall: float, cpu: float, nbytes: int) -> None:
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats()
+            stats.calls += 1
+            stats.wall += wall
+            stats.cpu += cpu
+            stats.bytes += nbytes
+            if wall > stats.max_wall:
+                stats.max_wall = wall
+
+    @contextmanager
+    def activate(self):
+        """Enable profiling for a block; a no-op if already enabled."""
+        if self.enabled:
+            yield self
+            return
+        self.reset()
+        self.enabled = True
+        try:
+            yield self
+        finally:
+            self.enabled = False
+
+    def report(self) -> dict:
+        return {
+            "started_at": self._started_at,
+            "total_wall_s": round(time.perf_counter() - self._started_wall, 6),
+            "total_cpu_s": round(time.process_time() - self._started_cpu, 6),
+            "stages": {
+                name: s.to_dict()
+                for name, s in sorted(self.stages.items(), key=lambda kv: -kv[1].wall)
+            },
+            "counters": dict(sorted(self.counters.items())),
+            "hit_rates": self.hit_rates(),
+        }
+
+    def hit_rates(self) -> dict[str, float]:
+        """hits / (hits + misses) for every `<name>.hits`/`<name>.misses` pair."""
+        rates = {}
+        for key, hits in self.counters.items():
+            if not key.endswith(".hits"):
+                continue
+            name = key[: -len(".hits")]
+            total = hits + self.counters.get(f"{name}.misses", 0)
+            if total:
+                rates[name] = round(hits / total, 4)
+        return dict(sorted(rates.items()))
+
+
+PROFILER = Profiler()
+
+
+def stage(name: str, nbytes: int = 0):
+    """Time a block under `name` on the global profiler."""
+    return PROFILER.stage(name, nbytes)
+
+
+def count(name: str, n: float = 1) -> None:
+    PROFILER.count(name, n)
+
+
+def profiled(name: str):
+    """Decorator form of stage() for whole functions."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            with _Stage(PROFILER, name, 0):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def add_profile_args(parser) -> None:
+    parser.add_argument(
+        "--profile", metavar="PATH", help="Write a JSON timing report to PATH"
+    )
+    parser.add_argument(
+        "--cprofile", metavar="PATH", help="Also dump cProfile stats to PATH"
+    )
+
+
+@contextmanager
+def profile_session(args, script: str):
+    """Wrap a script's main body according to --profile/--cprofile."""
+    report_path = getattr(args, "profile", None)
+    cprofile_path = getattr(args, "cprofile", None)
+    if not report_path and not cprofile_path:
+        yield
+        return
+
+    cprof = cProfile.Profile() if cprofile_path else None
+    with PROFILER.activate():
+        if cprof:
+            cprof.enable()
+        try:
+            yield
+        finally:
+            if cprof:
+                cprof.disable()
+                cprof.dump_stats(cprofile_path)
+            if report_path:
+                report = {"script": script, **PROFILER.report()}
+                with open(report_path, "w", encoding="utf-8") as f:
+                    json.dump(report, f, indent=2)
+                print(f"Profile written to {report_path}", file=sys.stderr)
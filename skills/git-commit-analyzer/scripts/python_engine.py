@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+In-process detection engine for Python snippets, built on `ast` and `tokenize`.
+Evaluates the Python detection rules without spawning ast-grep and
+reproduces its match lines (0-based) and texts, so results are
+interchangeable with `sg scan` output.
+
+Added-code hunks are rarely complete modules; parse_lenient() splits a
+snippet around syntax errors and parses whatever pieces it can, and calls on
+lines that cannot be parsed at all are still found from their tokens.
+"""
+
+import ast
+import io
+import re
+import textwrap
+import tokenize
+from dataclasses import dataclass
+
+# Bump when matching behaviour changes, so cached results are invalidated
+VERSION = "3"
+
+MAX_PARSE_ATTEMPTS = 64
+
+# Headers that let orphaned clause lines (a hunk starting at `except:`) parse
+_CLAUSE_HEADERS = {
+    "except": "try:\n    pass\n",
+    "finally": "try:\n    pass\n",
+    "elif": "if 0:\n    pass\n",
+    "else": "if 0:\n    pass\n",
+}
+
+
+@dataclass
+class Piece:
+    """A parsed run of snippet lines."""
+
+    tree: ast.Module
+    first_line: int  # snippet line index of the piece's first real line
+    shift: int  # synthetic header lines prepended before parsing
+    indent: int  # columns removed by dedent
+
+
+def _prepare(lines: list[str]) -> tuple[str, int, int]:
+    dedented = textwrap.dedent("\n".join(lines))
+    first = next(l for l in lines if l.strip())
+    # dedent strips the same prefix from every non-blank line
+    indent = len(first) - len(next(l for l in dedented.split("\n") if l.strip()))
+    head = dedented.lstrip().split(None, 1)[0].split(":", 1)[0]
+    header = _CLAUSE_HEADERS.get(head, "")
+    return header + dedented, header.count("\n"), indent
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip())
+
+
+def _first_dedent(lines: list[str], start: int, end: int) -> int | None:
+    level = _indent(lines[start])
+    for i in range(start + 1, end):
+        if lines[i].strip() and _indent(lines[i]) < level:
+            return i
+    return None
+
+
+def parse_lenient(code: str) -> tuple[list[Piece], list[int]]:
+    """
+    Parse as much of `code` as possible.
+    Returns the parsed pieces and the indexes of lines no piece covers.
+    """
+    lines = code.split("\n")
+    pieces: list[Piece] = []
+    dropped: list[int] = []
+    stack = [(0, len(lines))]
+    attempts = 0
+
+    while stack:
+        start, end = stack.pop()
+        while start < end and not lines[start].strip():
+            start += 1
+        if start >= end:
+            continue
+        if attempts >= MAX_PARSE_ATTEMPTS:
+            dropped.extend(range(start, end))
+            continue
+        attempts += 1
+
+        src, shift, indent = _prepare(lines[start:end])
+        try:
+            tree = ast.parse(src)
+        except (SyntaxError, ValueError) as e:
+            bad = start + (getattr(e, "lineno", None) or 1) - 1 - shift
+            bad = min(max(bad, start), end - 1)
+            if bad == start:
+                # Hunks often end deeper (or shallower) than they start:
+                # parse up to the first dedent on its own before giving up
+                cut = _first_dedent(lines, start, end)
+                if cut is not None:
+                    stack.append((cut, end))
+                    stack.append((start, cut))
+                else:
+                    dropped.append(start)
+                    stack.append((start + 1, end))
+            else:
+                # The failing line may start a parsable run of its own
+                stack.append((bad, end))
+                stack.append((start, bad))
+            continue
+        pieces.append(Piece(tree, start, shift, indent))
+
+    return pieces, sorted(dropped)
+
+
+Span = tuple[int, int, int, int]  # lineno, col_offset, end_lineno, end_col_offset
+
+
+def _span(node: ast.AST) -> Span:
+    return node.lineno, node.col_offset, node.end_lineno, node.end_col_offset
+
+
+def _lines(piece: Piece, span: Span) -> tuple[int, int]:
+    """Snippet line indexes of a span's first and last line."""
+    offset = piece.first_line - 1 - piece.shift
+    return span[0] + offset, span[2] + offset
+
+
+def _text(lines: list[bytes], piece: Piece, span: Span) -> tuple[int, str]:
+    """(snippet line, source text) of a span, taken from the original snippet."""
+    _, col, _, end_col = span
+    first, last = _lines(piece, span)
+    # ast offsets are UTF-8 byte columns of the dedented text
+    col += piece.indent
+    end_col += piece.indent
+    if first == last:
+        raw = lines[first][col:end_col]
+    else:
+        raw = b"\n".join([lines[first][col:], *lines[first + 1 : last], lines[last][:end_col]])
+    return first, raw.decode("utf-8", "replace")
+
+
+def _is_plain_string(text: str) -> bool:
+    """One non-empty, unprefixed, double-quoted, single-line string token."""
+    try:
+        tokens = [
+            t
+            for t in tokenize.generate_tokens(io.StringIO(text).readline)
+            if t.type not in (tokenize.NEWLINE, tokenize.NL, tokenize.ENDMARKER)
+        ]
+    except (tokenize.TokenError, SyntaxError):
+        return False
+    if len(tokens) != 1 or tokens[0].type != tokenize.STRING:
+        return False
+    s = tokens[0].string
+    return s.startswith('"') and not s.startswith('"""') and len(s) > 2
+
+
+def _find_calls(name: str):
+    def finder(node: ast.Call, lines: list[bytes], piece: Piece):
+        if isinstance(node.func, ast.Name) and node.func.id == name:
+            yield _span(node)
+
+    return finder
+
+
+def _find_empty_except(node: ast.ExceptHandler, lines: list[bytes], piece: Piece):
+    if len(node.body) == 1 and isinstance(node.body[0], ast.Pass):
+        yield _span(node)
+
+
+def _find_hardcoded_secret(node: ast.Assign, lines: list[bytes], piece: Piece):
+    if not isinstance(node.value, ast.Constant) or not isinstance(node.value.value, str):
+        return
+    _, value_text = _text(lines, piece, _span(node.value))
+    if not _is_plain_string(value_text):
+        return
+    # `a = b = "x"` nests in tree-sitter; only the innermost assignment matches
+    target = node.targets[-1]
+    # Parenthesized values are a different node shape for ast-grep
+    between = (target.end_lineno, target.end_col_offset, node.value.lineno, node.value.col_offset)
+    if _text(lines, piece, between)[1].strip() != "=":
+        return
+    yield target.lineno, target.col_offset, node.value.end_lineno, node.value.end_col_offset
+
+
+# rule name -> (node type the rule can match, finder)
+FINDERS = {
+    "empty_except": (ast.ExceptHandler, _find_empty_except),
+    "print_debug": (ast.Call, _find_calls("print")),
+    "eval_usage": (ast.Call, _find_calls("eval")),
+    "hardcoded_secret": (ast.Assign, _find_hardcoded_secret),
+}
+
+# Rules that can also be spotted from tokens on lines that do not parse
+TOKEN_CALLS = {"print_debug": "print", "eval_usage": "eval"}
+
+# Rules matching whole statements: a line inside a bracket the snippet left
+# open (`help="..."` in a call's arguments) cannot start one, even when the
+# line parses as an assignment once the snippet is split
+STATEMENT_RULES = {"hardcoded_secret"}
+
+# Words that only start statements; such a line inside an open bracket means
+# the bracket was never closed in the snippet
+_STATEMENT_KEYWORDS = set(
+    "assert async break class continue def del elif else except finally for from"
+    " global if import nonlocal pass raise return try while with".split()
+)
+_STRING_START = re.compile(r"(?i)(?:[rbuf]|br|rb|fr|rf)?(\"\"\"|'''|\"|')")
+_WORD = re.compile(r"\w+")
+
+
+def supports(rule_name: str) -> bool:
+    return rule_name in FINDERS
+
+
+def _bracket_context(code: str) -> tuple[set[int], set[int]]:
+    """
+    Follow brackets across the lines of a snippet. Hunks start and end
+    mid-statement (stray closers, broken indentation), so this scans
+    characters rather than relying on tokenize.
+    Returns the indexes of lines that start inside a bracket opened on an
+    earlier line, and the subset of those right after a string or a `)`
+    (and no `=` on that line): ast-grep reads a call starting such a line as
+    a call of the expression before it (`"doc"` then `print(x)` parses as
+    `"doc"(x)`).
+    These mimic ast-grep's error recovery where the hunk left out the line
+    closing a bracket. A statement line (`def`, `try`) indented less than the
+    line that opened a `(` or `[` closes it; a `{` stays open, and so do
+    lines after a statement inside a `(` or `[`, though those keep their
+    calls. A bracket followed by something that cannot start an argument
+    (`def f(:`) does not count.
+    """
+    bracketed: set[int] = set()
+    juxtaposed: set[int] = set()
+    # Open brackets: [opener, counts, a statement line followed it, indent]
+    stack: list[list] = []
+    quote = None  # closing quote of a string continued from an earlier line
+    last = ""  # last significant token: "string", ")" or ""
+    assigned = False  # the last non-blank line had an `=`
+    for index, line in enumerate(code.split("\n")):
+        i = 0
+        if quote:
+            end = _string_end(line, 0, quote)
+            if end is None:
+                if len(quote) == 1 and not line.endswith("\\"):
+                    quote = None
+                continue
+            i, quote = end, None
+        elif any(entry[1] for entry in stack):
+            word = _WORD.match(line.lstrip())
+            if word and word.group() in _STATEMENT_KEYWORDS:
+                while stack and stack[-1][0] != "{" and _indent(line) < stack[-1][3]:
+                    stack.pop()
+                if stack:
+                    stack[-1][2] = True
+            elif last in ("string", ")") and not assigned:
+                if stack[-1][0] == "{" or not stack[-1][2]:
+                    juxtaposed.add(index)
+            if any(entry[1] for entry in stack):
+                bracketed.add(index)
+        opened = False
+        if line.strip():
+            assigned = False
+        while i < len(line):
+            ch = line[i]
+            if ch.isspace():
+                i += 1
+                continue
+            if opened:
+                stack[-1][1] = _starts_argument(line, i)
+                opened = False
+            if ch == "#":
+                break
+            string = _STRING_START.match(line, i)
+            if string:
+                last = "string"
+                end = _string_end(line, string.end(), string.group(1))
+                if end is None:
+                    quote = string.group(1)
+                    break
+                i = end
+                continue
+            word = _WORD.match(line, i)
+            if word:
+                last = ""
+                i = word.end()
+                continue
+            if ch in "([{":
+                stack.append([ch, True, False, _indent(line)])
+                opened = True
+            elif ch in ")]}" and stack:
+                # Hunks may start in the middle of a call: extra closers are ignored
+                stack.pop()
+            elif ch == "=" and "=" not in line[i + 1 : i + 2] + line[i - 1 : i]:
+                assigned = assigned or line[i - 1 : i] not in ("!", "<", ">")
+            last = ")" if ch == ")" else ""
+            i += 1
+    return bracketed, juxtaposed
+
+
+def _string_end(line: str, i: int, quote: str) -> int | None:
+    """Index just past the `quote` that closes a string at line[i:], if any."""
+    while i < len(line):
+        if line[i] == "\\":
+            i += 2
+        elif line.startswith(quote, i):
+            return i + len(quote)
+        else:
+            i += 1
+    return None
+
+
+def _starts_argument(line: str, i: int) -> bool:
+    if _WORD.match(line, i) or line[i] in "\"'#([{)]}-+~*":
+        return True
+    return line.startswith("...", i)
+
+
+def _token_calls(code: str, dropped: list[int], names: dict[str, str]) -> list:
+    """Find `name(...)` calls on unparsable lines from their token stream."""
+    found = []
+    lines = code.split("\n")
+    for index in dropped:
+        line = lines[index]
+        try:
+            tokens = list(tokenize.generate_tokens(io.StringIO(line.strip()).readline))
+        except (tokenize.TokenError, SyntaxError, IndentationError):
+            continue
+        offset = len(line) - len(line.lstrip())
+        for i, tok in enumerate(tokens[:-1]):
+            if tok.type != tokenize.NAME or tokens[i + 1].string != "(":
+                continue
+            if i and tokens[i - 1].string == ".":
+                continue
+            for rule_name, call in names.items():
+                if tok.string != call:
+                    continue
+                depth, end = 0, len(line.strip())
+                for t in tokens[i + 1 :]:
+                    depth += {"(": 1, ")": -1}.get(t.string, 0)
+                    if depth == 0:
+                        end = t.end[1]
+                        break
+                found.append(
+                    (rule_name, index, tok.start[1], line[offset + tok.start[1] : offset + end], index)
+                )
+    return found
+
+
+def _starts_line(code: str, found: tuple) -> bool:
+    _, line, _, text, _ = found
+    return code.split("\n")[line].lstrip().startswith(text.split("\n", 1)[0])
+
+
+def scan(code: str, rules: list) -> list[tuple[object, dict]]:
+    """
+    Evaluate `rules` (AstPattern objects this engine supports) on a snippet.
+    Returns (rule, match) pairs shaped like ast-grep JSON matches, in
+    snippet order per rule.
+    """
+    by_name = {rule.name: rule for rule in rules if rule.name in FINDERS}
+    if not by_name:
+        return []
+    by_type: dict[type, list] = {}
+    for name in by_name:
+        node_type, finder = FINDERS[name]
+        by_type.setdefault(node_type, []).append((name, finder))
+
+    pieces, dropped = parse_lenient(code)
+    lines = [line.encode("utf-8") for line in code.split("\n")]
+    found = []  # (rule_name, line, col, text, end_line)
+
+    for piece in pieces:
+        for node in ast.walk(piece.tree):
+            finders = by_type.get(type(node))
+            if not finders or node.lineno <= piece.shift:
+                continue
+            for name, finder in finders:
+                for span in finder(node, lines, piece):
+                    line, text = _text(lines, piece, span)
+                    found.append((name, line, span[1], text, _lines(piece, span)[1]))
+
+    calls = {name: call for name, call in TOKEN_CALLS.items() if name in by_name}
+    if dropped and calls:
+        found.extend(_token_calls(code, dropped, calls))
+    if found:
+        bracketed, juxtaposed = _bracket_context(code)
+        found = [
+            f
+            for f in found
+            if not (f[0] in STATEMENT_RULES and f[1] in bracketed)
+            and not (f[0] in TOKEN_CALLS and f[1] in juxtaposed and _starts_line(code, f))
+        ]
+
+    found.sort(key=lambda f: (f[1], f[2]))
+    return [
+        (
+            by_name[name],
+            {"range": {"start": {"line": line}, "end": {"line": end}}, "text": text},
+        )
+        for name, line, _, text, end in found
+    ]
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Shape of analysis.json (the model's answer to the generate_prompt prompt),
+as generate_report.py reads it. Fields are optional unless listed as
+required; present fields must have the right type.
+"""
+
+import json
+
+# key -> type, or (type, {nested key -> type}) for list entries
+SCHEMA = {
+    "report_date": str,
+    "team_vibe": str,
+    "linus_mood": str,
+    "team_summary": (
+        dict,
+        {
+            "total_commits": int,
+            "real_work_score": (int, float),
+            "bullshit_ratio": (str, int, float),
+            "team_grade": str,
+            "mvp": str,
+            "daily_vibe": str,
+            "linus_says": str,
+        },
+    ),
+    "leaderboard": (
+        list,
+        {
+            "rank": int,
+            "name": str,
+            "substance_score": (int, float),
+            "quality_multiplier": (int, float),
+            "final_score": (int, float),
+            "grade": str,
+            "title": str,
+            "award": str,
+            "commits": int,
+            "effective_lines": int,
+            "badges": list,
+            "summary": str,
+            "linus_review": str,
+            "ai_survivor_score": (int, float),
+            "ai_verdict": str,
+            "future_advice": str,
+        },
+    ),
+    "commits": (
+        list,
+        {
+            "sha": str,
+            "author": str,
+            "complexity": (int, float),
+            "impact": (int, float),
+            "final_score": (int, float),
+            "roast": str,
+            "linus_says": str,
+            "badges": list,
+            "rewrite_index": (int, float),
+            "business_value": str,
+            "ai_could_write": (str, bool),
+        },
+    ),
+    "wall_of_shame": list,
+    "ai_era_verdict": (
+        dict,
+        {
+            "team_ai_survivor_score": (int, float),
+            "most_irreplaceable": str,
+            "most_replaceable": str,
+            "team_future": str,
+            "linus_ai_rant": str,
+        },
+    ),
+    "daily_roast": str,
+    "closing_rant": str,
+}
+
+REQUIRED = ("team_summary", "leaderboard", "commits")
+REQUIRED_ENTRY_KEYS = {"leaderboard": ("name",), "commits": ("sha",)}
+
+
+def _type_name(types) -> str:
+    types = types if isinstance(types, tuple) else (types,)
+    return "/".join(t.__name__ for t in types)
+
+
+def _check(value, types) -> bool:
+    types = types if isinstance(types, tuple) else (types,)
+    # bool is an int subclass; only accept it where bool is listed
+    if isinstance(value, bool) and bool not in types:
+        return False
+    return isinstance(value, types)
+
+
+def validate_analysis(data) -> list[str]:
+    """Problems with `data` as an analysis.json; empty when it is valid."""
+    if not isinstance(data, dict):
+        return [f"expected an object, got {type(data).__name__}"]
+    errors = [f"missing {key}" for key in REQUIRED if key not in data]
+    for key, spec in SCHEMA.items():
+        if key not in data:
+            continue
+        kind, fields = spec if isinstance(spec, tuple) and isinstance(spec[1], dict) else (spec, None)
+        value = data[key]
+        if not _check(value, kind):
+            errors.append(f"{key}: expected {_type_name(kind)}, got {type(value).__name__}")
+            continue
+        if fields is None:
+            continue
+        entries = enumerate(value) if kind is list else [(None, value)]
+        for i, entry in entries:
+            where = key if i is None else f"{key}[{i}]"
+            if not isinstance(entry, dict):
+                errors.append(f"{where}: expected object, got {type(entry).__name__}")
+                continue
+            errors.extend(f"{where}: missing {k}" for k in REQUIRED_ENTRY_KEYS.get(key, ()) if k not in entry)
+            errors.extend(
+                f"{where}.{k}: expected {_type_name(t)}, got {type(entry[k]).__name__}"
+                for k, t in fields.items()
+                if k in entry and entry[k] is not None and not _check(entry[k], t)
+            )
+    return errors
+
+
+def parse_model_json(text: str):
+    """
+    The JSON object in a model answer: tolerates a ```json fence and prose
+    around the object. Raises ValueError.
+    """
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    try:
+        return json.loads(text)
+    except ValueError:
+        start, end = text.find("{"), text.rfind("}")
+        if start < 0 or end < start:
+            raise
+        return json.loads(text[start : end + 1])
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Detection rules indexed by language, plus team rule packs.
+
+Pack directories are listed on first use and each pack file is parsed only
+when a file of its language is scanned. One language per pack file:
+
+    <dir>/<lang>.yaml, <dir>/<lang>.<anything>.yaml, <dir>/<lang>/*.yaml
+
+(.yml and .json work too; YAML needs PyYAML). A file holds a list of rules,
+or {"rules": [...]}, using AstPattern fields; `lang` defaults to the file's
+language. A pack rule named like an existing rule replaces it for that
+language.
+
+Pack directories: --rule-pack DIR, or $GCA_RULE_PACKS (os.pathsep-separated).
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+
+from profiling import count, stage
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+SEVERITIES = ("error", "warning", "info")
+# Keys of summarize_issues' by_category
+CATEGORIES = ("smell", "antipattern", "ai_generated", "security")
+PACK_SUFFIXES = (".yaml", ".yml", ".json")
+
+
+@dataclass
+class AstPattern:
+    name: str
+    pattern: str
+    lang: str
+    severity: str  # "error", "warning", "info"
+    category: str  # "smell", "ai_generated", "antipattern", "security"
+    description: str
+    bullshit_score: int = 0
+    # Substrings every match must contain; derived from the pattern when None
+    prefilter: tuple[str, ...] | None = None
+
+    def __post_init__(self):
+        if self.prefilter is None:
+            self.prefilter = pattern_literals(self.pattern)
+
+    def may_match(self, code: str) -> bool:
+        return all(literal in code for literal in self.prefilter)
+
+
+# Punctuation that is part of the matched node itself, never optional trivia
+# like `;` or `{}` spacing
+_STRUCTURAL_CHARS = '=?:"'
+
+
+def pattern_literals(pattern: str) -> tuple[str, ...]:
+    """
+    Identifier-like tokens and structural characters of a pattern outside
+    metavariables. A structural match contains each of them verbatim, so a
+    snippet missing any one cannot match.
+    """
+    words = re.findall(r"(?<![\w$])[A-Za-z_]\w*", pattern)
+    rest = re.sub(r"\$+\w*|\w+", " ", pattern)
+    chars = [c for c in rest if c in _STRUCTURAL_CHARS]
+    return tuple(dict.fromkeys(words + chars))
+
+
+def default_pack_dirs() -> list[Path]:
+    env = os.environ.get("GCA_RULE_PACKS", "")
+    return [Path(p) for p in env.split(os.pathsep) if p.strip()]
+
+
+def rule_from_dict(data: dict, lang: str) -> AstPattern:
+    """Validate one pack entry for `lang`; raises ValueError."""
+    if not isinstance(data, dict):
+        raise ValueError(f"rule must be a mapping, got {type(data).__name__}")
+    known = {f.name for f in fields(AstPattern)}
+    unknown = set(data) - known
+    if unknown:
+        raise ValueError(f"unknown rule keys: {sorted(unknown)}")
+    missing = {"name", "pattern", "severity", "category", "description"} - set(data)
+    if missing:
+        raise ValueError(f"rule is missing {sorted(missing)}")
+    name = data["name"]
+    if lang not in str(data.get("lang", lang)).split(","):
+        raise ValueError(f"rule {name!r} does not apply to {lang}")
+    if data["severity"] not in SEVERITIES:
+        raise ValueError(f"rule {name!r}: severity must be one of {SEVERITIES}")
+    if data["category"] not in CATEGORIES:
+        raise ValueError(f"rule {name!r}: category must be one of {CATEGORIES}")
+    prefilter = data.get("prefilter")
+    return AstPattern(
+        **{
+            **data,
+            "lang": lang,
+            "bullshit_score": int(data.get("bullshit_score", 0)),
+            "prefilter": tuple(prefilter) if prefilter is not None else None,
+        }
+    )
+
+
+def load_pack(path: Path, lang: str) -> list[AstPattern]:
+    """Parse a pack file into rules for `lang`; raises ValueError or OSError."""
+    text = path.read_text(encoding="utf-8")
+    if path.suffix == ".json":
+        data = json.loads(text)
+    elif yaml is None:
+        raise ValueError("PyYAML is required for YAML rule packs (pip install pyyaml)")
+    else:
+        try:
+            data = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ValueError(str(e)) from e
+    if isinstance(data, dict):
+        data = data.get("rules")
+    if not isinstance(data, list):
+        raise ValueError("expected a list of rules or {rules: [...]}")
+    return [rule_from_dict(entry, lang) for entry in data]
+
+
+class RuleRegistry:
+    """
+    Rules indexed by language at construction; pack rules are added per
+    language on first lookup. Safe to share between threads.
+    """
+
+    def __init__(self, rules: list[AstPattern], pack_dirs: list[str | Path] = ()):
+        self.pack_dirs = [Path(d) for d in pack_dirs]
+        self._by_lang: dict[str, list[AstPattern]] = {}
+        self._by_name: dict[str, AstPattern] = {}
+        self._pending: dict[str, list[Path]] | None = None
+        self._versions: dict[str, str] = {}
+        self._packs_version: str | None = None
+        self._lock = threading.Lock()
+        for rule in rules:
+            for lang in rule.lang.split(","):
+                self._add(lang, rule)
+
+    def _add(self, lang: str, rule: AstPattern) -> None:
+        rules = self._by_lang.setdefault(lang, [])
+        for i, existing in enumerate(rules):
+            if existing.name == rule.name:
+                rules[i] = rule
+                break
+        else:
+            rules.append(rule)
+        # First definition wins: built-ins, then packs in directory order
+        self._by_name.setdefault(rule.name, rule)
+
+    def _list_packs(self) -> dict[str, list[Path]]:
+        packs: dict[str, list[Path]] = {}
+        for root in self.pack_dirs:
+            if not root.is_dir():
+                print(f"⚠️ Rule pack directory not found: {root}", file=sys.stderr)
+                continue
+            for path in sorted([*root.glob("*"), *root.glob("*/*")]):
+                if path.suffix not in PACK_SUFFIXES or not path.is_file():
+                    continue
+                rel = path.relative_to(root)
+                lang = rel.parts[0] if len(rel.parts) > 1 else path.name.split(".", 1)[0]
+                packs.setdefault(lang, []).append(path)
+        return packs
+
+    def _load(self, lang: str) -> None:
+        if self._pending is None:
+            self._pending = self._list_packs()
+        for path in self._pending.pop(lang, []):
+            try:
+                with stage("rules.load_pack"):
+                    rules = load_pack(path, lang)
+            except (OSError, ValueError) as e:
+                count("rules.pack_errors")
+                print(f"⚠️ Skipping rule pack {path}: {e}", file=sys.stderr)
+                continue
+            count("rules.packs_loaded")
+            for rule in rules:
+                self._add(lang, rule)
+
+    def rules_for(self, lang: str) -> tuple[AstPattern, ...]:
+        """Every rule for `lang`, built-ins first, in definition order."""
+        with self._lock:
+            self._load(lang)
+            return tuple(self._by_lang.get(lang, ()))
+
+    def find(self, name: str) -> AstPattern | None:
+        """
+        The first definition of the rule called `name` in any language: the
+        built-in one, else the first pack (in directory order) defining it.
+        Loads every pack so the answer does not depend on what ran before.
+        """
+        with self._lock:
+            if self._pending is None:
+                self._pending = self._list_packs()
+            for pending in list(self._pending):
+                self._load(pending)
+            return self._by_name.get(name)
+
+    def packs_version(self) -> str:
+        """Hash of every pack file's path and content; "" without packs."""
+        with self._lock:
+            if self._packs_version is None:
+                files = sorted(
+                    path
+                    for root in self.pack_dirs
+                    if root.is_dir()
+                    for path in [*root.glob("*"), *root.glob("*/*")]
+                    if path.suffix in PACK_SUFFIXES and path.is_file()
+                )
+                digest = hashlib.sha256()
+                for path in files:
+                    digest.update(str(path).encode("utf-8") + b"\0")
+                    try:
+                        digest.update(path.read_bytes())
+                    except OSError:
+                        pass
+                self._packs_version = digest.hexdigest()[:16] if files else ""
+            return self._packs_version
+
+    def version(self, lang: str) -> str:
+        """Hash of every rule definition for `lang`, for cache invalidation."""
+        rules = self.rules_for(lang)
+        with self._lock:
+            if lang not in self._versions:
+                payload = json.dumps([asdict(r) for r in rules], sort_keys=True)
+                self._versions[lang] = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+            return self._versions[lang]
@@ -0,0 +1,555 @@
+#!/usr/bin/env python3
+"""
+Send generate_prompt / shard_prompts prompts to a model and save analysis.json.
+
+Backends:
+    anthropic   Messages API ($ANTHROPIC_API_KEY, $ANTHROPIC_BASE_URL)
+    openai      OpenAI-compatible chat completions ($OPENAI_API_KEY,
+                $OPENAI_BASE_URL), e.g. a local or self-hosted server
+    stub        offline answer built from the prompt's commits, for testing
+
+Prompts run concurrently with retries on rate limits, server errors and
+answers that do not match the report schema. Valid answers are cached by
+prompt hash, so re-running an unchanged window makes no requests.
+
+Cache: $GCA_RESPONSE_CACHE, else $XDG_CACHE_HOME/git-commit-analyzer/responses.
+Set GCA_RESPONSE_CACHE=off to disable.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+from generate_prompt import prompt_prefix
+from profiling import add_profile_args, count, profile_session, stage
+from report_schema import parse_model_json, validate_analysis
+
+BACKENDS = ("anthropic", "openai", "stub")
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RETRIES = 3
+DEFAULT_TIMEOUT = 300
+MAX_OUTPUT_TOKENS = 8192
+MAX_BACKOFF = 60
+# Rate limits, timeouts, overload and transient server errors
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+ANTHROPIC_URL = "https://api.anthropic.com"
+ANTHROPIC_VERSION = "2023-06-01"
+OPENAI_URL = "https://api.openai.com/v1"
+
+
+class ModelError(Exception):
+    """The model could not produce a usable answer."""
+
+
+class RetryableError(ModelError):
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _post_json(url: str, headers: dict, body: dict, timeout: float) -> dict:
+    payload = json.dumps(body).encode("utf-8")
+    req = urllib.request.Request(url, data=payload, method="POST")
+    req.add_header("Content-Type", "application/json")
+    for name, value in headers.items():
+        req.add_header(name, value)
+    try:
+        with stage("model.http", len(payload)) as st, urllib.request.urlopen(
+            req, timeout=timeout
+        ) as response:
+            raw = response.read()
+            st.add_bytes(len(raw))
+    except urllib.error.HTTPError as e:
+        detail = e.read().decode("utf-8", "replace")[:500]
+        if e.code in RETRY_STATUS:
+            retry_after = e.headers.get("Retry-After")
+            raise RetryableError(
+                f"HTTP {e.code}: {detail}",
+                float(retry_after) if retry_after and retry_after.isdigit() else None,
+            ) from e
+        raise ModelError(f"HTTP {e.code}: {detail}") from e
+    except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+        raise RetryableError(f"request failed: {e}") from e
+    try:
+        return json.loads(raw)
+    except ValueError as e:
+        raise RetryableError(f"response is not JSON: {raw[:200]!r}") from e
+
+
+def _cache_blocks(prompt: str) -> list[dict]:
+    """
+    Message content with the static prefix of a --layout cached prompt
+    marked cacheable; a single text block otherwise.
+    """
+    for lang in ("zh", "en"):
+        prefix = prompt_prefix(lang)
+        if prompt.startswith(prefix) and len(prompt) > len(prefix):
+            return [
+                {
+                    "type": "text",
+                    "text": prefix,
+                    "cache_control": {"type": "ephemeral"},
+                },
+                {"type": "text", "text": prompt[len(prefix) :]},
+            ]
+    return [{"type": "text", "text": prompt}]
+
+
+class AnthropicBackend:
+    name = "anthropic"
+
+    def __init__(
+        self,
+        model: str,
+        base_url: str | None = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_output_tokens: int = MAX_OUTPUT_TOKENS,
+    ):
+        self.model = model
+        self.url = (
+            base_url or os.environ.get("ANTHROPIC_BASE_URL") or ANTHROPIC_URL
+        ).rstrip("/") + "/v1/messages"
+        self.api_key = os.environ.get("ANTHROPIC_API_KEY")
+        if not self.api_key:
+            raise ValueError(
+                "ANTHROPIC_API_KEY environment variable required "
+                "for the anthropic backend"
+            )
+        self.timeout = timeout
+        self.max_output_tokens = max_output_tokens
+
+    def complete(self, prompt: str) -> str:
+        body = {
+            "model": self.model,
+            "max_tokens": self.max_output_tokens,
+            "messages": [{"role": "user", "content": _cache_blocks(prompt)}],
+        }
+        headers = {"x-api-key": self.api_key, "anthropic-version": ANTHROPIC_VERSION}
+        data = _post_json(self.url, headers, body, self.timeout)
+        usage = data.get("usage", {})
+        count("model.input_tokens", usage.get("input_tokens", 0))
+        count("model.cache_read_tokens", usage.get("cache_read_input_tokens", 0) or 0)
+        count("model.output_tokens", usage.get("output_tokens", 0))
+        if data.get("stop_reason") == "max_tokens":
+            raise RetryableError("answer truncated at max tokens")
+        return "".join(
+            block.get("text", "")
+            for block in data.get("content", [])
+            if block.get("type") == "text"
+        )
+
+
+class OpenAIBackend:
+    name = "openai"
+
+    def __init__(
+        self,
+        model: str,
+        base_url: str | None = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_output_tokens: int = MAX_OUTPUT_TOKENS,
+    ):
+        self.model = model
+        self.url = (base_url or os.environ.get("OPENAI_BASE_URL") or OPENAI_URL).rstrip(
+            "/"
+        ) + "/chat/completions"
+        # Local OpenAI-compatible servers usually need no key
+        self.api_key = os.environ.get("OPENAI_API_KEY")
+        self.timeout = timeout
+        self.max_output_tokens = max_output_tokens
+
+    def complete(self, prompt: str) -> str:
+        body = {
+            "model": self.model,
+            "max_tokens": self.max_output_tokens,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        data = _post_json(self.url, headers, body, self.timeout)
+        usage = data.get("usage") or {}
+        count("model.input_tokens", usage.get("prompt_tokens", 0))
+        count("model.output_tokens", usage.get("completion_tokens", 0))
+        try:
+            choice = data["choices"][0]
+            if choice.get("finish_reason") == "length":
+                raise RetryableError("answer truncated at max tokens")
+            return choice["message"]["content"] or ""
+        except (KeyError, IndexError, TypeError) as e:
+            raise RetryableError(f"unexpected response shape: {str(data)[:200]}") from e
+
+
+# `"sha": "…", "author": "…"` as commit_header() and the shard digests write them
+_COMMIT_REF = re.compile(r'"sha": "([0-9a-f]{7,40})",\s*"author": "((?:[^"\\]|\\.)*)"')
+
+
+def stub_answer(prompt: str) -> dict:
+    """A schema-valid analysis of the commits named in `prompt`."""
+    commits, seen = [], set()
+    for sha, author in _COMMIT_REF.findall(prompt):
+        if sha[:8] not in seen:
+            seen.add(sha[:8])
+            commits.append({"sha": sha[:8], "author": json.loads(f'"{author}"')})
+    by_author: dict[str, int] = {}
+    for c in commits:
+        by_author[c["author"]] = by_author.get(c["author"], 0) + 1
+    ranked = sorted(by_author.items(), key=lambda kv: (-kv[1], kv[0]))
+    return {
+        "report_date": date.today().isoformat(),
+        "team_vibe": "stub",
+        "linus_mood": "stub",
+        "team_summary": {
+            "total_commits": len(commits),
+            "mvp": ranked[0][0] if ranked else "",
+        },
+        "leaderboard": [
+            {"rank": i + 1, "name": name, "commits": n, "final_score": n, "badges": []}
+            for i, (name, n) in enumerate(ranked)
+        ],
+        "commits": [
+            {
+                **c,
+                "complexity": 3,
+                "impact": 3,
+                "final_score": 3,
+                "rewrite_index": 3,
+                "badges": [],
+            }
+            for c in commits
+        ],
+        "wall_of_shame": [],
+        "ai_era_verdict": {},
+        "daily_roast": "stub",
+        "closing_rant": "stub",
+    }
+
+
+class StubBackend:
+    name = "stub"
+
+    def __init__(self, model: str = "stub", delay: float = 0.0, **_):
+        self.model = model
+        self.delay = delay
+
+    def complete(self, prompt: str) -> str:
+        if self.delay:
+            time.sleep(self.delay)
+        return json.dumps(stub_answer(prompt), ensure_ascii=False)
+
+
+def make_backend(name: str, model: str | None = None, **options):
+    if name == "stub":
+        return StubBackend(model or "stub", **options)
+    model = model or os.environ.get("GCA_MODEL")
+    if not model:
+        raise ValueError(f"--model (or $GCA_MODEL) is required for the {name} backend")
+    options.pop("delay", None)
+    return (AnthropicBackend if name == "anthropic" else OpenAIBackend)(
+        model, **options
+    )
+
+
+def default_cache_dir() -> Path | None:
+    env = os.environ.get("GCA_RESPONSE_CACHE")
+    if env is not None:
+        return None if env.strip().lower() in ("", "0", "off", "none") else Path(env)
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "git-commit-analyzer" / "responses"
+
+
+class ResponseCache:
+    """Validated answers as JSON files named by hash(backend, model, prompt)."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(backend, prompt: str) -> str:
+        h = hashlib.sha256()
+        for part in (backend.name, backend.model):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        h.update(prompt.encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        try:
+            with open(self.root / f"{key}.json", "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, answer: dict) -> None:
+        # Write-then-rename so concurrent runs never read half a file
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(answer, f, ensure_ascii=False)
+        os.replace(tmp, self.root / f"{key}.json")
+
+
+class Runner:
+    """Runs prompts on one backend with a concurrency cap, retries and the cache."""
+
+    def __init__(
+        self,
+        backend,
+        cache: ResponseCache | None = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        retries: int = DEFAULT_RETRIES,
+    ):
+        self.backend = backend
+        self.cache = cache
+        self.concurrency = max(1, concurrency)
+        self.retries = max(0, retries)
+        self._log_lock = threading.Lock()
+
+    def _log(self, message: str) -> None:
+        with self._log_lock:
+            print(message, file=sys.stderr)
+
+    def run(
+        self, prompt: str, label: str = "prompt", require_commits: bool = True
+    ) -> dict:
+        """The validated answer to `prompt`; raises ModelError."""
+        key = ResponseCache.key(self.backend, prompt) if self.cache else None
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                count("model.cache_hits")
+                return cached
+            count("model.cache_misses")
+
+        problem = "no attempt"
+        for attempt in range(self.retries + 1):
+            if attempt:
+                count("model.retries")
+                retry_after = getattr(problem, "retry_after", None)
+                if retry_after:
+                    # Never earlier than the server asked; spread workers a
+                    # little after it
+                    delay = retry_after + random.random()
+                else:
+                    delay = min(MAX_BACKOFF, 2**attempt) * (0.5 + random.random() / 2)
+                self._log(
+                    f"⚠️ {label}: {problem}; "
+                    f"retry {attempt}/{self.retries} in {delay:.1f}s"
+                )
+                time.sleep(delay)
+            count("model.requests")
+            try:
+                with stage("model.request"):
+                    text = self.backend.complete(prompt)
+            except RetryableError as e:
+                problem = e
+                continue
+            try:
+                answer = parse_model_json(text)
+            except ValueError as e:
+                count("model.invalid_answers")
+                problem = RetryableError(f"answer is not JSON ({e})")
+                continue
+            errors = validate_analysis(answer)
+            if not require_commits:
+                errors = [e for e in errors if e != "missing commits"]
+            if errors:
+                count("model.invalid_answers")
+                problem = RetryableError(
+                    f"answer does not match the report schema: {'; '.join(errors[:5])}"
+                )
+                continue
+            if key:
+                self.cache.put(key, answer)
+            return answer
+        raise ModelError(f"{label}: {problem}")
+
+    def run_many(
+        self, prompts: list[tuple[str, str]], require_commits: bool = True
+    ) -> list:
+        """Answers (or the ModelError) for (label, prompt) pairs, in order."""
+
+        def one(item):
+            label, prompt = item
+            try:
+                return self.run(prompt, label, require_commits)
+            except ModelError as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            return list(pool.map(one, prompts))
+
+
+def _write_json(path: Path, data: dict) -> None:
+    with stage("json.dump"), open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def run_manifest(runner: Runner, manifest_file: str) -> dict:
+    """
+    Answer every shard of a shard_prompts manifest that has no output yet,
+    then the reduce prompt; returns the merged analysis.
+    """
+    from shard_prompts import load_manifest, merge, reduce_prompt
+
+    manifest, root = load_manifest(manifest_file)
+    todo = [s for s in manifest["shards"] if not (root / s["output"]).exists()]
+    total = len(manifest["shards"])
+    print(f"{total - len(todo)}/{total} shards already answered", file=sys.stderr)
+    prompts = [
+        (s["id"], (root / s["prompt"]).read_text(encoding="utf-8")) for s in todo
+    ]
+    failed = []
+    for shard, answer in zip(todo, runner.run_many(prompts)):
+        if isinstance(answer, ModelError):
+            failed.append(str(answer))
+        else:
+            _write_json(root / shard["output"], answer)
+    if failed:
+        raise ModelError(f"{len(failed)} shard(s) failed:\n" + "\n".join(failed))
+
+    prompt = reduce_prompt(manifest_file)
+    answer = runner.run(prompt, "reduce", require_commits=False)
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    reduce_path = root / f"reduce.{digest[:12]}.json"
+    _write_json(reduce_path, answer)
+    return merge(manifest_file, str(reduce_path))
+
+
+def _read_prompt(path: str) -> str:
+    if path == "-":
+        return sys.stdin.read()
+    return Path(path).read_text(encoding="utf-8")
+
+
+def add_model_args(parser, backend_default: str | None = "anthropic") -> None:
+    """Backend, retry and response-cache options shared with pipeline.py."""
+    parser.add_argument("--backend", "-b", choices=BACKENDS, default=backend_default)
+    parser.add_argument("--model", "-m", help="Model name (default: $GCA_MODEL)")
+    parser.add_argument(
+        "--base-url",
+        help="API base URL (default: $ANTHROPIC_BASE_URL / $OPENAI_BASE_URL)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        "-j",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Parallel requests",
+    )
+    parser.add_argument(
+        "--retries", type=int, default=DEFAULT_RETRIES, help="Retries per prompt"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=DEFAULT_TIMEOUT, help="Seconds per request"
+    )
+    parser.add_argument("--max-output-tokens", type=int, default=MAX_OUTPUT_TOKENS)
+    parser.add_argument(
+        "--stub-delay", type=float, default=0.0, help="Seconds per stub answer"
+    )
+    parser.add_argument(
+        "--response-cache",
+        help="Response cache directory (default: $GCA_RESPONSE_CACHE)",
+    )
+    parser.add_argument(
+        "--no-response-cache", action="store_true", help="Always call the model"
+    )
+
+
+def runner_from_args(args) -> Runner:
+    """Runner for add_model_args() options; raises ValueError."""
+    options = {"timeout": args.timeout, "max_output_tokens": args.max_output_tokens}
+    if args.backend == "stub":
+        options = {"delay": args.stub_delay}
+    elif args.base_url:
+        options["base_url"] = args.base_url
+    backend = make_backend(args.backend, args.model, **options)
+    cache_dir = (
+        None if args.no_response_cache else (args.response_cache or default_cache_dir())
+    )
+    return Runner(
+        backend,
+        ResponseCache(cache_dir) if cache_dir else None,
+        args.concurrency,
+        args.retries,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run analysis prompts on a model backend"
+    )
+    parser.add_argument(
+        "prompts",
+        nargs="*",
+        help="Prompt files from generate_prompt.py ('-' for stdin)",
+    )
+    parser.add_argument(
+        "--manifest",
+        help="shard_prompts.py manifest.json: answer shards, reduce and merge",
+    )
+    add_model_args(parser)
+    parser.add_argument(
+        "--output",
+        "-o",
+        help="analysis.json path (default: analysis.json; with several prompts, "
+        "<prompt>.analysis.json each)",
+    )
+    add_profile_args(parser)
+
+    args = parser.parse_args()
+    if bool(args.prompts) == bool(args.manifest):
+        parser.error("give prompt files or --manifest (not both)")
+    if len(args.prompts) > 1 and args.output:
+        parser.error("--output needs a single prompt")
+
+    with profile_session(args, "run_model"):
+        try:
+            runner = runner_from_args(args)
+        except ValueError as e:
+            parser.error(str(e))
+
+        try:
+            if args.manifest:
+                analysis = run_manifest(runner, args.manifest)
+                output = Path(args.output or "analysis.json")
+                _write_json(output, analysis)
+                print(f"Analysis written to {output}", file=sys.stderr)
+                return
+            labels = [p if p != "-" else "stdin" for p in args.prompts]
+            answers = runner.run_many(
+                [(label, _read_prompt(p)) for label, p in zip(labels, args.prompts)]
+            )
+        except (ModelError, ValueError, OSError) as e:
+            print(f"❌ {e}", file=sys.stderr)
+            sys.exit(1)
+
+        failed = 0
+        for path, answer in zip(args.prompts, answers):
+            if isinstance(answer, ModelError):
+                print(f"❌ {answer}", file=sys.stderr)
+                failed += 1
+                continue
+            if args.output or len(args.prompts) == 1:
+                output = Path(args.output or "analysis.json")
+            else:
+                output = Path(path).with_suffix(".analysis.json")
+            _write_json(output, answer)
+            print(f"Analysis written to {output}", file=sys.stderr)
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Config-driven scoring engine for commit metrics.
+Scores are computed from raw features persisted by analyze_code.py,
+so a whole history can be re-scored without touching git or ast-grep.
+
+评分引擎 - 特征与打分分离，改权重不用重跑分析
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass, asdict, fields
+from typing import Callable
+
+try:
+    from ast_analyzer import DETECTION_RULES, get_rule_registry
+
+    DEFAULT_AST_RULE_WEIGHTS = {r.name: r.bullshit_score for r in DETECTION_RULES}
+except ImportError:
+    DEFAULT_AST_RULE_WEIGHTS = {}
+    get_rule_registry = None
+
+
+class ScoringConfigError(ValueError):
+    """A scoring config names unknown keys or an unknown formula."""
+
+
+@dataclass
+class ScoringConfig:
+    formula: str = "default"
+
+    # substance_score
+    formatting_or_rename_substance: float = 5.0
+    auto_generated_substance: float = 2.0
+    effective_added_weight: float = 0.5
+    effective_added_cap: float = 30.0
+    function_weight: float = 5.0
+    class_weight: float = 8.0
+    test_lines_weight: float = 0.3
+    test_lines_cap: float = 15.0
+    effective_deleted_weight: float = 0.2
+    effective_deleted_cap: float = 10.0
+    copypaste_multiplier: float = 0.3
+    trivial_multiplier: float = 0.5
+
+    # bullshit_score
+    formatting_only_penalty: float = 40.0
+    rename_only_penalty: float = 30.0
+    auto_generated_penalty: float = 50.0
+    copypaste_penalty: float = 35.0
+    trivial_penalty: float = 20.0
+    low_effective_ratio: float = 0.3
+    low_effective_ratio_penalty: float = 25.0
+
+    max_score: float = 100.0
+
+    # Per-rule ast-grep weights; rules not listed use their rule's bullshit_score
+    ast_rule_weights: dict | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ScoringConfig":
+        known = {f.name for f in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise ScoringConfigError(f"Unknown scoring config keys: {sorted(unknown)}")
+        return cls(**data)
+
+    @classmethod
+    def load(cls, path: str) -> "ScoringConfig":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def rule_weight(self, rule: str) -> float:
+        """
+        Weight of one `rule` hit by name alone, for metrics that predate
+        ast_bullshit_by_rule. Built-in weights win over pack overrides, which
+        may differ per language; pack-only rules come from the registry.
+        """
+        if self.ast_rule_weights and rule in self.ast_rule_weights:
+            return self.ast_rule_weights[rule]
+        if rule in DEFAULT_AST_RULE_WEIGHTS:
+            return DEFAULT_AST_RULE_WEIGHTS[rule]
+        found = get_rule_registry().find(rule) if get_rule_registry else None
+        return found.bullshit_score if found else 0
+
+    def fingerprint(self) -> str:
+        data = asdict(self)
+        data["features_version"] = FEATURES_VERSION
+        # Rule packs set weights too; hashes without packs stay as they were
+        packs = get_rule_registry().packs_version() if get_rule_registry else ""
+        if packs:
+            data["rule_packs"] = packs
+        payload = json.dumps(data, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
+# Bump when analysis extracts different features from the same commits (a
+# detection rule that starts matching), so config_hash keeps results from
+# before and after apart. 2: empty_except is scored for Python.
+FEATURES_VERSION = 2
+
+# Raw features a scorer may read, with the default used when a persisted
+# metrics dict predates the field.
+FEATURE_DEFAULTS = {
+    "lines_added": 0,
+    "effective_lines_added": 0,
+    "effective_lines_deleted": 0,
+    "functions_added": 0,
+    "classes_added": 0,
+    "test_lines_added": 0,
+    "is_formatting_only": False,
+    "is_rename_only": False,
+    "is_auto_generated": False,
+    "is_likely_copypaste": False,
+    "is_trivial": False,
+    "ast_grep_bullshit": 0.0,
+    "ast_issues_by_rule": None,
+    "ast_bullshit_by_rule": None,
+}
+
+Columns = dict[str, list]
+Scorer = Callable[[Columns, ScoringConfig], tuple[list[float], list[float]]]
+
+SCORERS: dict[str, Scorer] = {}
+
+
+def register_scorer(name: str) -> Callable[[Scorer], Scorer]:
+    """Register a scoring formula under a name usable from the config."""
+
+    def decorator(func: Scorer) -> Scorer:
+        SCORERS[name] = func
+        return func
+
+    return decorator
+
+
+def to_columns(features: list[dict]) -> Columns:
+    """Transpose per-commit feature dicts into one list per feature."""
+    return {
+        key: [f.get(key, default) for f in features]
+        for key, default in FEATURE_DEFAULTS.items()
+    }
+
+
+def ast_bullshit_column(cols: Columns, config: ScoringConfig) -> list[float]:
+    """
+    Recompute ast-grep penalties from per-rule counts when available.
+    Rules without a configured weight keep the points their matching rules
+    gave at detection time (ast_bullshit_by_rule), which already account
+    for per-language rule pack overrides.
+    """
+    overrides = config.ast_rule_weights or {}
+    weights: dict[str, float] = {}
+    out = []
+    for by_rule, points, stored in zip(
+        cols["ast_issues_by_rule"], cols["ast_bullshit_by_rule"], cols["ast_grep_bullshit"]
+    ):
+        if by_rule is None:
+            out.append(stored)
+            continue
+        total = 0.0
+        for rule, count in by_rule.items():
+            if rule not in overrides and points is not None and rule in points:
+                total += points[rule]
+                continue
+            if rule not in weights:
+                weights[rule] = config.rule_weight(rule)
+            total += weights[rule] * count
+        out.append(total)
+    return out
+
+
+@register_scorer("default")
+def default_scorer(cols: Columns, c: ScoringConfig) -> tuple[list[float], list[float]]:
+    """The original substance/bullshit formulas, evaluated column-wise."""
+    fmt = cols["is_formatting_only"]
+    ren = cols["is_rename_only"]
+    gen = cols["is_auto_generated"]
+    cp = cols["is_likely_copypaste"]
+    triv = cols["is_trivial"]
+
+    raw = [
+        min(ea * c.effective_added_weight, c.effective_added_cap)
+        + fa * c.function_weight
+        + ca * c.class_weight
+        + min(tl * c.test_lines_weight, c.test_lines_cap)
+        + min(ed * c.effective_deleted_weight, c.effective_deleted_cap)
+        for ea, fa, ca, tl, ed in zip(
+            cols["effective_lines_added"],
+            cols["functions_added"],
+            cols["classes_added"],
+            cols["test_lines_added"],
+            cols["effective_lines_deleted"],
+        )
+    ]
+    substance = [
+        c.formatting_or_rename_substance
+        if f or r
+        else c.auto_generated_substance
+        if g
+        else min(
+            s
+            * (c.copypaste_multiplier if p else 1.0)
+            * (c.trivial_multiplier if t else 1.0),
+            c.max_score,
+        )
+        for s, f, r, g, p, t in zip(raw, fmt, ren, gen, cp, triv)
+    ]
+
+    ratio_penalty = [
+        c.low_effective_ratio_penalty * (1 - ea / la)
+        if la > 0 and ea / la < c.low_effective_ratio
+        else 0.0
+        for ea, la in zip(cols["effective_lines_added"], cols["lines_added"])
+    ]
+    bullshit = [
+        min(
+            (c.formatting_only_penalty if f else 0)
+            + (c.rename_only_penalty if r else 0)
+            + (c.auto_generated_penalty if g else 0)
+            + (c.copypaste_penalty if p else 0)
+            + (c.trivial_penalty if t else 0)
+            + rp
+            + ab,
+            c.max_score,
+        )
+        for f, r, g, p, t, rp, ab in zip(
+            fmt, ren, gen, cp, triv, ratio_penalty, ast_bullshit_column(cols, c)
+        )
+    ]
+
+    return substance, bullshit
+
+
+def score_features(
+    features: list[dict], config: ScoringConfig | None = None
+) -> tuple[list[float], list[float]]:
+    """Score many commits in one pass. Returns (substance, bullshit) lists."""
+    config = config or ScoringConfig()
+    scorer = SCORERS.get(config.formula)
+    if scorer is None:
+        raise ScoringConfigError(
+            f"Unknown scoring formula '{config.formula}' (known: {sorted(SCORERS)})"
+        )
+    if not features:
+        return [], []
+    return scorer(to_columns(features), config)
+
+
+def rescore_metrics(metrics: list[dict], config: ScoringConfig | None = None) -> None:
+    """Overwrite substance_score/bullshit_score on persisted metrics dicts in place."""
+    substance, bullshit = score_features(metrics, config)
+    for m, s, b in zip(metrics, substance, bullshit):
+        m["substance_score"] = s
+        m["bullshit_score"] = b
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Long-lived ast-grep workers.
+`ast-grep lsp` is started once per rule set and kept running; snippets are
+opened as LSP documents and matches come back as diagnostics, so a scan
+costs well under a millisecond instead of a process start (CLI parsing,
+grammar and rule loading) per call.
+Callers fall back to spawning `sg scan` when a worker cannot start, times
+out or dies.
+"""
+
+import itertools
+import json
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from profiling import count, stage
+
+START_TIMEOUT = 10
+# Rule sets whose workers keep failing to start go back to spawning for good
+MAX_START_FAILURES = 3
+
+# A rule every worker must match before it serves scans: proves the rule
+# set is loaded, since the server loads rules asynchronously
+CANARY_ID = "gca-canary"
+CANARY_CODE = "gca_canary_probe"
+
+
+class WorkerError(Exception):
+    """The worker cannot answer; the caller should spawn `sg scan` instead."""
+
+
+def _canary_rule(lang: str) -> str:
+    return "\n".join(
+        [
+            f"id: {CANARY_ID}",
+            f"language: {lang}",
+            "severity: info",
+            "message: canary",
+            "rule:",
+            f"  pattern: {CANARY_CODE}",
+        ]
+    )
+
+
+def diagnostic_match(diagnostic: dict, lines: list[str]) -> dict:
+    """An LSP diagnostic as an ast-grep JSON match (range lines and text)."""
+    start = diagnostic["range"]["start"]
+    end = diagnostic["range"]["end"]
+    # ast-grep's server reports columns in characters
+    if start["line"] == end["line"]:
+        text = lines[start["line"]][start["character"] : end["character"]]
+    else:
+        text = "\n".join(
+            [
+                lines[start["line"]][start["character"] :],
+                *lines[start["line"] + 1 : end["line"]],
+                lines[end["line"]][: end["character"]],
+            ]
+        )
+    return {
+        "ruleId": diagnostic.get("code"),
+        "range": {
+            "start": {"line": start["line"], "column": start["character"]},
+            "end": {"line": end["line"], "column": end["character"]},
+        },
+        "text": text,
+    }
+
+
+class SgWorker:
+    """One `ast-grep lsp` process serving a fixed rule set for one language."""
+
+    def __init__(
+        self, binary: str, lang: str, ext: str, rules_yaml: str, timeout: float = START_TIMEOUT
+    ):
+        self.ext = ext
+        self.root = Path(tempfile.mkdtemp(prefix="gca-sg-lsp-"))
+        (self.root / "rules").mkdir()
+        (self.root / "sgconfig.yml").write_text("ruleDirs:\n  - rules\n", encoding="utf-8")
+        (self.root / "rules" / "rules.yml").write_text(
+            "\n---\n".join(doc for doc in (rules_yaml, _canary_rule(lang)) if doc),
+            encoding="utf-8",
+        )
+        self._messages: queue.Queue = queue.Queue()
+        self._ids = itertools.count(1)
+        self._docs = itertools.count()
+        try:
+            self.proc = subprocess.Popen(
+                [binary, "lsp"],
+                cwd=self.root,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        except OSError as e:
+            shutil.rmtree(self.root, ignore_errors=True)
+            raise WorkerError(str(e)) from e
+        threading.Thread(target=self._read, daemon=True).start()
+        try:
+            with stage("sg_worker.start"):
+                self._handshake(time.monotonic() + timeout)
+        except WorkerError:
+            self.close()
+            raise
+
+    def _read(self) -> None:
+        stream = self.proc.stdout
+        try:
+            while True:
+                length = None
+                while True:
+                    line = stream.readline()
+                    if not line:
+                        return
+                    line = line.strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(b":")
+                    if name.lower() == b"content-length":
+                        length = int(value)
+                if length is None:
+                    return
+                self._messages.put(json.loads(stream.read(length)))
+        except (OSError, ValueError):
+            return
+        finally:
+            self._messages.put(None)
+
+    def _send(self, message: dict) -> None:
+        body = json.dumps({"jsonrpc": "2.0", **message}).encode("utf-8")
+        try:
+            self.proc.stdin.write(b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+            self.proc.stdin.flush()
+        except (OSError, ValueError) as e:
+            raise WorkerError(f"worker exited: {e}") from e
+
+    def _next(self, deadline: float) -> dict:
+        try:
+            message = self._messages.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            raise WorkerError("worker timed out") from None
+        if message is None:
+            raise WorkerError("worker exited")
+        if "id" in message and "method" in message:
+            # Server-to-client requests (capability registration) want a reply
+            self._send({"id": message["id"], "result": None})
+        return message
+
+    def _handshake(self, deadline: float) -> None:
+        request = next(self._ids)
+        self._send(
+            {
+                "id": request,
+                "method": "initialize",
+                "params": {"processId": None, "rootUri": self.root.as_uri(), "capabilities": {}},
+            }
+        )
+        while self._next(deadline).get("id") != request:
+            pass
+        self._send({"method": "initialized", "params": {}})
+        while not any(d.get("code") == CANARY_ID for d in self._diagnostics(CANARY_CODE, deadline)):
+            if time.monotonic() > deadline:
+                raise WorkerError("rule set did not load")
+            time.sleep(0.01)
+
+    def _diagnostics(self, code: str, deadline: float) -> list[dict]:
+        uri = (self.root / f"s{next(self._docs)}{self.ext}").as_uri()
+        document = {"uri": uri, "languageId": "", "version": 1, "text": code}
+        self._send({"method": "textDocument/didOpen", "params": {"textDocument": document}})
+        while True:
+            message = self._next(deadline)
+            params = message.get("params") or {}
+            if message.get("method") == "textDocument/publishDiagnostics" and params.get("uri") == uri:
+                break
+        self._send({"method": "textDocument/didClose", "params": {"textDocument": {"uri": uri}}})
+        return params.get("diagnostics", [])
+
+    def scan(self, code: str, timeout: float) -> list[dict]:
+        """ast-grep JSON matches (ruleId, range, text) of the rule set on `code`."""
+        lines = code.split("\n")
+        diagnostics = self._diagnostics(code, time.monotonic() + timeout)
+        try:
+            matches = [
+                diagnostic_match(d, lines) for d in diagnostics if d.get("code") != CANARY_ID
+            ]
+        except (KeyError, IndexError, TypeError) as e:
+            raise WorkerError(f"unexpected diagnostic: {e}") from e
+        # Source order within each rule, as `sg scan` reports
+        matches.sort(key=lambda m: (m["range"]["start"]["line"], m["range"]["start"]["column"]))
+        return matches
+
+    def close(self) -> None:
+        try:
+            self._send({"method": "exit"})
+            self.proc.stdin.close()
+        except (WorkerError, OSError):
+            pass
+        # The server does not always exit on `exit`
+        try:
+            self.proc.wait(0.2)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class WorkerPool:
+    """
+    Up to `max_workers` SgWorkers per (language, rule set), shared by threads.
+    Each worker serves one scan at a time; callers wait for an idle one.
+    """
+
+    def __init__(self, binary: str, max_workers: int = 1):
+        self.binary = binary
+        self.max_workers = max(1, max_workers)
+        self._idle: dict[tuple, list[SgWorker]] = {}
+        self._running: dict[tuple, int] = {}
+        self._failures: dict[tuple, int] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def _acquire(self, key: tuple) -> SgWorker | None:
+        with self._cond:
+            while True:
+                if self._closed or self._failures.get(key, 0) >= MAX_START_FAILURES:
+                    return None
+                if self._idle.get(key):
+                    return self._idle[key].pop()
+                if self._running.get(key, 0) < self.max_workers:
+                    self._running[key] = self._running.get(key, 0) + 1
+                    break
+                self._cond.wait()
+        lang, ext, rules_yaml = key
+        try:
+            worker = SgWorker(self.binary, lang, ext, rules_yaml)
+        except WorkerError:
+            count("sg_worker.start_failures")
+            with self._cond:
+                self._running[key] -= 1
+                self._failures[key] = self._failures.get(key, 0) + 1
+                self._cond.notify_all()
+            return None
+        count("sg_worker.starts")
+        return worker
+
+    def _release(self, key: tuple, worker: SgWorker | None) -> None:
+        with self._cond:
+            keep = worker is not None and not self._closed
+            if keep:
+                self._idle.setdefault(key, []).append(worker)
+            else:
+                self._running[key] -= 1
+            self._cond.notify_all()
+        if worker is not None and not keep:
+            worker.close()
+
+    def scan(
+        self, lang: str, ext: str, rules_yaml: str, code: str, timeout: float
+    ) -> list[dict] | None:
+        """Matches of `rules_yaml` on `code`, or None when no worker could answer."""
+        key = (lang, ext, rules_yaml)
+        worker = self._acquire(key)
+        if worker is None:
+            return None
+        try:
+            with stage("sg_worker.scan", len(code)):
+                matches = worker.scan(code, timeout)
+        except WorkerError:
+            count("sg_worker.failures")
+            worker.close()
+            self._release(key, None)
+            return None
+        self._release(key, worker)
+        count("sg_worker.scans")
+        return matches
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            workers = [w for idle in self._idle.values() for w in idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        for worker in workers:
+            worker.close()
@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+"""
+Map-reduce prompts for commit ranges too large for one prompt.
+
+    split   partition commits by author or time bucket into shard prompts,
+            each packed into --max-tokens, plus a manifest.json
+    reduce  build the prompt that combines the shard outputs into one
+            team-level analysis
+    merge   write analysis.json from the reduce output, with the per-commit
+            entries taken from the shard outputs
+
+Shards are independent and can run in parallel. Each shard's output file is
+named after the hash of its prompt, so an unchanged shard reuses the output
+of an earlier run. The prompt depends only on the shard's own commits: its
+position in the split lives in the manifest, and the metrics rollups are
+recomputed per shard, so moving the range window keeps the older shards'
+hashes.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from analyze_code import summarize_results
+from condense_diff import CONTEXT_LINES
+from generate_prompt import (
+    DIFF_CHAR_LIMIT,
+    LAYOUTS,
+    METRICS_FORMATS,
+    _json_tokens,
+    build_template,
+    commit_header,
+    compact_commit_metrics,
+    condense_for_prompt,
+    estimate_tokens,
+    load_metrics,
+    pack_prompt,
+    prefix_hash,
+    render_metrics,
+    stable_order,
+)
+from metrics_table import MetricsTable
+from profiling import add_profile_args, count, profile_session, stage
+from report_schema import parse_model_json
+
+MANIFEST_VERSION = 1
+PARTITIONS = ("author", "day", "week", "month")
+# Fill shards to this share of the budget; pack_prompt squeezes the rest
+FILL_RATIO = 0.9
+# Per-commit fields of the shard outputs passed on to the reduce prompt
+REDUCE_COMMIT_FIELDS = (
+    "sha",
+    "author",
+    "final_score",
+    "rewrite_index",
+    "business_value",
+    "badges",
+)
+
+SHARD_NOTE_ZH = """
+> 本次分析是大范围提交中的一个分片（{label}）。只评价下面的提交，按原格式输出 JSON；
+> 各分片的结果稍后会被汇总，排行榜和团队结论只需基于本分片数据。
+"""
+
+SHARD_NOTE_EN = """
+> This is one shard ({label}) of a larger commit range. Evaluate only the commits below
+> and answer in the usual JSON format; shard results are combined later, so base the leaderboard
+> and team verdicts on this shard alone.
+"""
+
+REDUCE_PROMPT_ZH = """
+你是"代码鉴定官"，之前已经把一段时间的提交分成 {total} 个分片分别鉴定。现在把分片结果汇总成一份团队报告。
+
+## 团队指标（机器计算）
+
+{metrics_json}
+
+## 分片结果
+
+{shards_note}
+
+{shards_json}
+
+## 任务
+
+1. 合并同一人在多个分片中的排行榜条目：`commits`、`effective_lines` 相加，`final_score` 按提交数加权重新计算，
+   等级、称号、徽章和点评按合并后的数据重新给出，然后重新排名。
+2. `team_summary`、`wall_of_shame`、`ai_era_verdict`、`daily_roast`、`closing_rant` 基于全部分片重新撰写，保持打工人 + Linus 双风格。
+3. `commits` 输出空数组，逐条提交的评价会从分片结果中原样合并。
+
+## 输出格式（必须是合法 JSON）
+
+与分片相同的报告结构：`report_date`、`team_vibe`、`linus_mood`、`team_summary`、`leaderboard`、
+`commits`（空数组）、`wall_of_shame`、`ai_era_verdict`、`daily_roast`、`closing_rant`。只输出 JSON。
+"""
+
+REDUCE_PROMPT_EN = """
+You are a "Code Evaluator". A long commit range was split into {total} shards, each evaluated on its own.
+Combine the shard results into one team report.
+
+## Team Metrics (machine-calculated)
+
+{metrics_json}
+
+## Shard Results
+
+{shards_note}
+
+{shards_json}
+
+## Your Task
+
+1. Merge the leaderboard entries of people who appear in several shards: add up `commits` and
+   `effective_lines`, recompute `final_score` weighted by commit count, re-derive grade, title,
+   badges and reviews from the merged data, then re-rank.
+2. Rewrite `team_summary`, `wall_of_shame`, `ai_era_verdict`, `daily_roast` and `closing_rant` from all
+   shards, keeping both the corporate-humor and the Linus style.
+3. Output `commits` as an empty array; per-commit entries are merged from the shard outputs verbatim.
+
+## Output Format (must be valid JSON)
+
+The same report structure as the shards: `report_date`, `team_vibe`, `linus_mood`, `team_summary`,
+`leaderboard`, `commits` (empty), `wall_of_shame`, `ai_era_verdict`, `daily_roast`, `closing_rant`.
+Output valid JSON only.
+"""
+
+# Note above the shard results, with and without the per-commit digests
+REDUCE_SHARDS_NOTE_ZH = (
+    "每个分片的完整结论；`commits` 只保留了评分字段。",
+    "每个分片的完整结论，省略了 `commits`。",
+)
+REDUCE_SHARDS_NOTE_EN = (
+    "Every shard's full verdict; `commits` keep their scoring fields only.",
+    "Every shard's full verdict, without `commits`.",
+)
+
+
+def partition_key(commit: dict, by: str) -> str:
+    if by == "author":
+        return commit["author"]["name"]
+    when = datetime.fromisoformat(commit["date"].replace("Z", "+00:00"))
+    if by == "day":
+        return when.date().isoformat()
+    if by == "week":
+        year, week, _ = when.isocalendar()
+        return f"{year}-W{week:02d}"
+    return f"{when.year}-{when.month:02d}"
+
+
+def commit_cost(
+    commit: dict, metrics: dict | None, table: MetricsTable | None = None
+) -> int:
+    """Estimated prompt tokens of one commit, diff cut as in the default prompt."""
+    cost = _json_tokens(commit_header(commit), depth=2)
+    cost += _json_tokens(commit.get("diff", "")[:DIFF_CHAR_LIMIT])
+    if metrics is None:
+        return cost
+    if table is not None:
+        return cost + estimate_tokens(table.row(commit["sha"][:8])) + 1
+    return cost + _json_tokens(compact_commit_metrics(metrics), depth=2)
+
+
+def plan_shards(
+    commits: list[dict],
+    metrics: dict | None,
+    by: str,
+    budget: int,
+    metrics_format: str = "json",
+) -> list[tuple[list[str], list[dict]]]:
+    """
+    Group commits by partition key and cut the groups into shards of about
+    `budget` tokens: a large group spans several shards, small neighbouring
+    groups share one. Returns (keys, commits) per shard, oldest first.
+    """
+    by_sha = {r["sha"]: r["metrics"] for r in (metrics or {}).get("commits", [])}
+    table = (
+        MetricsTable(metrics)
+        if metrics is not None and metrics_format == "table"
+        else None
+    )
+    groups: dict[str, list[dict]] = {}
+    for c in sorted(commits, key=lambda c: (c["date"], c["sha"])):
+        groups.setdefault(partition_key(c, by), []).append(c)
+
+    shards: list[tuple[list[str], list[dict]]] = []
+    used = 0
+    for key in sorted(groups):
+        costs = [commit_cost(c, by_sha.get(c["sha"][:8]), table) for c in groups[key]]
+        # Keep a group whole when it fits next to what the shard already holds
+        if shards and used + sum(costs) <= budget:
+            shards[-1][0].append(key)
+            shards[-1][1].extend(groups[key])
+            used += sum(costs)
+            continue
+        # Otherwise spread it evenly over as few shards as it needs
+        target = sum(costs) / math.ceil(sum(costs) / budget)
+        shards.append(([key], []))
+        used = 0
+        for c, cost in zip(groups[key], costs):
+            if shards[-1][1] and (used + cost > budget or used >= target):
+                shards.append(([key], []))
+                used = 0
+            shards[-1][1].append(c)
+            used += cost
+    return shards
+
+
+def shard_period(commits: list[dict]) -> dict:
+    return {"since": commits[0]["date"], "until": commits[-1]["date"]}
+
+
+def shard_metrics(metrics: dict | None, commits: list[dict]) -> dict | None:
+    """The shard's metrics, rollups recomputed from its own commits only."""
+    if metrics is None:
+        return None
+    shas = {c["sha"][:8] for c in commits}
+    results = [r for r in metrics.get("commits", []) if r["sha"] in shas]
+    sub = {k: v for k, v in metrics.items() if k != "profile"}
+    return {**sub, **summarize_results(results), "period": shard_period(commits)}
+
+
+def _write_if_changed(path: Path, text: str) -> None:
+    """Leave identical files untouched so mtimes stay meaningful to callers."""
+    if path.exists() and path.read_text(encoding="utf-8") == text:
+        return
+    path.write_text(text, encoding="utf-8")
+
+
+def split(
+    commits_file: str,
+    out_dir: str,
+    by: str = "author",
+    max_tokens: int = 60000,
+    lang: str = "zh",
+    condense: bool = False,
+    context_lines: int = CONTEXT_LINES,
+    metrics_format: str = "json",
+    layout: str = "classic",
+) -> dict:
+    """
+    Write one prompt per shard and manifest.json into `out_dir`; returns the
+    manifest.
+    """
+    with stage("json.load"), open(commits_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    metrics = load_metrics(commits_file)
+    commits = data.get("commits", [])
+    if condense:
+        commits = condense_for_prompt(commits, context_lines)
+
+    note = SHARD_NOTE_ZH if lang == "zh" else SHARD_NOTE_EN
+    overhead = estimate_tokens(
+        build_template(lang, layout, note).format(metrics_json="", commits_json="")
+    )
+    if metrics is not None:
+        overhead += estimate_tokens(render_metrics(metrics, lang, metrics_format, []))
+    budget = int((max_tokens - overhead) * FILL_RATIO)
+    if budget <= 0:
+        raise ValueError(
+            f"--max-tokens {max_tokens} leaves no room for commits "
+            f"(~{overhead} tokens overhead)"
+        )
+
+    with stage("shard.plan"):
+        plan = plan_shards(commits, metrics, by, budget, metrics_format)
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    shards = []
+    for index, (keys, shard_commits) in enumerate(plan):
+        label = keys[0] if len(keys) == 1 else f"{keys[0]} … {keys[-1]}"
+        shard_template = build_template(lang, layout, note.format(label=label))
+        shard_data = {**data, **shard_period(shard_commits), "commits": shard_commits}
+        sub_metrics = shard_metrics(metrics, shard_commits)
+        if layout == "cached":
+            shard_data, sub_metrics = stable_order(shard_data, sub_metrics)
+        with stage("prompt.pack"):
+            prompt = pack_prompt(
+                shard_data,
+                sub_metrics,
+                shard_template,
+                lang,
+                max_tokens,
+                metrics_format=metrics_format,
+            )
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        shard_id = f"shard-{index:03d}"
+        _write_if_changed(out / f"{shard_id}.txt", prompt)
+        output = out / f"shard.{digest[:12]}.json"
+        shards.append(
+            {
+                "id": shard_id,
+                "index": index + 1,
+                "total": len(plan),
+                "keys": keys,
+                "commits": [c["sha"][:8] for c in shard_commits],
+                **shard_period(shard_commits),
+                "prompt": f"{shard_id}.txt",
+                "hash": digest,
+                "tokens": estimate_tokens(prompt),
+                "output": output.name,
+                "cached": output.exists(),
+            }
+        )
+    count("shard.shards", len(shards))
+    count("shard.cached", sum(1 for s in shards if s["cached"]))
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "commits_file": str(Path(commits_file).resolve()),
+        "lang": lang,
+        "by": by,
+        "max_tokens": max_tokens,
+        "metrics_format": metrics_format,
+        "layout": layout,
+        "shards": shards,
+    }
+    if layout == "cached":
+        manifest["prefix_hash"] = prefix_hash(lang)
+    _write_if_changed(
+        out / "manifest.json", json.dumps(manifest, indent=2, ensure_ascii=False) + "\n"
+    )
+    return manifest
+
+
+def load_model_json(path: Path):
+    """JSON from a saved model answer (see report_schema.parse_model_json)."""
+    return parse_model_json(path.read_text(encoding="utf-8"))
+
+
+def load_manifest(manifest_file: str) -> tuple[dict, Path]:
+    path = Path(manifest_file)
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(
+            f"{path}: unsupported manifest version {manifest.get('version')}"
+        )
+    return manifest, path.parent
+
+
+def load_shard_outputs(manifest: dict, root: Path) -> list[dict]:
+    missing = [
+        s["output"] for s in manifest["shards"] if not (root / s["output"]).exists()
+    ]
+    if missing:
+        raise ValueError(
+            f"{len(missing)} shard output(s) missing: {', '.join(missing)}"
+        )
+    outputs = []
+    for shard in manifest["shards"]:
+        try:
+            outputs.append(load_model_json(root / shard["output"]))
+        except ValueError as e:
+            raise ValueError(f"{shard['output']}: not valid JSON ({e})") from e
+    return outputs
+
+
+def shard_digest(shard: dict, output: dict, with_commits: bool) -> dict:
+    """A shard output as the reduce prompt shows it."""
+    digest = {"shard": shard["id"], "keys": shard["keys"]}
+    digest.update((k, v) for k, v in output.items() if k != "commits")
+    if with_commits:
+        digest["commits"] = [
+            {k: c[k] for k in REDUCE_COMMIT_FIELDS if k in c}
+            for c in output.get("commits", [])
+        ]
+    return digest
+
+
+def reduce_prompt(manifest_file: str) -> str:
+    """
+    The prompt that combines every shard output of a manifest, packed into
+    the manifest's max_tokens: the per-commit digests are left out when
+    they do not fit, and a ValueError is raised when even that is too big.
+    """
+    manifest, root = load_manifest(manifest_file)
+    outputs = load_shard_outputs(manifest, root)
+    metrics = load_metrics(manifest["commits_file"])
+    lang = manifest["lang"]
+    metrics_json = render_metrics(
+        metrics, lang, manifest.get("metrics_format", "json"), []
+    )
+    template = REDUCE_PROMPT_ZH if lang == "zh" else REDUCE_PROMPT_EN
+    notes = REDUCE_SHARDS_NOTE_ZH if lang == "zh" else REDUCE_SHARDS_NOTE_EN
+    max_tokens = manifest["max_tokens"]
+
+    for with_commits, note in zip((True, False), notes):
+        digests = [
+            shard_digest(s, o, with_commits)
+            for s, o in zip(manifest["shards"], outputs)
+        ]
+        prompt = template.format(
+            total=len(digests),
+            metrics_json=metrics_json,
+            shards_note=note,
+            shards_json=json.dumps(digests, indent=2, ensure_ascii=False),
+        )
+        tokens = estimate_tokens(prompt)
+        if tokens <= max_tokens:
+            return prompt
+    raise ValueError(
+        f"reduce prompt needs ~{tokens} tokens even without per-commit digests, "
+        f"over the manifest's max_tokens {max_tokens}; "
+        "split again with a larger --max-tokens"
+    )
+
+
+def merge(manifest_file: str, reduce_output: str) -> dict:
+    """The reduce output with every shard's per-commit entries, in shard order."""
+    manifest, root = load_manifest(manifest_file)
+    outputs = load_shard_outputs(manifest, root)
+    analysis = load_model_json(Path(reduce_output))
+    analysis["commits"] = [c for output in outputs for c in output.get("commits", [])]
+    return analysis
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sharded (map-reduce) prompts for large commit ranges"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("split", help="Write shard prompts and manifest.json")
+    p.add_argument("commits_file", help="Path to commits.json")
+    p.add_argument(
+        "--out-dir", "-o", required=True, help="Directory for shard prompts and outputs"
+    )
+    p.add_argument(
+        "--by", choices=PARTITIONS, default="author", help="Partition commits by"
+    )
+    p.add_argument(
+        "--max-tokens", type=int, default=60000, help="Token budget per shard prompt"
+    )
+    p.add_argument(
+        "--lang", "-l", choices=["zh", "en"], default="zh", help="Prompt language"
+    )
+    p.add_argument(
+        "--condense",
+        action="store_true",
+        help="Condense diffs first (see generate_prompt)",
+    )
+    p.add_argument("--context-lines", type=int, default=CONTEXT_LINES)
+    p.add_argument("--metrics-format", choices=METRICS_FORMATS, default="json")
+    p.add_argument("--layout", choices=LAYOUTS, default="classic")
+    add_profile_args(p)
+
+    p = sub.add_parser("reduce", help="Build the reduce prompt from the shard outputs")
+    p.add_argument("manifest", help="Path to manifest.json")
+    p.add_argument("--output", "-o", help="Output file (default: stdout)")
+    add_profile_args(p)
+
+    p = sub.add_parser("merge", help="Write analysis.json from the reduce output")
+    p.add_argument("manifest", help="Path to manifest.json")
+    p.add_argument("reduce_output", help="The model's answer to the reduce prompt")
+    p.add_argument("--output", "-o", default="analysis.json", help="Output file")
+    add_profile_args(p)
+
+    args = parser.parse_args()
+
+    with profile_session(args, f"shard_prompts.{args.command}"):
+        try:
+            if args.command == "split":
+                manifest = split(
+                    args.commits_file,
+                    args.out_dir,
+                    args.by,
+                    args.max_tokens,
+                    args.lang,
+                    args.condense,
+                    args.context_lines,
+                    args.metrics_format,
+                    args.layout,
+                )
+                shards = manifest["shards"]
+                cached = sum(1 for s in shards if s["cached"])
+                print(
+                    f"{len(shards)} shards written to {args.out_dir} "
+                    f"({cached} already answered); save each answer as the "
+                    "shard's `output` file from manifest.json",
+                    file=sys.stderr,
+                )
+            elif args.command == "reduce":
+                prompt = reduce_prompt(args.manifest)
+                if args.output:
+                    with open(args.output, "w", encoding="utf-8") as f:
+                        f.write(prompt)
+                    print(f"Reduce prompt written to {args.output}", file=sys.stderr)
+                else:
+                    print(prompt)
+            else:
+                analysis = merge(args.manifest, args.reduce_output)
+                with stage("json.dump"), open(args.output, "w", encoding="utf-8") as f:
+                    json.dump(analysis, f, indent=2, ensure_ascii=False)
+                print(f"Analysis written to {args.output}", file=sys.stderr)
+        except ValueError as e:
+            parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()